@@ -1,14 +1,18 @@
 """
 分析API路由
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Tuple
 import asyncio
+import hashlib
 import uuid
 import os
 import json
 import logging
+import threading
+import time
 from datetime import datetime
 import pytz
 from pathlib import Path
@@ -22,69 +26,247 @@ from ..models.schemas import (
     AnalysisParams, TaskCreateResponse, TaskStatusResponse, 
     AnalysisResultResponse, TaskInfo, TaskStatus
 )
-from ..services.r_analysis import RAnalysisEngine
+from ..services.r_analysis import RAnalysisEngine, resolve_chart_selection
+from ..services import result_cache, frame_cache, upload_store
+from ..services.incremental_analysis import append_rows
+from ..services.analysis_executor import run_analysis
+from ..services.task_scheduler import get_scheduler, classify_lane, QueueFullError
+from ..services.task_store import get_task_store, OWNER_ID, TaskQueueFull
+from ..services import job_control
+from ..services.stage_progress import load_timings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# 任务存储 (生产环境应使用Redis或数据库)
-tasks: Dict[str, TaskInfo] = {}
-results: Dict[str, Dict[str, Any]] = {}
+# 任务存储（默认为SQLite，多个工作进程共享）
+task_store = get_task_store()
 
-# R分析引擎实例 - 修改为函数式调用，不再使用全局单例
-# r_engine = None 
+# R分析引擎实例（引擎不保存任务状态，进程内共享一个实例）
+_r_engine = None
+_r_engine_lock = threading.Lock()
 
 def get_r_engine():
-    """获取R分析引擎实例（每次都创建新的实例以保证无状态）"""
-    # global r_engine
-    # if r_engine is None:
-    #     r_engine = RAnalysisEngine()
-    # return r_engine
-    return RAnalysisEngine()
+    """获取R分析引擎实例，首次调用时创建（会检查R是否可用，应在线程池中调用）"""
+    global _r_engine
+    with _r_engine_lock:
+        if _r_engine is None:
+            _r_engine = RAnalysisEngine()
+        return _r_engine
+
+# 执行中的任务检查是否已被取消（可能由其他节点取消）的间隔(秒)
+CANCEL_CHECK_INTERVAL = 2
+
+async def _await_analysis(task_id: str, future: asyncio.Future):
+    """等待分析完成；期间定期检查任务是否已被取消或删除，是则终止其R进程"""
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=CANCEL_CHECK_INTERVAL)
+        if done:
+            return future.result()
+        task_info = await run_in_threadpool(task_store.get, task_id)
+        if task_info is None or task_info.status == TaskStatus.CANCELLED:
+            job_control.cancel(task_id)
+
+def _stop_task(task_id: str):
+    """移除本进程调度队列中的任务，并终止本进程中正在执行的R进程（其他节点上的任务由其执行进程检查后终止）"""
+    get_scheduler().cancel(task_id)
+    if get_scheduler().is_running(task_id):
+        job_control.cancel(task_id)
 
 async def run_analysis_task(task_id: str, csv_path: str, params: AnalysisParams):
     """后台分析任务"""
+    # 原子地从PENDING切换到RUNNING，任务已被删除或已由其他进程执行时直接返回
+    started = await run_in_threadpool(
+        task_store.transition, task_id, [TaskStatus.PENDING], TaskStatus.RUNNING,
+        queue_position=None,
+        started_at=datetime.now(SHANGHAI_TZ),
+        progress=10,
+        message="正在初始化分析...",
+    )
+    if not started:
+        logger.info(f"任务 {task_id} 不再处于等待状态，跳过执行")
+        return
+    
     try:
-        # 更新任务状态
-        tasks[task_id].status = TaskStatus.RUNNING
-        tasks[task_id].started_at = datetime.now(SHANGHAI_TZ)
-        tasks[task_id].progress = 10
-        tasks[task_id].message = "正在初始化分析..."
-        
-        # 获取R引擎
-        engine = get_r_engine()
-        
-        # 更新进度
-        tasks[task_id].progress = 30
-        tasks[task_id].message = "正在执行数据分析..."
-        
-        # 执行分析
-        result = engine.analyze_data(csv_path, params, task_id)
+        # 获取R引擎（不占用分析线程池的执行槽）
+        engine = await run_in_threadpool(get_r_engine)
         
         # 更新进度
-        tasks[task_id].progress = 90
-        tasks[task_id].message = "正在生成报告..."
-        
-        # 保存结果
-        results[task_id] = result
+        await run_in_threadpool(task_store.update, task_id, message="正在执行数据分析...")
+        
+        # R端每个阶段开始/结束时更新任务进度（在分析线程中调用）
+        def report_progress(progress: int, message: str):
+            task_store.transition(task_id, [TaskStatus.RUNNING], TaskStatus.RUNNING, progress=progress, message=message)
+        
+        # 执行分析（在分析线程池中运行，不阻塞事件循环；超时、超出资源限制或被取消时终止R进程）
+        await _await_analysis(task_id, asyncio.ensure_future(
+            run_analysis(engine.analyze_data, csv_path, params, task_id, report_progress)
+        ))
+        
+        # 完成任务，结果保存在任务输出目录中，存储中只记录结果文件位置
+        await run_in_threadpool(
+            task_store.transition, task_id, [TaskStatus.RUNNING], TaskStatus.COMPLETED,
+            completed_at=datetime.now(SHANGHAI_TZ),
+            progress=100,
+            message="分析完成",
+            result_path=str(Path(settings.CHARTS_DIR) / task_id / "analysis_results.json"),
+        )
         
-        # 完成任务
-        tasks[task_id].status = TaskStatus.COMPLETED
-        tasks[task_id].completed_at = datetime.now(SHANGHAI_TZ)
-        tasks[task_id].progress = 100
-        tasks[task_id].message = "分析完成"
+    except job_control.JobCancelled:
+        # 状态已由取消接口设置
+        logger.info(f"任务 {task_id} 已取消，R进程已终止")
+    
+    except job_control.JobLimitExceeded as e:
+        logger.warning(f"任务 {task_id} 超出资源限制({e.limit}): {str(e)}")
+        await run_in_threadpool(
+            task_store.transition, task_id, [TaskStatus.RUNNING], TaskStatus.LIMIT_EXCEEDED,
+            completed_at=datetime.now(SHANGHAI_TZ),
+            limit_exceeded=e.limit,
+            error=str(e),
+            message=f"任务超出资源限制: {str(e)}",
+        )
         
     except Exception as e:
         # 任务失败
-        tasks[task_id].status = TaskStatus.FAILED
-        tasks[task_id].error = str(e)
-        tasks[task_id].message = f"分析失败: {str(e)}"
+        await run_in_threadpool(
+            task_store.transition, task_id, [TaskStatus.RUNNING], TaskStatus.FAILED,
+            error=str(e),
+            message=f"分析失败: {str(e)}",
+        )
+    
+    finally:
+        job_control.forget(task_id)
+
+def _dedup_key(csv_path: str, params: AnalysisParams) -> str:
+    """按数据文件内容和规范化后的分析参数计算去重键（file_id不同但内容相同的上传视为相同请求）"""
+    charts = resolve_chart_selection(params)
+    payload = {
+        "data": result_cache.file_digest(csv_path),
+        "params": {
+            **params.model_dump(exclude={"file_id", "charts"}),
+            "charts": sorted(charts) if charts is not None else None,
+        },
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def create_analysis_task(csv_path: str, params: AnalysisParams) -> Tuple[str, bool]:
+    """创建分析任务并提交到调度器（或共享队列），返回 (任务ID, 是否复用了执行中的相同任务)；队列已满时返回429
+
+    相同数据和参数的任务仍在排队或执行时，不再重复执行，直接返回该任务的ID。
+    """
+    task_id = str(uuid.uuid4())
+    dedup_key = None
+    if settings.ANALYSIS_DEDUP_ENABLED:
+        dedup_key = await run_in_threadpool(_dedup_key, csv_path, params)
+    
+    def _attached(existing_id: str) -> bool:
+        if existing_id == task_id:
+            return False
+        get_scheduler().record_deduplicated()
+        logger.info(f"相同的分析请求已在执行，复用任务 {existing_id}")
+        return True
+    
+    if settings.ANALYSIS_DISPATCH == "queue":
+        # 写入共享队列，由工作节点领取执行；排队任务数的检查和写入在同一事务中完成
+        task_info = TaskInfo(
+            task_id=task_id,
+            status=TaskStatus.PENDING,
+            message="任务已进入共享队列，等待工作节点执行..."
+        )
+        try:
+            existing_id = await run_in_threadpool(
+                task_store.create, task_info, csv_path, params.model_dump(), None, dedup_key,
+                settings.SCHEDULER_MAX_QUEUED
+            )
+        except TaskQueueFull:
+            raise HTTPException(
+                status_code=429,
+                detail="分析任务队列已满，请稍后重试",
+                headers={"Retry-After": str(settings.SCHEDULER_DEFAULT_JOB_SECONDS)}
+            )
+        return existing_id, _attached(existing_id)
+    
+    task_info = TaskInfo(
+        task_id=task_id,
+        status=TaskStatus.PENDING,
+        message="任务已创建，等待执行..."
+    )
+    existing_id = await run_in_threadpool(task_store.create, task_info, csv_path, params.model_dump(), OWNER_ID, dedup_key)
+    if _attached(existing_id):
+        return existing_id, True
+    try:
+        await schedule_analysis_task(task_id, csv_path, params)
+    except QueueFullError as e:
+        # 新提交的任务未被接受，移除后返回429由客户端重试
+        await run_in_threadpool(task_store.delete, task_id)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return task_id, False
+
+async def schedule_analysis_task(task_id: str, csv_path: str, params: AnalysisParams):
+    """将已保存的任务提交到调度器；队列已满时抛出QueueFullError（任务记录保持不变，由调用方处理）
+
+    调度器只能在事件循环中访问，任务存储的读写在线程池中执行。
+    """
+    lane = await run_in_threadpool(classify_lane, csv_path, params, resolve_chart_selection(params))
+    # 提交前记录通道：立即开始执行的任务会马上离开PENDING状态
+    await run_in_threadpool(task_store.transition, task_id, [TaskStatus.PENDING], TaskStatus.PENDING, lane=lane)
+    position = get_scheduler().submit(
+        task_id, lane, lambda: run_analysis_task(task_id, csv_path, params)
+    )
+    
+    if position > 0:
+        await run_in_threadpool(
+            task_store.transition, task_id, [TaskStatus.PENDING], TaskStatus.PENDING,
+            queue_position=position, message=f"任务排队中，前面还有 {position - 1} 个任务"
+        )
+
+async def requeue_orphaned_tasks(shared: bool = False):
+    """接管已退出进程遗留的未完成任务并重新排队（启动时和心跳时调用）
+
+    shared为True或使用共享队列分发时，任务退回共享队列由工作节点重新领取，否则在当前进程中重新执行。
+    任务存储的读写都在线程池中执行，不阻塞事件循环。
+    """
+    shared = shared or settings.ANALYSIS_DISPATCH == "queue"
+    jobs = await run_in_threadpool(
+        task_store.claim_orphaned,
+        None if shared else OWNER_ID, settings.TASK_OWNER_TIMEOUT, settings.TASK_MAX_ATTEMPTS
+    )
+    for job in jobs:
+        if shared:
+            logger.info(f"遗留任务 {job['task_id']} 已退回共享队列（第 {job['attempts'] + 1} 次执行）")
+            continue
+        logger.info(f"重新排队遗留任务: {job['task_id']}")
+        try:
+            await schedule_analysis_task(job["task_id"], job["csv_path"], AnalysisParams(**job["params"]))
+        except QueueFullError:
+            # 交还给原进程的名下，保持PENDING，下次心跳时重新接管并排队
+            logger.warning(f"任务队列已满，遗留任务 {job['task_id']} 将在下次心跳时重试")
+            await run_in_threadpool(
+                task_store.transition, job["task_id"], [TaskStatus.PENDING], TaskStatus.PENDING,
+                owner=job["previous_owner"], message="任务队列已满，等待重新排队..."
+            )
+        except Exception as e:
+            logger.error(f"重新排队任务 {job['task_id']} 失败: {str(e)}")
+            await run_in_threadpool(
+                task_store.transition, job["task_id"], [TaskStatus.PENDING], TaskStatus.FAILED,
+                error=str(e), message=f"任务恢复失败: {str(e)}"
+            )
+
+async def task_owner_heartbeat(shared: bool = False):
+    """定期写入进程心跳（续约当前进程持有的任务），并接管心跳超时的进程遗留的任务"""
+    while True:
+        try:
+            await run_in_threadpool(task_store.heartbeat, OWNER_ID)
+            await requeue_orphaned_tasks(shared)
+        except Exception as e:
+            logger.error(f"任务存储心跳失败: {str(e)}")
+        await asyncio.sleep(settings.TASK_OWNER_HEARTBEAT)
 
 @router.post("/analyze", response_model=TaskCreateResponse)
-async def start_analysis(
-    params: AnalysisParams,
-    background_tasks: BackgroundTasks
-):
+async def start_analysis(params: AnalysisParams):
     """
     启动数据分析任务
     """
@@ -93,18 +275,11 @@ async def start_analysis(
         if not params.file_id:
             raise HTTPException(status_code=400, detail="缺少file_id参数")
         
-        # 生成任务ID
-        task_id = str(uuid.uuid4())
-        
-        # 创建任务信息
-        task_info = TaskInfo(
-            task_id=task_id,
-            status=TaskStatus.PENDING,
-            message="任务已创建，等待执行..."
-        )
-        
-        # 保存任务
-        tasks[task_id] = task_info
+        # 校验图表选择参数
+        try:
+            resolve_chart_selection(params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # 构建文件路径 - 使用绝对路径，避免重复.csv后缀
         # 确保file_id不重复包含.csv后缀
@@ -116,27 +291,158 @@ async def start_analysis(
         uploads_dir = Path(settings.UPLOAD_DIR)
         csv_path = str(uploads_dir / f"{file_id}.csv")
         
-        # 添加后台任务
-        background_tasks.add_task(run_analysis_task, task_id, csv_path, params)
+        # 创建任务并提交到任务调度器
+        task_id, deduplicated = await create_analysis_task(csv_path, params)
         
         return TaskCreateResponse(
             success=True,
-            message="分析任务已启动",
+            message="相同的分析任务正在执行，已关联到该任务" if deduplicated else "分析任务已启动",
             task_id=task_id,
-            estimated_duration=120  # 预估2分钟
+            estimated_duration=120,  # 预估2分钟
+            deduplicated=deduplicated
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"启动分析任务失败: {str(e)}")
 
+@router.post("/task/{task_id}/append")
+async def append_task_data(task_id: str, file: UploadFile = File(...)):
+    """
+    为已完成的任务追加新的测量数据（只需上传新增的行），增量更新统计结果
+    """
+    try:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="只支持CSV文件格式")
+        
+        task_dir = Path(settings.CHARTS_DIR) / task_id
+        if not (task_dir / "analysis_results.json").exists():
+            raise HTTPException(status_code=404, detail=f"任务 {task_id} 的分析结果不存在")
+        
+        # 与文件上传相同，分块写入临时文件并限制大小，不将整个文件读入内存
+        incoming_path = task_dir / f".incoming_{uuid.uuid4().hex}.csv"
+        try:
+            try:
+                await upload_store.stream_to_file(file, incoming_path)
+            except upload_store.UploadTooLarge as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            loop = asyncio.get_running_loop()
+            try:
+                updated_results = await loop.run_in_executor(None, append_rows, task_id, incoming_path)
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            try:
+                incoming_path.unlink()
+            except FileNotFoundError:
+                pass
+        
+        return {
+            "success": True,
+            "message": f"已追加 {updated_results['incremental']['appended_rows']} 行数据",
+            "task_id": task_id,
+            "summary": updated_results.get("summary", {}),
+            "incremental": updated_results["incremental"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"追加数据失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"追加数据失败: {str(e)}")
+
+# 已结束的任务状态，推送到这些状态后不再变化
+TERMINAL_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.LIMIT_EXCEEDED}
+
+def _apply_queue_position(task_info: TaskInfo):
+    """排队中的任务使用本进程调度器中的实时排队位置"""
+    if task_info.status == TaskStatus.PENDING:
+        position = get_scheduler().position(task_info.task_id)
+        if position is not None:
+            task_info.queue_position = position
+            task_info.message = f"任务排队中，前面还有 {position - 1} 个任务"
+
+def _parse_task_ids(task_ids: str) -> list:
+    ids = list(dict.fromkeys(item.strip() for item in task_ids.split(",") if item.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="请提供任务ID")
+    if len(ids) > settings.TASK_STREAM_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {settings.TASK_STREAM_MAX_IDS} 个任务")
+    return ids
+
+async def _task_payloads(task_ids: list) -> Dict[str, Any]:
+    """批量读取任务状态（在线程池中查询任务存储），不存在的任务返回 status=not_found"""
+    tasks = await run_in_threadpool(task_store.get_many, task_ids)
+    payloads = {}
+    for task_id in task_ids:
+        task_info = tasks.get(task_id)
+        if task_info is None:
+            payloads[task_id] = {"task_id": task_id, "status": "not_found"}
+            continue
+        _apply_queue_position(task_info)
+        payloads[task_id] = task_info.model_dump(mode="json")
+    return payloads
+
+@router.get("/tasks/status")
+async def get_tasks_status(task_ids: str = Query(..., description="逗号分隔的任务ID")):
+    """
+    批量获取任务状态（只读取任务存储，不读取历史记录），供需要轮询的客户端使用
+    """
+    return {
+        "success": True,
+        "message": "获取任务状态成功",
+        "tasks": await _task_payloads(_parse_task_ids(task_ids))
+    }
+
+async def _task_event_stream(request: Request, task_ids: list):
+    last_states: Dict[str, tuple] = {}
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        payloads = await _task_payloads(task_ids)
+        for task_id, payload in payloads.items():
+            state = (payload["status"], payload.get("progress"), payload.get("message"), payload.get("queue_position"))
+            if last_states.get(task_id) != state:
+                last_states[task_id] = state
+                last_sent = time.monotonic()
+                yield f"event: task\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        
+        # 所有任务都已结束时关闭连接
+        if all(payload["status"] == "not_found" or TaskStatus(payload["status"]) in TERMINAL_STATUSES
+               for payload in payloads.values()):
+            yield "event: end\ndata: {}\n\n"
+            return
+        
+        if time.monotonic() - last_sent >= settings.TASK_STREAM_KEEPALIVE:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(settings.TASK_STREAM_INTERVAL)
+
+@router.get("/tasks/stream")
+async def stream_tasks_status(request: Request, task_ids: str = Query(..., description="逗号分隔的任务ID")):
+    """
+    通过SSE推送一个或多个任务的状态变化（状态、进度、消息、排队位置），所有任务结束后发送end事件并关闭连接
+    """
+    return StreamingResponse(
+        _task_event_stream(request, _parse_task_ids(task_ids)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/task/{task_id}")
 async def get_task_status(task_id: str):
     """
     获取任务状态 - 支持从活动任务和历史记录中获取
     """
-    # 首先检查活动任务
-    if task_id in tasks:
-        task_info = tasks[task_id]
+    # 首先检查任务存储
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    if task_info is not None:
+        
+        # 排队中的任务返回实时排队位置
+        _apply_queue_position(task_info)
         
         # 如果是已完成的任务，尝试从历史记录中补充信息
         if task_info.status == TaskStatus.COMPLETED:
@@ -179,7 +485,6 @@ async def get_task_status(task_id: str):
             logger.info(f"历史记录文件存在，读取数据...")
             with open(history_file, 'r', encoding='utf-8') as f:
                 record = json.load(f)
-            logger.info(f"历史记录内容: {record}")
             
             # 构建任务信息（兼容TaskInfo格式）
             from datetime import datetime
@@ -237,6 +542,22 @@ async def get_task_status(task_id: str):
     # 任务不存在
     raise HTTPException(status_code=404, detail="任务不存在")
 
+@router.get("/task/{task_id}/timings")
+async def get_task_timings(task_id: str):
+    """
+    获取任务各分析阶段和每个图表的耗时（失败或超时的任务记录到中断时为止）
+    """
+    timings = load_timings(Path(settings.CHARTS_DIR) / task_id)
+    if timings is None:
+        raise HTTPException(status_code=404, detail="任务耗时记录不存在")
+    
+    return {
+        "success": True,
+        "message": "获取任务耗时成功",
+        "task_id": task_id,
+        "timings": timings
+    }
+
 @router.get("/results/{task_id}")
 async def get_analysis_results(task_id: str):
     """
@@ -386,18 +707,46 @@ async def list_tasks():
         logger.error(f"获取任务列表失败: {e}", exc_info=True)
         return {"success": False, "message": f"获取任务列表失败: {str(e)}", "tasks": []}
 
+@router.post("/task/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """
+    取消排队中或执行中的分析任务，执行中的任务会终止其R进程
+    """
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    cancelled = await run_in_threadpool(
+        task_store.transition, task_id, [TaskStatus.PENDING, TaskStatus.RUNNING], TaskStatus.CANCELLED,
+        queue_position=None,
+        completed_at=datetime.now(SHANGHAI_TZ),
+        message="任务已取消",
+    )
+    if not cancelled:
+        raise HTTPException(status_code=400, detail=f"任务已结束（{task_info.status.value}），无法取消")
+    
+    _stop_task(task_id)
+    
+    return {
+        "success": True,
+        "message": "任务已取消",
+        "task": await run_in_threadpool(task_store.get, task_id)
+    }
+
 @router.delete("/task/{task_id}")
 async def delete_task(task_id: str):
     """
-    删除任务
+    删除任务（排队中或执行中的任务会先被取消）
     """
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="任务不存在")
+    await run_in_threadpool(
+        task_store.transition, task_id, [TaskStatus.PENDING, TaskStatus.RUNNING], TaskStatus.CANCELLED,
+        message="任务已取消"
+    )
+    _stop_task(task_id)
     
-    # 删除任务和结果
-    del tasks[task_id]
-    if task_id in results:
-        del results[task_id]
+    # 删除任务（分析结果文件保留在任务输出目录中）
+    if not await run_in_threadpool(task_store.delete, task_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
     
     return {
         "success": True,
@@ -413,7 +762,7 @@ async def download_report(task_id: str):
             raise HTTPException(status_code=400, detail="无效的任务ID")
         
         # 获取R分析引擎
-        engine = get_r_engine()
+        engine = await run_in_threadpool(get_r_engine)
         
         # 检查分析结果是否存在
         results_file = Path(settings.CHARTS_DIR) / task_id / "analysis_results.json"
@@ -446,7 +795,9 @@ async def download_report(task_id: str):
                 logger.warning(f"自动生成DeepSeek分析失败: {str(e)}，将生成不包含AI分析的报告")
         
         # 强制重新生成Word报告，确保是最新的（包含DeepSeek分析如果存在）
-        report_path = engine.generate_comprehensive_word_report(
+        # 报告生成可能需要渲染图表，在线程池中执行
+        report_path = await run_in_threadpool(
+            engine.generate_comprehensive_word_report,
             task_id=task_id, 
             analysis_data=json.loads(results_file.read_text(encoding='utf-8')),
             deepseek_report=json.loads(deepseek_file.read_text(encoding='utf-8')).get('report', '') if deepseek_file.exists() else ''
@@ -509,8 +860,8 @@ async def download_comprehensive_report(task_id: str):
                 deepseek_report = deepseek_data.get('report', '')
         
         # 生成Word报告
-        engine = get_r_engine()
-        report_path = engine.generate_comprehensive_word_report(task_id, analysis_data, deepseek_report)
+        engine = await run_in_threadpool(get_r_engine)
+        report_path = await run_in_threadpool(engine.generate_comprehensive_word_report, task_id, analysis_data, deepseek_report)
         
         if not report_path or not os.path.exists(report_path):
             raise HTTPException(status_code=404, detail="综合报告生成失败")
@@ -662,7 +1013,9 @@ async def get_storage_stats():
                 "report_files": report_files,
                 "total_size": total_size,
                 "chart_size_mb": round(chart_size / 1024 / 1024, 1),
-                "report_size_mb": round(report_size / 1024 / 1024, 1)
+                "report_size_mb": round(report_size / 1024 / 1024, 1),
+                "result_cache": result_cache.get_cache_stats(),
+                "frame_cache": frame_cache.get_cache_stats()
             }
         }
     except Exception as e:
@@ -705,6 +1058,18 @@ async def clear_cache():
                     cleared_items.append(f"清理临时目录: {temp_path}")
                     total_freed += size_before
         
+        # 清理分析结果缓存
+        cache_stats = result_cache.get_cache_stats()
+        cleared_entries = result_cache.clear()
+        if cleared_entries:
+            cleared_items.append(f"清理分析结果缓存: {cleared_entries} 个条目")
+            total_freed += int(cache_stats["size_mb"] * 1024 * 1024)
+        
+        # 清理内存中的数据帧缓存
+        cleared_frames = frame_cache.clear()
+        if cleared_frames:
+            cleared_items.append(f"清理数据帧缓存: {cleared_frames} 个文件")
+        
         # 清理过期的报告文件（超过7天的）
         reports_dir = Path("temp/reports")
         if reports_dir.exists():
@@ -819,6 +1184,10 @@ async def clear_all_data():
                     count += 1
             cleared_items.append(f"删除图表目录: {count} 个")
         
+        # 清理分析结果缓存
+        count = result_cache.clear()
+        cleared_items.append(f"删除分析结果缓存: {count} 个")
+        
         # 清理报告文件
         reports_dir = Path("temp/reports")
         if reports_dir.exists():
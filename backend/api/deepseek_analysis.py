@@ -2,6 +2,7 @@
 DeepSeek AI分析API
 """
 from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import json
 import logging
@@ -608,7 +609,8 @@ async def generate_comprehensive_word_report(task_id: str):
         # 4. 生成综合Word报告
         logger.info("开始生成综合Word报告...")
         try:
-            comprehensive_report_path = engine.generate_comprehensive_word_report(
+            comprehensive_report_path = await run_in_threadpool(
+                engine.generate_comprehensive_word_report,
                 task_id=task_id,
                 analysis_data=analysis_data,
                 deepseek_report=deepseek_report
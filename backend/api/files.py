@@ -1,64 +1,172 @@
 """
 文件上传API路由
 """
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks, Form
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Request, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-import aiofiles
 import os
 import uuid
 from pathlib import Path
-import pandas as pd
-import json
-from typing import List
+import logging
+from typing import List, Optional
 
 from ..core.config import settings
-from ..models.schemas import FileUploadResponse, DataPreview, DataValidationResult, AnalysisParams, TaskInfo, TaskStatus
-from .analysis import run_analysis_task, tasks, get_r_engine
+from ..models.schemas import FileUploadResponse, DataPreview, DataValidationResult, AnalysisParams, ResumableUploadRequest
+from .analysis import create_analysis_task, get_r_engine
+from ..services.chart_renderer import ensure_chart
+from ..services import upload_store, data_profile, columnar_store, frame_cache
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+async def _store_upload(file: UploadFile, background_tasks: BackgroundTasks) -> FileUploadResponse:
+    """保存上传的CSV文件，并安排在响应返回后生成数据概况和列式文件（/upload 和 /upload-and-analyze 共用）"""
+    # 验证文件类型
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="只支持CSV文件格式")
+    
+    # 生成唯一文件名
+    file_id = str(uuid.uuid4())
+    file_extension = Path(file.filename).suffix
+    new_filename = f"{file_id}{file_extension}"
+    
+    # 确保上传目录存在
+    upload_dir = Path(settings.UPLOAD_DIR)
+    upload_dir.mkdir(exist_ok=True)
+    file_path = upload_dir / new_filename
+    
+    # 分块写入文件，同时检查大小并计算哈希和行数
+    try:
+        meta = await upload_store.save_upload(file, file_path)
+    except upload_store.UploadTooLarge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 数据概况和列式文件在响应返回后生成
+    background_tasks.add_task(data_profile.process_upload, file_path)
+    
+    return FileUploadResponse(
+        success=True,
+        message="文件上传成功",
+        filename=new_filename,
+        file_size=meta["size"],
+        file_id=file_id,
+        rows=meta["rows"],
+        sha256=meta["sha256"]
+    )
+
 @router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     上传CSV文件
     """
     try:
-        # 验证文件类型
-        if not file.filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="只支持CSV文件格式")
-        
-        # 检查文件大小
-        file_size = 0
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="文件大小超过限制")
-        
-        # 生成唯一文件名
+        return await _store_upload(file, background_tasks)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+
+@router.post("/uploads")
+async def create_resumable_upload(request: ResumableUploadRequest):
+    """
+    创建断点续传上传会话，返回上传ID和分块信息
+    """
+    try:
+        session = upload_store.create_session(
+            request.filename, request.total_size, request.chunk_size, request.sha256
+        )
+        return {
+            "success": True,
+            "message": "上传会话已创建",
+            **upload_store.session_status(session)
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建上传会话失败: {str(e)}")
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(upload_id: str, index: int, request: Request):
+    """
+    上传一个分块（请求体为分块的原始字节），同一会话的分块可以并发上传，重复上传时覆盖
+    """
+    try:
+        session = upload_store.load_session(upload_id)
+        size = await upload_store.write_chunk(session, index, request.stream())
+        return {
+            "success": True,
+            "message": f"分块 {index} 已接收",
+            "index": index,
+            "size": size
+        }
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"分块上传失败: {str(e)}")
+
+@router.get("/uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str):
+    """
+    查询上传会话已收到的分块范围，用于中断后续传
+    """
+    try:
+        session = upload_store.load_session(upload_id)
+        return {
+            "success": True,
+            "message": "获取上传状态成功",
+            **upload_store.session_status(session)
+        }
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取上传状态失败: {str(e)}")
+
+@router.post("/uploads/{upload_id}/complete", response_model=FileUploadResponse)
+async def complete_resumable_upload(upload_id: str, background_tasks: BackgroundTasks):
+    """
+    合并全部分块为上传文件并校验，返回与 /upload 相同的结果
+    """
+    try:
+        session = upload_store.load_session(upload_id)
         file_id = str(uuid.uuid4())
-        file_extension = Path(file.filename).suffix
-        new_filename = f"{file_id}{file_extension}"
-        
-        # 确保上传目录存在
-        upload_dir = Path(settings.UPLOAD_DIR)
-        upload_dir.mkdir(exist_ok=True)
-        file_path = upload_dir / new_filename
-        
-        # 保存文件
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        new_filename = f"{file_id}{Path(session['filename']).suffix}"
+        file_path = Path(settings.UPLOAD_DIR) / new_filename
+        meta = await run_in_threadpool(upload_store.assemble, session, file_path)
+        background_tasks.add_task(data_profile.process_upload, file_path)
         
         return FileUploadResponse(
             success=True,
             message="文件上传成功",
             filename=new_filename,
-            file_size=file_size,
-            file_id=file_id
+            file_size=meta["size"],
+            file_id=file_id,
+            rows=meta["rows"],
+            sha256=meta["sha256"]
         )
-        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, upload_store.UploadTooLarge) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"合并上传文件失败: {str(e)}")
+
+@router.delete("/uploads/{upload_id}")
+async def abort_resumable_upload(upload_id: str):
+    """
+    放弃上传会话并删除已收到的分块
+    """
+    try:
+        upload_store.load_session(upload_id)
+        upload_store.discard_session(upload_id)
+        return {
+            "success": True,
+            "message": "上传会话已删除"
+        }
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除上传会话失败: {str(e)}")
 
 @router.get("/preview/{filename}")
 async def preview_data(filename: str):
@@ -71,48 +179,18 @@ async def preview_data(filename: str):
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="文件不存在")
         
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
-        
-        # 数据预处理
-        df_processed = df.copy()
-        
-        # 如果有力值列，进行数据清理
-        force_col = None
-        for col in df.columns:
-            if '力值' in col or 'force' in col.lower() or '力' in col:
-                force_col = col
-                break
-        
-        if force_col:
-            # 清理力值列中的字母N等非数值字符
-            df_processed[force_col] = df_processed[force_col].astype(str)
-            df_processed[force_col] = df_processed[force_col].str.replace('[^\d.-]', '', regex=True)
-            df_processed[force_col] = pd.to_numeric(df_processed[force_col], errors='coerce')
-        
-        # 生成基础统计信息
-        basic_stats = {}
-        if force_col and not df_processed[force_col].empty:
-            force_data = df_processed[force_col].dropna()
-            if len(force_data) > 0:
-                basic_stats = {
-                    'count': len(force_data),
-                    'mean': float(force_data.mean()),
-                    'std': float(force_data.std()),
-                    'min': float(force_data.min()),
-                    'max': float(force_data.max()),
-                    'range': float(force_data.max() - force_data.min())
-                }
+        # 从上传时生成的数据概况中读取（概况不存在或已失效时重新生成）
+        profile = await run_in_threadpool(data_profile.ensure_profile, file_path)
         
         # 生成预览数据
         preview = DataPreview(
             filename=filename,
-            total_rows=len(df),
-            columns=df.columns.tolist(),
-            sample_data=df.head(10).to_dict('records'),
-            data_types={col: str(dtype) for col, dtype in df.dtypes.items()},
-            missing_values={col: df[col].isnull().sum() for col in df.columns},
-            basic_stats=basic_stats
+            total_rows=profile["row_count"],
+            columns=profile["columns"],
+            sample_data=profile["sample_data"],
+            data_types=profile["data_types"],
+            missing_values=profile["missing_values"],
+            basic_stats=profile["basic_stats"]
         )
         
         return {
@@ -135,68 +213,9 @@ async def validate_data(filename: str):
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="文件不存在")
         
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
-        
-        # 增加与preview和R脚本一致的清理逻辑
-        force_col_name = None
-        for col in df.columns:
-            if '力值' in col or 'force' in col.lower() or '力' in col:
-                force_col_name = col
-                break
-
-        if force_col_name:
-            # 清理力值列中的字母N等非数值字符，再进行验证
-            df[force_col_name] = pd.to_numeric(
-                df[force_col_name].astype(str).str.replace('[^\\d.-]', '', regex=True),
-                errors='coerce'
-            )
-        
-        # 期望的列名
-        expected_columns = ['序号', 'X', 'Y', 'Z', '力值']
-        actual_columns = df.columns.tolist()
-        
-        # 检查列名
-        missing_columns = [col for col in expected_columns if col not in actual_columns]
-        extra_columns = [col for col in actual_columns if col not in expected_columns]
-        
-        errors = []
-        warnings = []
-        
-        # 验证必要列
-        if missing_columns:
-            errors.append(f"缺少必要列: {', '.join(missing_columns)}")
-        
-        # 检查额外列
-        if extra_columns:
-            warnings.append(f"包含额外列: {', '.join(extra_columns)}")
-        
-        # 检查数据类型
-        if '力值' in df.columns:
-            # 验证 '力值' 列是否为数字，且没有因转换失败而产生的空值
-            if not pd.api.types.is_numeric_dtype(df['力值']) or df['力值'].isnull().any():
-                errors.append("力值列包含无法解析的非数值数据")
-        
-        # 检查空值 (在数据清理之后)
-        if df.isnull().any().any():
-            null_cols = df.columns[df.isnull().any()].tolist()
-            warnings.append(f"以下列包含空值: {', '.join(null_cols)}")
-        
-        # 检查数据量
-        if len(df) < 10:
-            warnings.append("数据量过少，可能影响分析结果")
-        
-        validation_result = DataValidationResult(
-            is_valid=len(errors) == 0,
-            errors=errors,
-            warnings=warnings,
-            row_count=len(df),
-            column_count=len(df.columns),
-            expected_columns=expected_columns,
-            actual_columns=actual_columns,
-            missing_columns=missing_columns,
-            extra_columns=extra_columns
-        )
+        # 验证结果在生成数据概况时计算（力值列已按与preview和R脚本一致的规则清理）
+        profile = await run_in_threadpool(data_profile.ensure_profile, file_path)
+        validation_result = DataValidationResult(**profile["validation"])
         
         return {
             "success": True,
@@ -242,16 +261,28 @@ async def get_chart(chart_name: str):
         raise HTTPException(status_code=500, detail=f"获取图表失败: {str(e)}")
 
 @router.get("/chart/{task_id}/{chart_name}")
-async def get_chart_by_task(task_id: str, chart_name: str):
+async def get_chart_by_task(task_id: str, chart_name: str, profile: Optional[str] = None):
     """
     根据任务ID获取特定的图表文件
+    
+    profile为图表输出配置名（如 screen / report / print），未指定时返回默认配置的图表
     """
     try:
         # 检查图表文件名是否安全
-        allowed_extensions = ['.png', '.jpg', '.jpeg', '.svg']
+        allowed_extensions = ['.png', '.jpg', '.jpeg', '.svg', '.webp']
         if not any(chart_name.endswith(ext) for ext in allowed_extensions):
             raise HTTPException(status_code=400, detail="不支持的图片格式")
         
+        # 指定输出配置时，按该配置查找或渲染图表
+        if profile is not None:
+            try:
+                chart_path = await ensure_chart(task_id, Path(chart_name).stem, profile)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if chart_path is None:
+                raise HTTPException(status_code=404, detail=f"任务 {task_id} 的图表文件 {chart_name} 不存在")
+            return FileResponse(path=chart_path, filename=chart_path.name)
+        
         # 按优先级查找图表文件
         search_paths = [
             Path(settings.CHARTS_DIR) / task_id / chart_name,  # 专用任务目录
@@ -267,6 +298,10 @@ async def get_chart_by_task(task_id: str, chart_name: str):
                 chart_path = path
                 break
         
+        # 按需渲染模式下图表在首次请求时生成
+        if chart_path is None and chart_name.endswith('.png'):
+            chart_path = await ensure_chart(task_id, chart_name[:-len('.png')])
+        
         if chart_path is None:
             raise HTTPException(status_code=404, detail=f"任务 {task_id} 的图表文件 {chart_name} 不存在")
         
@@ -361,6 +396,10 @@ async def delete_file(filename: str):
             raise HTTPException(status_code=404, detail="文件不存在")
         
         file_path.unlink()
+        upload_store.remove_meta(file_path)
+        data_profile.remove_profile(file_path)
+        columnar_store.remove_columnar(file_path)
+        frame_cache.invalidate(file_path)
         
         return {
             "success": True,
@@ -383,7 +422,7 @@ async def upload_and_analyze(
     """
     try:
         # 1. 上传文件
-        upload_response = await upload_file(file)
+        upload_response = await _store_upload(file, background_tasks)
         file_id = upload_response.file_id
         
         # 2. 解析参数
@@ -413,29 +452,19 @@ async def upload_and_analyze(
             tolerance_pct=tolerance_pct_list
         )
 
-        # 生成任务ID
-        task_id = str(uuid.uuid4())
-        
-        # 创建任务信息
-        task_info = TaskInfo(
-            task_id=task_id,
-            status=TaskStatus.PENDING,
-            message="任务已创建，等待执行..."
-        )
-        tasks[task_id] = task_info
-        
         # 构建文件路径
         uploads_dir = Path(settings.UPLOAD_DIR)
         csv_path = str(uploads_dir / f"{file_id}.csv")
         
-        # 添加后台任务
-        background_tasks.add_task(run_analysis_task, task_id, csv_path, params)
+        # 创建任务并提交到任务调度器（队列已满时返回429）
+        task_id, deduplicated = await create_analysis_task(csv_path, params)
         
         return {
             "success": True,
-            "message": "文件上传成功，分析任务已启动",
+            "message": "文件上传成功，相同的分析任务正在执行，已关联到该任务" if deduplicated else "文件上传成功，分析任务已启动",
             "file_id": file_id,
-            "task_id": task_id
+            "task_id": task_id,
+            "deduplicated": deduplicated
         }
 
     except HTTPException as e:
@@ -2,7 +2,7 @@
 应用配置管理
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List
 import os
 from pathlib import Path
 
@@ -40,12 +40,83 @@ class Settings(BaseSettings):
     # 通常在macOS上是 /usr/local/bin/R, 在Windows上可能是 C:\\Program Files\\R\\R-4.x.x\\bin\\x64
     R_HOME: str = "/usr/local/bin"
     
+    # R执行方式: "pool" = 常驻R工作进程池（默认）, "subprocess" = 每次分析启动一个Rscript进程,
+    #            "rpy2" = 通过rpy2在进程内嵌入R会话执行（任务串行执行）
+    R_EXECUTION_MODE: str = "pool"
+    R_WORKER_POOL_SIZE: int = 2  # 常驻R工作进程数量
+    R_WORKER_MAX_JOBS: int = 50  # 单个工作进程处理多少个任务后回收
+    R_WORKER_MAX_MEMORY_MB: int = 2048  # 工作进程内存占用超过该值(MB)后回收
+    R_WORKER_START_TIMEOUT: int = 120  # 等待工作进程加载R包的超时时间(秒)
+    # 单个R分析任务的资源上限（类Unix系统上通过rlimit设置，0表示不限制），墙钟超时见 TASK_TIMEOUT
+    R_JOB_MAX_MEMORY_MB: int = 4096  # R进程地址空间上限(MB)
+    R_JOB_MAX_CPU_SECONDS: int = 600  # 单个任务的CPU时间上限(秒)
+    R_CHART_WORKERS: int = 0  # 每个分析任务并行渲染图表的进程数（0 = 使用全部CPU核心，1 = 串行）
+    ANALYSIS_MAX_CONCURRENCY: int = 2  # 同时执行的R分析任务数，超出的任务排队等待
+    SCHEDULER_MAX_QUEUED: int = 20  # 排队任务上限，超过后返回429
+    SCHEDULER_FAST_MAX_CHARTS: int = 6  # 图表数不超过该值的任务进入快速通道
+    SCHEDULER_FAST_MAX_FILE_MB: float = 1.0  # 数据文件不超过该大小(MB)的任务进入快速通道
+    SCHEDULER_FAST_BURST: int = 4  # normal通道有任务等待时，连续执行该数量的fast任务后让一个normal任务先执行
+    SCHEDULER_NORMAL_MAX_WAIT: int = 300  # normal任务排队超过该时间(秒)后优先于fast任务执行
+    SCHEDULER_DEFAULT_JOB_SECONDS: int = 60  # 尚无完成任务时估算排队时间使用的单个任务耗时(秒)
+    
+    # 任务存储: sqlite（多个工作进程共享，重启后可恢复）或 memory（仅当前进程）
+    TASK_STORE_BACKEND: str = "sqlite"
+    TASK_STORE_PATH: str = os.path.join(BASE_DIR, "backend", "output", "tasks.db")
+    TASK_OWNER_HEARTBEAT: int = 10  # 进程心跳间隔(秒)
+    TASK_OWNER_TIMEOUT: int = 30  # 进程心跳超时(秒)，超时进程的未完成任务由其他进程重新排队
+    TASK_STORE_WAL: bool = True  # 任务数据库位于网络文件系统（多节点共享）上时设为False
+    TASK_MAX_ATTEMPTS: int = 3  # 执行进程异常退出导致任务中断的最大次数，达到后任务标记为失败
+    
+    # 任务分发: local（由接收请求的服务进程执行）或 queue（写入共享队列，由各节点的 run_worker.py 工作进程执行）
+    # 多节点部署时所有节点需使用同一个 TASK_STORE_PATH、UPLOAD_DIR 和 CHARTS_DIR（共享存储）
+    ANALYSIS_DISPATCH: str = "local"
+    WORKER_POLL_INTERVAL: float = 2.0  # 工作进程轮询共享队列的间隔(秒)
+    ANALYSIS_DEDUP_ENABLED: bool = True  # 相同数据和参数的任务正在排队或执行时复用该任务，不重复执行
+    
+    # 任务状态推送（SSE）
+    TASK_STREAM_INTERVAL: float = 0.5  # 检查任务状态变化的间隔(秒)
+    TASK_STREAM_KEEPALIVE: int = 15  # 没有状态变化时发送保活注释的间隔(秒)
+    TASK_STREAM_MAX_IDS: int = 50  # 单个连接/批量查询最多订阅的任务数
+    
+    # 图表按需渲染: 分析完成时只渲染预渲染列表中的图表，其余图表在首次被请求时渲染并缓存到磁盘
+    CHART_LAZY_RENDERING: bool = True
+    CHART_PRERENDER_LIST: List[str] = [
+        "force_time_series", "force_histogram", "force_boxplot",
+        "deviation_analysis", "percentage_deviation", "correlation_matrix"
+    ]
+    
+    # 图表输出配置: dpi、尺寸缩放比例（相对于R脚本中的默认英寸尺寸）和格式（png / webp / svg）
+    # 默认配置的图表保存为 <任务目录>/<图表名>.png（格式固定为png），
+    # 其他配置在首次请求时从绘图上下文渲染到 <任务目录>/<配置名>/<图表名>.<格式>
+    CHART_PROFILES: Dict[str, Dict[str, Any]] = {
+        "screen": {"dpi": 100, "scale": 0.8, "format": "png"},  # 页面显示
+        "web": {"dpi": 100, "scale": 0.8, "format": "webp"},  # 页面显示（WebP，体积更小）
+        "report": {"dpi": 150, "scale": 0.6, "format": "png"},  # Word报告（以6英寸宽嵌入）
+        "print": {"dpi": 300, "scale": 1.0, "format": "png"},  # 原始的300dpi高清图
+        "vector": {"dpi": 72, "scale": 1.0, "format": "svg"},  # 矢量图（需要R包svglite）
+    }
+    CHART_DEFAULT_PROFILE: str = "screen"  # 分析时生成的<图表名>.png使用的配置
+    CHART_REPORT_PROFILE: str = "report"  # Word报告中嵌入图表使用的配置（须为png格式）
+    
+    # 分析结果缓存: 数据文件内容、分析参数和R脚本都相同时直接复用已有的分析产物
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_MB: int = 2048  # 缓存总大小上限(MB)，超过后按最近使用时间淘汰
+    
     # 文件上传和处理目录 - 统一存放在 backend/output 目录下
     UPLOAD_DIR: str = os.path.join(BASE_DIR, "backend", "uploads")
     CHARTS_DIR: str = os.path.join(BASE_DIR, "backend", "output", "charts")
     REPORTS_DIR: str = os.path.join(BASE_DIR, "backend", "output", "reports")
     HISTORY_DIR: str = os.path.join(BASE_DIR, "backend", "output", "history")
-    MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
+    RESULT_CACHE_DIR: str = os.path.join(BASE_DIR, "backend", "output", "cache")
+    MAX_FILE_SIZE: int = 500 * 1024 * 1024  # 500MB，上传内容分块写入磁盘，不占用等量内存
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 上传分块读取大小(字节)
+    PROFILE_CHUNK_ROWS: int = 200000  # 生成上传数据概况和列式文件时每次读取的行数
+    COLUMNAR_ENABLED: bool = True  # 上传时将CSV转换为Parquet供后续读取（需要安装pyarrow，R端需要arrow包）
+    COLUMNAR_COMPRESSION: str = "zstd"  # Parquet压缩算法
+    FRAME_CACHE_MAX_MB: int = 256  # 进程内已解析数据帧缓存的内存上限(MB)，0表示不缓存
+    RESUMABLE_CHUNK_SIZE: int = 8 * 1024 * 1024  # 断点续传上传的默认分块大小(字节)
+    RESUMABLE_MAX_CHUNK_SIZE: int = 64 * 1024 * 1024  # 断点续传上传允许的最大分块大小(字节)
+    RESUMABLE_UPLOAD_TTL: int = 24 * 3600  # 断点续传上传会话超过该时间(秒)未更新时被清理
     ALLOWED_EXTENSIONS: List[str] = [".csv"]
     
     # 静态文件配置
@@ -61,7 +132,7 @@ class Settings(BaseSettings):
     DEFAULT_TOLERANCE_PCT: List[float] = [5.0, 4.0, 3.0]
     
     # 任务管理
-    TASK_TIMEOUT: int = 300  # 5分钟
+    TASK_TIMEOUT: int = 300  # 单个R分析任务的墙钟超时(秒)，超时后终止R进程，0表示不限制
     CLEANUP_INTERVAL: int = 3600  # 1小时清理一次临时文件
     
     API_V1_STR: str = "/api/v1"
@@ -91,6 +162,7 @@ def ensure_directories():
         settings.CHARTS_DIR,
         settings.REPORTS_DIR,
         settings.HISTORY_DIR,
+        settings.RESULT_CACHE_DIR,
         settings.R_WORKING_DIR
     ]
     
@@ -1,18 +1,24 @@
 """
 压力采集数据分析系统 - 后端API服务
 """
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 import uvicorn
+import asyncio
 import logging
 import os
 from pathlib import Path
+from typing import Optional
 
 # 改为绝对导入
 from backend.core.config import settings, ensure_directories
 from backend.api import files, analysis, deepseek_analysis, analysis_history
+from backend.services.r_worker_pool import get_worker_pool, shutdown_worker_pool
+from backend.services.chart_renderer import ensure_chart
+from backend.services.analysis_executor import shutdown_executor
+from backend.services.task_scheduler import get_scheduler
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +37,19 @@ app = FastAPI(
 async def startup_event():
     """应用启动时执行"""
     ensure_directories()
+    
+    # 预热R工作进程池（工作进程在后台线程中加载R包，不阻塞服务启动）
+    if settings.R_EXECUTION_MODE == "pool":
+        get_worker_pool().start()
+    
+    # 写入进程心跳，接管已退出进程遗留的任务，并在后台定期续约
+    asyncio.create_task(analysis.task_owner_heartbeat())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时执行"""
+    shutdown_executor()
+    shutdown_worker_pool()
 
 # 配置CORS
 app.add_middleware(
@@ -47,6 +66,44 @@ async def health_check():
     """健康检查"""
     return {"status": "healthy", "service": settings.PROJECT_NAME}
 
+# 就绪检查（供负载均衡判断节点是否还能接收新任务）
+@app.get("/ready")
+async def readiness_check():
+    """返回当前节点的空闲分析容量，排队已满时返回503"""
+    capacity = get_scheduler().stats()
+    ready = capacity["queue_capacity"] > 0
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "capacity": capacity}
+    )
+
+# 分析结果文件（图表、数据文件）
+# 需要在 /static 挂载之前注册，按需渲染模式下图表在首次访问时生成
+@app.get("/static/charts/{task_id}/{file_name}")
+async def get_task_output_file(task_id: str, file_name: str, profile: Optional[str] = None):
+    """获取任务输出目录中的文件，图表可通过profile参数选择输出配置"""
+    charts_dir = Path(settings.CHARTS_DIR).resolve()
+    file_path = (charts_dir / task_id / file_name).resolve()
+    if charts_dir not in file_path.parents:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    
+    if profile is not None and file_name.endswith('.png'):
+        try:
+            file_path = await ensure_chart(task_id, file_name[:-len('.png')], profile)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="文件不存在")
+        return FileResponse(path=file_path)
+    
+    if not file_path.exists() and file_name.endswith('.png'):
+        file_path = await ensure_chart(task_id, file_name[:-len('.png')])
+    
+    if file_path is None or not file_path.exists():
+        raise HTTPException(status_code=404, detail="文件不存在")
+    
+    return FileResponse(path=file_path)
+
 # 挂载静态文件目录
 static_path = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=static_path), name="static")
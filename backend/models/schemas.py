@@ -6,6 +6,10 @@ from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 from enum import Enum
 import uuid
+import pytz
+
+# 任务时间统一使用上海时区
+SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
 
 # 分析参数模型
 class AnalysisParams(BaseModel):
@@ -14,6 +18,9 @@ class AnalysisParams(BaseModel):
     target_forces: List[float] = Field(..., description="目标力值列表", example=[5.0, 25.0, 50.0])
     tolerance_abs: Union[float, List[float]] = Field(..., description="绝对容差(N)或列表", example=2.0)
     tolerance_pct: Union[float, List[float]] = Field(..., description="百分比容差(%)或列表", example=5.0)
+    stats_only: bool = Field(default=False, description="只计算统计结果，不生成图表")
+    chart_categories: Optional[List[str]] = Field(default=None, description="需要生成的图表类别", example=["基础分析", "过程能力"])
+    charts: Optional[List[str]] = Field(default=None, description="需要生成的图表名称", example=["force_time_series", "process_capability"])
     
     @field_validator('target_forces')
     @classmethod
@@ -62,18 +69,30 @@ class TaskStatus(str, Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+    LIMIT_EXCEEDED = "limit_exceeded"
 
 # 任务信息模型
 class TaskInfo(BaseModel):
     """任务信息"""
     task_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: TaskStatus = TaskStatus.PENDING
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(SHANGHAI_TZ))
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     progress: int = Field(default=0, ge=0, le=100)
     message: str = ""
     error: Optional[str] = None
+    queue_position: Optional[int] = None  # 排队位置（从1开始），未排队时为None
+    lane: Optional[str] = None  # 调度通道: fast / normal
+    limit_exceeded: Optional[str] = None  # 触发的资源限制: timeout / memory / cpu
+
+    @field_validator('created_at', 'started_at', 'completed_at')
+    @classmethod
+    def to_shanghai_tz(cls, v: Optional[datetime]) -> Optional[datetime]:
+        """统一转换为上海时区（无时区的时间按服务器本地时间处理，如旧版本保存的created_at），
+        任务存储按时间文本排序时才能保证先后顺序正确"""
+        return v.astimezone(SHANGHAI_TZ) if v is not None else None
 
 # 统计结果模型
 class StatisticsResult(BaseModel):
@@ -123,6 +142,7 @@ class TaskCreateResponse(BaseResponse):
     """任务创建响应"""
     task_id: str
     estimated_duration: int  # 预估完成时间(秒)
+    deduplicated: bool = False  # 是否复用了相同数据和参数的执行中任务
 
 # 任务状态响应
 class TaskStatusResponse(BaseResponse):
@@ -140,6 +160,16 @@ class FileUploadResponse(BaseResponse):
     filename: str
     file_size: int
     file_id: str
+    rows: Optional[int] = None  # 数据行数（不含表头）
+    sha256: Optional[str] = None  # 文件内容哈希
+
+# 断点续传上传请求
+class ResumableUploadRequest(BaseModel):
+    """创建断点续传上传会话"""
+    filename: str
+    total_size: int  # 文件总字节数
+    chunk_size: Optional[int] = None  # 分块大小(字节)，默认使用服务端配置
+    sha256: Optional[str] = None  # 文件内容哈希，提供时在合并后校验
 
 # 错误响应
 class ErrorResponse(BaseResponse):
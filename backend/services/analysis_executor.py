@@ -0,0 +1,58 @@
+"""
+分析任务执行器 - 在专用线程池中执行阻塞的R分析，避免阻塞事件循环
+
+线程数即同时运行的R分析任务上限（ANALYSIS_MAX_CONCURRENCY），超出的任务在线程池中排队。
+分析执行期间事件循环保持空闲，上传、任务状态查询和图表请求不受影响。
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = max(1, settings.ANALYSIS_MAX_CONCURRENCY)
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENCY,
+    thread_name_prefix="analysis"
+)
+_lock = threading.Lock()
+_counters = {"queued": 0, "running": 0}
+
+
+def _run_counted(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    with _lock:
+        _counters["queued"] -= 1
+        _counters["running"] += 1
+    try:
+        return func(*args, **kwargs)
+    finally:
+        with _lock:
+            _counters["running"] -= 1
+
+
+async def run_analysis(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """在分析线程池中执行阻塞函数并等待结果"""
+    with _lock:
+        _counters["queued"] += 1
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_run_counted, func, *args, **kwargs))
+
+
+def get_executor_stats() -> Dict[str, int]:
+    """返回正在执行和排队等待的分析任务数"""
+    with _lock:
+        return {
+            "max_concurrency": MAX_CONCURRENCY,
+            "running": _counters["running"],
+            "queued": _counters["queued"],
+        }
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,64 @@
+"""
+图表按需渲染服务 - 图表在首次被请求时渲染，之后直接使用磁盘上的文件
+
+同一图表的并发请求会合并为一次渲染：进程内第一个请求发起渲染，其余请求等待同一个结果；
+多个工作进程之间通过每个图表的文件锁互斥，后获得锁的进程发现图表已生成时不再重复渲染。
+图表可以按不同的输出配置（profile）渲染，每个配置的文件分别缓存。
+"""
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from .incremental_analysis import file_lock
+from .r_analysis import RAnalysisEngine, get_chart_path, get_chart_profile
+
+logger = logging.getLogger(__name__)
+
+# 正在进行的渲染: (task_id, chart_name, 输出配置名) -> Future
+_inflight: Dict[Tuple[str, str, str], "asyncio.Future[None]"] = {}
+
+
+def _render_chart(task_id: str, chart_name: str, profile: str):
+    lock_path = Path(settings.CHARTS_DIR) / task_id / f".render.{profile}.{chart_name}.lock"
+    with file_lock(lock_path):
+        # 等待锁期间其他进程可能已经渲染完成
+        if get_chart_path(task_id, chart_name, profile).exists():
+            return
+        RAnalysisEngine().render_charts(task_id, [chart_name], profile)
+
+
+async def ensure_chart(task_id: str, chart_name: str, profile: Optional[str] = None) -> Optional[Path]:
+    """
+    确保指定输出配置的图表文件存在，必要时触发按需渲染。
+    返回图表路径；任务不支持按需渲染或图表无法生成时返回None。
+    输出配置不存在时抛出ValueError。
+    """
+    # 未指定时与显式指定默认配置是同一个配置，使用解析后的配置名合并渲染
+    profile = get_chart_profile(profile)["name"]
+    chart_path = get_chart_path(task_id, chart_name, profile)
+    if chart_path.exists():
+        return chart_path
+
+    if chart_name not in RAnalysisEngine.get_pending_charts(task_id, profile):
+        return None
+
+    key = (task_id, chart_name, profile)
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, _render_chart, task_id, chart_name, profile)
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        logger.info(f"图表 {task_id}/{chart_name} 正在渲染，等待已有的渲染结果")
+
+    try:
+        # shield: 某个请求被取消时不影响其他等待同一渲染的请求
+        await asyncio.shield(future)
+    except Exception as e:
+        logger.error(f"按需渲染图表失败 {task_id}/{chart_name}: {str(e)}")
+        return None
+
+    return chart_path if chart_path.exists() else None
@@ -0,0 +1,158 @@
+"""
+列式数据文件 - 上传后将CSV转换一次为Parquet，之后各处直接读取已清理的数值列
+
+转换结果保存为上传文件旁边的 <file_id>.parquet，只包含标准化后的五列
+sequence / x / y / z / force（均为float64，力值已去除"N"等单位，无法解析的值为空），
+原始CSV仅作为来源保留。R脚本在已安装arrow包时优先读取该文件（见 load_pressure_data），
+嵌入式R会话等Python端读取通过 read_pressure_frame() 获取，解析结果保存在进程内的数据帧缓存中。
+转换与数据概况在上传后的同一遍分块读取中完成（见 data_profile.process_upload）。
+
+需要安装pyarrow；未安装或转换失败时不生成Parquet文件，所有读取自动回退到解析CSV。
+Parquet文件记录了转换时CSV的大小和修改时间，CSV之后被修改时不再使用。
+"""
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+from ..core.config import settings
+from . import frame_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow为可选依赖
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_SUFFIX = ".parquet"
+PRESSURE_COLUMNS = ["sequence", "x", "y", "z", "force"]
+
+
+def available() -> bool:
+    return pq is not None and settings.COLUMNAR_ENABLED
+
+
+def columnar_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(COLUMNAR_SUFFIX)
+
+
+def normalize_pressure_columns(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """按R脚本的规则标准化数据：取前5列并重命名，力值去除单位，各列转换为数值（不移除无效行）"""
+    if len(raw_data.columns) < 5:
+        raise ValueError("数据文件列数不足，期望至少5列")
+
+    data = raw_data.iloc[:, :5].copy()
+    data.columns = PRESSURE_COLUMNS
+    data["force"] = pd.to_numeric(
+        data["force"].astype(str).str.replace(r'[^\d.-]', '', regex=True),
+        errors='coerce'
+    )
+    for column in ["sequence", "x", "y", "z"]:
+        data[column] = pd.to_numeric(data[column], errors='coerce')
+    return data.astype("float64")
+
+
+def _source_stamp(csv_path: Path) -> dict:
+    stat = os.stat(csv_path)
+    return {b"source_size": str(stat.st_size).encode(), b"source_mtime_ns": str(stat.st_mtime_ns).encode()}
+
+
+def fresh_columnar_path(csv_path: Path) -> Optional[Path]:
+    """返回与CSV内容一致的Parquet文件路径，不存在、已过期或未安装pyarrow时返回None"""
+    if not available():
+        return None
+    path = columnar_path(csv_path)
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+        stamp = _source_stamp(csv_path)
+    except (OSError, pa.ArrowException):
+        return None
+    if any(metadata.get(key) != value for key, value in stamp.items()):
+        return None
+    return path
+
+
+class ColumnarWriter:
+    """
+    将CSV分块逐块写入Parquet文件（先写临时文件，close时重命名），由上传后的数据概况扫描调用，与概况共用一遍读取。
+    写入失败时放弃列式文件并记录日志，不影响调用方继续处理后续分块。
+    """
+
+    def __init__(self, csv_path: Path):
+        self.csv_path = Path(csv_path)
+        self.target = columnar_path(self.csv_path)
+        self.temp_file = self.target.with_name(f".{self.target.name}.{uuid.uuid4().hex}")
+        self.rows = 0
+        self.failed = False
+        self._schema = pa.schema([(column, pa.float64()) for column in PRESSURE_COLUMNS],
+                                 metadata=_source_stamp(self.csv_path))
+        self._writer = None
+        try:
+            self._writer = pq.ParquetWriter(self.temp_file, self._schema, compression=settings.COLUMNAR_COMPRESSION)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error: Exception):
+        logger.warning(f"转换列式文件失败 {self.csv_path.name}: {str(error)}")
+        self.failed = True
+
+    def write(self, chunk: pd.DataFrame):
+        if self.failed:
+            return
+        try:
+            data = normalize_pressure_columns(chunk)
+            self._writer.write_table(pa.Table.from_pandas(data, schema=self._schema, preserve_index=False))
+            self.rows += len(data)
+        except Exception as e:
+            self._fail(e)
+
+    def close(self, completed: bool = True) -> Optional[Path]:
+        """结束写入，completed为True且没有出错时生成列式文件并返回其路径，否则删除临时文件并返回None"""
+        if self._writer is not None:
+            self._writer.close()
+        if completed and not self.failed:
+            os.replace(self.temp_file, self.target)
+            logger.info(f"已转换为列式文件: {self.target.name} ({self.rows} 行)")
+            return self.target
+        try:
+            self.temp_file.unlink()
+        except FileNotFoundError:
+            pass
+        return None
+
+
+def open_writer(csv_path: Path) -> Optional[ColumnarWriter]:
+    """返回CSV的列式文件写入器；未安装pyarrow或已有最新的列式文件时返回None"""
+    if not available() or fresh_columnar_path(csv_path) is not None:
+        return None
+    return ColumnarWriter(csv_path)
+
+
+def _load_pressure_frame(csv_path: Path) -> pd.DataFrame:
+    path = fresh_columnar_path(csv_path)
+    if path is not None:
+        return pd.read_parquet(path, columns=PRESSURE_COLUMNS)
+    raw_data = pd.read_csv(csv_path, encoding='utf-8')
+    return normalize_pressure_columns(raw_data)
+
+
+def read_pressure_frame(csv_path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """读取标准化后的压力数据（不移除无效行），返回只包含所需列的新DataFrame
+
+    解析结果按文件缓存在进程内，同一文件重复读取时不再解析；有可用的Parquet文件时优先读取Parquet。
+    """
+    frame = frame_cache.get_frame(csv_path, _load_pressure_frame)
+    return frame[columns or PRESSURE_COLUMNS].copy()
+
+
+def remove_columnar(csv_path: Path):
+    try:
+        columnar_path(csv_path).unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,265 @@
+"""
+上传数据概况 - 上传完成时分块扫描一遍CSV，生成数据预览和格式验证所需的全部信息
+
+概况保存为上传文件旁边的 <file_id>.profile.json，包括：
+- 列名、数据类型、各列空值数（力值列清理单位前后分别统计）、前10行样例
+- 力值列（去除"N"等单位后）的样本数、均值、标准差、最小值和最大值
+- 格式验证结果（与 /validate 的规则一致）
+/preview 和 /validate 直接读取概况，不再解析整个文件；概况记录了生成时文件的大小和修改时间，
+文件之后被修改（如追加数据）时概况失效，在下次请求时重新生成。
+上传后的后台任务在同一遍读取中同时写出列式文件（见 process_upload）。
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import settings
+from . import columnar_store, stats_moments
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".profile.json"
+EXPECTED_COLUMNS = ['序号', 'X', 'Y', 'Z', '力值']
+SAMPLE_ROWS = 10
+
+# 旧文件没有概况时，同时到达的预览和验证请求只生成一次；不同文件的概况互不阻塞
+_build_locks: Dict[str, threading.Lock] = {}
+_build_lock_users: Dict[str, int] = {}
+_build_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _build_lock(file_path: Path):
+    """按文件路径加锁，没有等待者时移除锁对象"""
+    key = os.path.abspath(file_path)
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(key, threading.Lock())
+        _build_lock_users[key] = _build_lock_users.get(key, 0) + 1
+    try:
+        with lock:
+            yield
+    finally:
+        with _build_locks_guard:
+            _build_lock_users[key] -= 1
+            if _build_lock_users[key] == 0:
+                del _build_lock_users[key]
+                del _build_locks[key]
+
+
+def profile_path(file_path: Path) -> Path:
+    return Path(file_path).with_suffix(PROFILE_SUFFIX)
+
+
+def find_force_column(columns: List[str]) -> Optional[str]:
+    """查找力值列（与R脚本的列识别规则一致）"""
+    for col in columns:
+        if '力值' in col or 'force' in col.lower() or '力' in col:
+            return col
+    return None
+
+
+def clean_force(values: pd.Series) -> pd.Series:
+    """去除力值中的字母N等非数值字符并转换为数值，无法解析的值为NaN"""
+    return pd.to_numeric(values.astype(str).str.replace(r'[^\d.-]', '', regex=True), errors='coerce')
+
+
+def _merge_dtype(current: Optional[str], dtype) -> str:
+    # 不同分块推断出的类型可能不同（如某个分块含空值时整数列变为浮点列）
+    if current is None or current == str(dtype):
+        return str(dtype)
+    try:
+        current_dtype = np.dtype(current)
+        if np.issubdtype(current_dtype, np.number) and np.issubdtype(dtype, np.number):
+            return str(np.result_type(current_dtype, dtype))
+    except TypeError:
+        pass
+    return "object"
+
+
+def validate_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """根据数据概况生成格式验证结果（字段与DataValidationResult一致）"""
+    actual_columns = profile["columns"]
+    missing_columns = [col for col in EXPECTED_COLUMNS if col not in actual_columns]
+    extra_columns = [col for col in actual_columns if col not in EXPECTED_COLUMNS]
+    errors = []
+    warnings = []
+
+    if missing_columns:
+        errors.append(f"缺少必要列: {', '.join(missing_columns)}")
+    if extra_columns:
+        warnings.append(f"包含额外列: {', '.join(extra_columns)}")
+    # 力值列清理单位后仍无法解析的值计为空值
+    if '力值' in actual_columns and profile["null_counts"].get('力值', 0) > 0:
+        errors.append("力值列包含无法解析的非数值数据")
+    null_cols = [col for col in actual_columns if profile["null_counts"].get(col, 0) > 0]
+    if null_cols:
+        warnings.append(f"以下列包含空值: {', '.join(null_cols)}")
+    if profile["row_count"] < 10:
+        warnings.append("数据量过少，可能影响分析结果")
+
+    return {
+        "is_valid": len(errors) == 0,
+        "errors": errors,
+        "warnings": warnings,
+        "row_count": profile["row_count"],
+        "column_count": len(actual_columns),
+        "expected_columns": EXPECTED_COLUMNS,
+        "actual_columns": actual_columns,
+        "missing_columns": missing_columns,
+        "extra_columns": extra_columns,
+    }
+
+
+def build_profile(file_path: Path, on_chunk: Optional[Callable[[pd.DataFrame], None]] = None) -> Dict[str, Any]:
+    """分块读取CSV文件生成数据概况（内存占用只与分块大小有关），每个原始分块同时传给on_chunk（如写入列式文件）"""
+    file_path = Path(file_path)
+    stat = os.stat(file_path)
+    columns: List[str] = []
+    force_col = None
+    row_count = 0
+    data_types: Dict[str, str] = {}
+    raw_nulls: Dict[str, int] = {}
+    null_counts: Dict[str, int] = {}
+    sample: List[Dict[str, Any]] = []
+    force_moments = stats_moments.moments(np.array([]))
+    force_min = force_max = None
+
+    for chunk in pd.read_csv(file_path, chunksize=settings.PROFILE_CHUNK_ROWS):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        if not columns:
+            columns = [str(col) for col in chunk.columns]
+            force_col = find_force_column(columns)
+            sample = json.loads(chunk.head(SAMPLE_ROWS).to_json(orient='records', force_ascii=False))
+        row_count += len(chunk)
+        for col, dtype in chunk.dtypes.items():
+            data_types[col] = _merge_dtype(data_types.get(col), dtype)
+        for col, count in chunk.isnull().sum().items():
+            raw_nulls[col] = raw_nulls.get(col, 0) + int(count)
+
+        if force_col:
+            chunk = chunk.assign(**{force_col: clean_force(chunk[force_col])})
+            force = chunk[force_col].dropna().to_numpy(dtype=float)
+            if len(force):
+                stats_moments.merge_moments(force_moments, stats_moments.moments(force))
+                force_min = float(force.min()) if force_min is None else min(force_min, float(force.min()))
+                force_max = float(force.max()) if force_max is None else max(force_max, float(force.max()))
+        for col, count in chunk.isnull().sum().items():
+            null_counts[col] = null_counts.get(col, 0) + int(count)
+
+    if not columns:
+        # 只有表头的文件：pandas不会产生分块
+        columns = [str(col) for col in pd.read_csv(file_path, nrows=0).columns]
+        force_col = find_force_column(columns)
+        data_types = {col: "object" for col in columns}
+        raw_nulls = {col: 0 for col in columns}
+        null_counts = dict(raw_nulls)
+
+    basic_stats: Dict[str, Any] = {}
+    if force_moments["n"] > 0:
+        n = force_moments["n"]
+        basic_stats = {
+            'count': n,
+            'mean': force_moments["mean"],
+            'std': stats_moments.sd(force_moments) if n > 1 else None,
+            'min': force_min,
+            'max': force_max,
+            'range': force_max - force_min,
+        }
+
+    profile = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "columns": columns,
+        "force_column": force_col,
+        "row_count": row_count,
+        "data_types": data_types,
+        "missing_values": raw_nulls,
+        "null_counts": null_counts,
+        "sample_data": sample,
+        "basic_stats": basic_stats,
+    }
+    profile["validation"] = validate_profile(profile)
+    return profile
+
+
+def save_profile(file_path: Path, profile: Dict[str, Any]):
+    """保存数据概况（先写临时文件再重命名）"""
+    target = profile_path(file_path)
+    temp_file = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False)
+    os.replace(temp_file, target)
+
+
+def load_profile(file_path: Path) -> Optional[Dict[str, Any]]:
+    """读取数据概况；不存在或文件在生成概况后被修改过时返回None"""
+    try:
+        with open(profile_path(file_path), 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if profile.get("size") != stat.st_size or profile.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return profile
+
+
+def ensure_profile(file_path: Path) -> Dict[str, Any]:
+    """返回文件的数据概况，不存在或已失效时重新生成"""
+    profile = load_profile(file_path)
+    if profile is not None:
+        return profile
+    with _build_lock(file_path):
+        profile = load_profile(file_path)
+        if profile is None:
+            profile = build_profile(file_path)
+            try:
+                save_profile(file_path, profile)
+            except OSError as e:
+                logger.warning(f"保存数据概况失败: {str(e)}")
+    return profile
+
+
+def remove_profile(file_path: Path):
+    try:
+        profile_path(file_path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def process_upload(file_path: Path):
+    """
+    上传完成后（在响应返回后的后台任务中）分块读取一遍CSV，同时生成数据概况和列式文件。
+    失败时只记录日志：之后的预览和验证会重新生成概况，读取数据时回退到解析CSV。
+    """
+    file_path = Path(file_path)
+    with _build_lock(file_path):
+        profile = load_profile(file_path)
+        writer = columnar_store.open_writer(file_path)
+        if profile is not None and writer is None:
+            return
+        completed = False
+        try:
+            built = build_profile(file_path, on_chunk=writer.write if writer else None)
+            completed = True
+        except Exception as e:
+            logger.warning(f"生成数据概况失败 {file_path.name}: {str(e)}")
+            return
+        finally:
+            if writer is not None:
+                writer.close(completed)
+
+        if profile is None:
+            try:
+                save_profile(file_path, built)
+            except OSError as e:
+                logger.warning(f"保存数据概况失败: {str(e)}")
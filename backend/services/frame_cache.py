@@ -0,0 +1,132 @@
+"""
+数据帧缓存 - 进程内按最近使用时间淘汰的已解析数据缓存
+
+缓存解析并清理后的上传数据（pandas DataFrame），键为文件路径，并记录文件的大小和修改时间，
+文件被修改后对应条目自动失效，删除文件时调用 invalidate() 移除。
+总内存占用超过 FRAME_CACHE_MAX_MB 时淘汰最久未使用的条目；同一文件同时被多个请求读取时只解析一次。
+缓存的DataFrame被多个调用方共享，调用方不得原地修改。
+
+通过 columnar_store.read_pressure_frame() 使用：嵌入式R会话（R_EXECUTION_MODE = "rpy2"）对同一上传文件
+以不同参数重复分析时不再重新解析。数据预览和校验使用上传时生成的数据概况（见 data_profile），不读取原始数据。
+缓存只在当前进程内有效，不在多个工作进程之间共享。
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# 路径 -> ((文件大小, 修改时间), DataFrame, 占用字节数)，按最近使用时间排序
+_frames: "OrderedDict[str, Tuple[Tuple[int, int], pd.DataFrame, int]]" = OrderedDict()
+_loading: Dict[str, threading.Lock] = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_total_bytes = 0
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _remove(key: str):
+    global _total_bytes
+    entry = _frames.pop(key, None)
+    if entry is not None:
+        _total_bytes -= entry[2]
+
+
+def _lookup(key: str, stamp: Tuple[int, int]) -> Optional[pd.DataFrame]:
+    entry = _frames.get(key)
+    if entry is None:
+        return None
+    if entry[0] != stamp:
+        _remove(key)
+        return None
+    _frames.move_to_end(key)
+    _stats["hits"] += 1
+    return entry[1]
+
+
+def _store(key: str, stamp: Tuple[int, int], frame: pd.DataFrame):
+    global _total_bytes
+    max_bytes = settings.FRAME_CACHE_MAX_MB * 1024 * 1024
+    size = int(frame.memory_usage(deep=True).sum())
+    if size > max_bytes:
+        return
+    _remove(key)
+    while _frames and _total_bytes + size > max_bytes:
+        evicted = next(iter(_frames))
+        _remove(evicted)
+        _stats["evictions"] += 1
+        logger.info(f"淘汰数据帧缓存: {Path(evicted).name}")
+    _frames[key] = (stamp, frame, size)
+    _total_bytes += size
+
+
+def get_frame(path: Path, loader: Callable[[Path], pd.DataFrame]) -> pd.DataFrame:
+    """返回文件解析后的数据帧，未命中时调用loader(path)解析并缓存"""
+    if settings.FRAME_CACHE_MAX_MB <= 0:
+        return loader(path)
+
+    key = os.path.abspath(path)
+    stamp = _file_stamp(key)
+    with _lock:
+        frame = _lookup(key, stamp)
+        if frame is not None:
+            return frame
+        file_lock = _loading.setdefault(key, threading.Lock())
+
+    with file_lock:
+        # 等待期间其他请求可能已经解析完同一文件
+        with _lock:
+            frame = _lookup(key, stamp)
+            if frame is not None:
+                return frame
+            _stats["misses"] += 1
+        try:
+            frame = loader(path)
+            with _lock:
+                _store(key, stamp, frame)
+        finally:
+            with _lock:
+                _loading.pop(key, None)
+    return frame
+
+
+def invalidate(path: Path):
+    """移除文件对应的缓存条目（删除或替换文件时调用）"""
+    with _lock:
+        _remove(os.path.abspath(path))
+
+
+def clear() -> int:
+    """清空缓存，返回移除的条目数"""
+    with _lock:
+        count = len(_frames)
+        for key in list(_frames):
+            _remove(key)
+    return count
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """返回缓存命中统计和内存占用"""
+    with _lock:
+        stats = dict(_stats)
+        entries = len(_frames)
+        total_bytes = _total_bytes
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0,
+        "entries": entries,
+        "size_mb": round(total_bytes / 1024 / 1024, 1),
+        "max_size_mb": settings.FRAME_CACHE_MAX_MB,
+    }
@@ -0,0 +1,483 @@
+"""
+增量追加分析 - 为已完成的任务追加新的测量数据，并增量更新统计结果
+
+每个任务维护一份可合并的统计状态（incremental_state.json）：
+- 各目标力值及整体的样本数、均值和二阶中心矩（并行合并公式），可精确得到均值和标准差
+- 成功计数、偏差和、最大偏差，以及CUSUM累计值和EWMA最新值
+- 异常值计数：新数据的IQR异常按完整分析时的四分位数判断，Z异常按合并后的均值和标准差判断
+状态由R脚本在完整分析时写出，每次追加的开销只与新增行数有关；
+此前分析的任务没有状态文件，在第一次追加时从 cleaned_data.csv 建立一次。
+
+中位数、趋势、游程、变化点、自相关、空间和正态性等无法增量合并的结果保持不变，
+在 analysis_results.json 的 incremental.stale_sections 中列出，重新完整分析后更新。
+依赖追加数据的图表被删除，下次请求时由R脚本将新增的行并入绘图上下文后重新渲染（见 extend_plot_context）；
+只依赖上述无法增量更新结果的图表保持不变。
+
+同一任务的追加和图表清单更新在任务目录的文件锁（.task.lock）内进行，多个工作进程或节点共享任务目录时同样互斥。
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from ..core.config import settings
+from .columnar_store import normalize_pressure_columns
+from . import stats_moments
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "incremental_state.json"
+PARAMS_FILE = "analysis_params.json"
+
+# 与R脚本中的控制图参数保持一致
+CUSUM_SLACK = 1.0
+EWMA_LAMBDA = 0.2
+
+# 无法增量更新的结果部分
+STALE_SECTIONS = [
+    "overall_stats.中位数", "overall_stats.Q25", "overall_stats.Q75",
+    "trend_stats", "stability_analysis", "change_point_analysis", "autocorr_analysis",
+    "spatial_analysis", "error_distribution_analysis", "multi_source_variation_analysis",
+]
+
+# 只依赖无法增量更新的结果部分的图表，追加数据后保持不变（与stale_sections一致，重新完整分析后更新）
+APPEND_INDEPENDENT_CHARTS = [
+    "spatial_correlation_matrix", "position_performance_comparison", "robot_consistency_analysis",
+]
+
+LOCK_FILE = ".task.lock"
+LOCK_RETRY_INTERVAL = 0.05
+
+
+def _acquire_file_lock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    # Windows没有flock，锁定锁文件的第一个字节；msvcrt的阻塞模式最多重试10秒，这里自行轮询直到获得锁
+    while True:
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(LOCK_RETRY_INTERVAL)
+
+
+def _release_file_lock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """跨进程的排他文件锁（锁文件不存在时创建）"""
+    with open(lock_path, 'a+') as lock_file:
+        _acquire_file_lock(lock_file)
+        try:
+            yield
+        finally:
+            _release_file_lock(lock_file)
+
+
+def task_lock(task_dir: Path):
+    """任务目录的排他文件锁，修改增量状态、分析结果和图表清单时持有"""
+    return file_lock(Path(task_dir) / LOCK_FILE)
+
+
+def affected_charts(chart_names: List[str]) -> List[str]:
+    """返回追加数据后需要重新渲染的图表"""
+    return [name for name in chart_names if name not in APPEND_INDEPENDENT_CHARTS]
+
+
+def _write_json_atomic(path: Path, data: Any):
+    # 任务目录中的文件可能与结果缓存共享硬链接，必须写入新文件后替换
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def clean_pressure_rows(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """按R脚本的规则清理数据：取前5列，力值去除单位，移除无效行"""
+    data = normalize_pressure_columns(raw_data)
+    return data[data["force"].notna() & (data["force"] > 0)].reset_index(drop=True)
+
+
+def _load_params(task_dir: Path, cleaned: pd.DataFrame) -> Dict[str, List[float]]:
+    params_path = task_dir / PARAMS_FILE
+    if params_path.exists():
+        with open(params_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # 早期任务没有保存参数文件，从清理后数据中的容差映射列恢复
+    mapping = cleaned[["target_force", "tolerance_abs_map", "tolerance_pct_map"]].drop_duplicates("target_force")
+    mapping = mapping.sort_values("target_force")
+    return {
+        "target_forces": mapping["target_force"].astype(float).tolist(),
+        "tolerance_abs": mapping["tolerance_abs_map"].astype(float).tolist(),
+        "tolerance_pct": mapping["tolerance_pct_map"].astype(float).tolist(),
+    }
+
+
+def _assign_targets(data: pd.DataFrame, params: Dict[str, List[float]]) -> pd.DataFrame:
+    """为每行匹配最近的目标力值并计算偏差和容差判断（与R脚本一致）"""
+    targets = np.asarray(params["target_forces"], dtype=float)
+    tolerance_abs = np.asarray(params["tolerance_abs"], dtype=float)
+    tolerance_pct = np.asarray(params["tolerance_pct"], dtype=float)
+
+    force = data["force"].to_numpy(dtype=float)
+    # argmin在距离相同时取第一个目标，与which.min一致
+    index = np.abs(force[:, None] - targets[None, :]).argmin(axis=1)
+    target = targets[index]
+    deviation_abs = force - target
+
+    result = data.copy()
+    result["target_force"] = target
+    result["deviation_abs"] = deviation_abs
+    result["deviation_pct"] = deviation_abs / target * 100
+    result["within_tolerance_abs"] = np.abs(deviation_abs) <= tolerance_abs[index]
+    result["within_tolerance_pct"] = np.abs(deviation_abs) <= target * tolerance_pct[index] / 100
+    result["within_tolerance"] = result["within_tolerance_abs"] & result["within_tolerance_pct"]
+    return result
+
+
+def _empty_target_state() -> Dict[str, Any]:
+    return {
+        "n": 0, "mean": 0.0, "m2": 0.0,
+        "ok": 0, "ok_abs": 0, "ok_pct": 0,
+        "sum_deviation_pct": 0.0, "max_abs_deviation": 0.0, "max_abs_deviation_pct": 0.0,
+        "iqr_low": None, "iqr_high": None, "iqr_outliers": 0, "z_outliers": 0,
+        "cusum_plus": 0.0, "cusum_minus": 0.0, "ewma": None,
+    }
+
+
+def _update_target_state(state: Dict[str, Any], rows: pd.DataFrame, target: float):
+    """按sequence顺序将一组新数据并入目标力值的统计状态"""
+    rows = rows.sort_values("sequence", kind="stable")
+    force = rows["force"].to_numpy(dtype=float)
+
+    stats_moments.merge_moments(state, stats_moments.moments(force))
+    state["ok"] += int(rows["within_tolerance"].sum())
+    state["ok_abs"] += int(rows["within_tolerance_abs"].sum())
+    state["ok_pct"] += int(rows["within_tolerance_pct"].sum())
+    state["sum_deviation_pct"] += float(rows["deviation_pct"].sum())
+    state["max_abs_deviation"] = max(state["max_abs_deviation"], float(rows["deviation_abs"].abs().max()))
+    state["max_abs_deviation_pct"] = max(state["max_abs_deviation_pct"], float(rows["deviation_pct"].abs().max()))
+
+    # 异常值: IQR围栏沿用建立状态时的四分位数，Z分数使用合并后的均值和标准差
+    if state["iqr_low"] is not None:
+        state["iqr_outliers"] += int(((force < state["iqr_low"]) | (force > state["iqr_high"])).sum())
+    sd = stats_moments.sd(state)
+    if sd > 0:
+        state["z_outliers"] += int((np.abs(force - state["mean"]) / sd > 3).sum())
+
+    # CUSUM: 累计超出目标±1N的部分；EWMA: 从上一次的平滑值继续递推
+    state["cusum_plus"] += float(np.maximum(0, force - target - CUSUM_SLACK).sum())
+    state["cusum_minus"] += float(np.maximum(0, target - force - CUSUM_SLACK).sum())
+    ewma = state["ewma"]
+    for value in force:
+        ewma = value if ewma is None else EWMA_LAMBDA * value + (1 - EWMA_LAMBDA) * ewma
+    state["ewma"] = ewma
+
+
+def _load_state(state_path: Path) -> Dict[str, Any]:
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    # R脚本写出的目标力值键为R的数值格式（如"5"），统一为Python的格式
+    state["targets"] = {repr(float(key)): value for key, value in state["targets"].items()}
+    return state
+
+
+def _build_state(task_dir: Path) -> Dict[str, Any]:
+    """从任务的 cleaned_data.csv 建立统计状态（只用于没有状态文件的早期任务，每个任务只执行一次）"""
+    cleaned_path = task_dir / "cleaned_data.csv"
+    if not cleaned_path.exists():
+        raise FileNotFoundError("任务缺少 cleaned_data.csv，无法追加数据")
+
+    cleaned = pd.read_csv(cleaned_path, encoding='utf-8')
+    params = _load_params(task_dir, cleaned)
+    data = _assign_targets(cleaned[["sequence", "x", "y", "z", "force"]], params)
+
+    state = {
+        "params": params,
+        "overall": {**stats_moments.moments(data["force"].to_numpy(dtype=float)),
+                    "min": float(data["force"].min()), "max": float(data["force"].max())},
+        "targets": {},
+        "appended_rows": 0,
+        "appends": [],
+    }
+    for target, rows in data.groupby("target_force"):
+        target_state = _empty_target_state()
+        # 与R脚本的outlier_analysis一致，IQR异常按建立状态时的四分位数判断
+        q1, q3 = rows["force"].quantile([0.25, 0.75])
+        target_state["iqr_low"] = float(q1 - 1.5 * (q3 - q1))
+        target_state["iqr_high"] = float(q3 + 1.5 * (q3 - q1))
+        _update_target_state(target_state, rows, float(target))
+        # 已有数据的Z异常值以R的结果为准
+        if "is_z_outlier" in cleaned.columns:
+            target_state["z_outliers"] = int(cleaned.loc[cleaned["target_force"] == target, "is_z_outlier"].sum())
+        state["targets"][repr(float(target))] = target_state
+    return state
+
+
+def _target_row(target: float, state: Dict[str, Any], params: Dict[str, List[float]]) -> Dict[str, Any]:
+    index = params["target_forces"].index(target)
+    n = state["n"]
+    sd = stats_moments.sd(state)
+    return {
+        "target_force": target,
+        "数据点数": n,
+        "成功率_综合": round(state["ok"] / n * 100, 1),
+        "成功率_绝对": round(state["ok_abs"] / n * 100, 1),
+        "成功率_百分比": round(state["ok_pct"] / n * 100, 1),
+        "平均力值": round(state["mean"], 2),
+        "平均偏差_绝对": round(state["mean"] - target, 2),
+        "平均偏差_百分比": round(state["sum_deviation_pct"] / n, 2),
+        "标准差": None if np.isnan(sd) else round(sd, 2),
+        "最大偏差_绝对": round(state["max_abs_deviation"], 2),
+        "最大偏差_百分比": round(state["max_abs_deviation_pct"], 2),
+        "绝对容差限制": round(params["tolerance_abs"][index], 2),
+        "百分比容差限制": round(target * params["tolerance_pct"][index] / 100, 2),
+    }
+
+
+def _capability_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    # 与R脚本一致，基于已四舍五入的目标力值统计计算
+    sd = row["标准差"]
+    if not sd:
+        return {"target_force": row["target_force"], "Cp": None, "Cpk": None, "能力等级": "不合格"}
+    limit = row["绝对容差限制"]
+    offset = abs(row["平均偏差_绝对"])
+    cpk = min((limit - offset) / (3 * sd), (limit + offset) / (3 * sd))
+    if cpk >= 1.33:
+        level = "优秀"
+    elif cpk >= 1.0:
+        level = "合格"
+    elif cpk >= 0.67:
+        level = "勉强"
+    else:
+        level = "不合格"
+    return {"target_force": row["target_force"], "Cp": round(limit * 2 / (6 * sd), 3), "Cpk": round(cpk, 3), "能力等级": level}
+
+
+def _update_results(results: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """用统计状态更新analysis_results中可以增量计算的部分"""
+    params = state["params"]
+    overall = state["overall"]
+    targets = sorted((float(key), value) for key, value in state["targets"].items())
+    target_rows = [_target_row(target, target_state, params) for target, target_state in targets]
+
+    mean = overall["mean"]
+    sd = stats_moments.sd(overall)
+    total_ok = sum(target_state["ok"] for _, target_state in targets)
+
+    if results.get("data_summary"):
+        summary_row = results["data_summary"][0]
+        summary_row.update({
+            "总行数": overall["n"],
+            "力值最小值": overall["min"],
+            "力值最大值": overall["max"],
+            "力值均值": mean,
+            "力值标准差": sd,
+        })
+    if results.get("overall_stats"):
+        results["overall_stats"][0].update({
+            "样本数": overall["n"],
+            "均值": round(mean, 3),
+            "标准差": round(sd, 3),
+            "最小值": round(overall["min"], 3),
+            "最大值": round(overall["max"], 3),
+            "变异系数": round(sd / mean * 100, 3),
+        })
+
+    results["target_analysis"] = target_rows
+    results["process_capability"] = [_capability_row(row) for row in target_rows]
+    results["outlier_summary"] = [
+        {
+            "target_force": target,
+            "总数据点": target_state["n"],
+            "IQR异常值": target_state["iqr_outliers"],
+            "Z异常值": target_state["z_outliers"],
+            "IQR异常率": round(target_state["iqr_outliers"] / target_state["n"] * 100, 2),
+            "Z异常率": round(target_state["z_outliers"] / target_state["n"] * 100, 2),
+        }
+        for target, target_state in targets
+    ]
+    results["control_state"] = [
+        {
+            "target_force": target,
+            "CUSUM_上": round(target_state["cusum_plus"], 3),
+            "CUSUM_下": round(target_state["cusum_minus"], 3),
+            "EWMA": None if target_state["ewma"] is None else round(target_state["ewma"], 3),
+        }
+        for target, target_state in targets
+    ]
+
+    summary = results.setdefault("summary", {})
+    summary.update({
+        "total_records": overall["n"],
+        "success_rate": round(total_ok / overall["n"] * 100, 2),
+        "mean_force": round(mean, 2),
+        "std_force": round(sd, 2),
+        "cv_percent": round(sd / mean * 100, 2),
+    })
+
+    results["incremental"] = {
+        "appended_rows": state["appended_rows"],
+        "appends": len(state["appends"]),
+        "updated_at": datetime.now(pytz.timezone('Asia/Shanghai')).isoformat(),
+        "stale_sections": STALE_SECTIONS,
+    }
+    return results
+
+
+def _load_manifest(task_dir: Path) -> Optional[Dict[str, Any]]:
+    """读取图表清单，任务没有保存绘图上下文时返回None"""
+    manifest_path = task_dir / "chart_manifest.json"
+    if not manifest_path.exists() or not (task_dir / "plot_context.rds").exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _refresh_manifest(task_dir: Path, manifest: Dict[str, Any], state: Dict[str, Any], stale_charts: List[str]):
+    """在图表清单中登记追加数据文件，并删除需要重新渲染的图表"""
+    if 'appends' not in manifest:
+        # 早期任务的清单只记录尚未合并进绘图上下文的文件（pending_appends）
+        legacy_pending = manifest.pop('pending_appends', [])
+        manifest['merged_appends'] = [name for name in state['appends'][:-1] if name not in legacy_pending]
+    manifest['appends'] = list(state['appends'])
+
+    chart_dirs = [task_dir] + [task_dir / name for name in settings.CHART_PROFILES]
+    for chart_dir in chart_dirs:
+        for name in stale_charts:
+            for chart_file in chart_dir.glob(f"{name}.*"):
+                chart_file.unlink()
+
+    manifest['prerendered'] = [name for name in manifest.get('prerendered', []) if name not in stale_charts]
+    manifest['unavailable'] = [name for name in manifest.get('unavailable', []) if name not in stale_charts]
+    _write_json_atomic(task_dir / "chart_manifest.json", manifest)
+
+
+def manifest_append_count(task_dir: Path) -> int:
+    """返回图表清单中已登记的追加数据文件数（渲染图表前记录，用于判断渲染期间是否有新的追加）"""
+    manifest = _load_manifest(task_dir)
+    return len(manifest.get('appends', [])) if manifest else 0
+
+
+def finish_chart_render(task_dir: Path, chart_paths: Dict[str, Path], append_count: int):
+    """
+    图表渲染完成后在任务锁内更新图表清单。
+    渲染期间有新的追加数据时，刚渲染的受影响图表可能基于合并前的数据，删除后在下次请求时重新渲染；
+    否则将没有生成文件的图表记为不可用，避免每次请求都重新尝试。
+    """
+    with task_lock(task_dir):
+        manifest = _load_manifest(task_dir)
+        if manifest is None:
+            return
+        if len(manifest.get('appends', [])) != append_count:
+            for name in affected_charts(list(chart_paths)):
+                try:
+                    chart_paths[name].unlink()
+                except FileNotFoundError:
+                    pass
+            return
+
+        missing = [name for name, path in chart_paths.items() if not path.exists()]
+        if missing:
+            manifest['unavailable'] = sorted(set(manifest.get('unavailable', [])) | set(missing))
+            _write_json_atomic(task_dir / "chart_manifest.json", manifest)
+
+
+def append_rows(task_id: str, csv_path: Path) -> Dict[str, Any]:
+    """
+    为已完成的任务追加csv_path中的新数据并增量更新分析结果。
+    返回更新后的分析结果；任务不存在时抛出FileNotFoundError，新数据无效时抛出ValueError。
+    """
+    task_dir = Path(settings.CHARTS_DIR) / task_id
+    results_path = task_dir / "analysis_results.json"
+    if not results_path.exists():
+        raise FileNotFoundError(f"任务 {task_id} 的分析结果不存在")
+
+    try:
+        raw_data = pd.read_csv(csv_path, encoding='utf-8')
+    except Exception as e:
+        raise ValueError(f"CSV文件解析失败: {str(e)}")
+    new_rows = clean_pressure_rows(raw_data)
+    if new_rows.empty:
+        raise ValueError("追加的数据中没有有效的力值数据")
+
+    with task_lock(task_dir):
+        state_path = task_dir / STATE_FILE
+        if state_path.exists():
+            state = _load_state(state_path)
+        else:
+            logger.info(f"任务 {task_id} 没有增量统计状态，从cleaned_data.csv建立")
+            state = _build_state(task_dir)
+
+        params = state["params"]
+        data = _assign_targets(new_rows, params)
+        force = data["force"].to_numpy(dtype=float)
+        overall = state["overall"]
+        stats_moments.merge_moments(overall, stats_moments.moments(force))
+        overall["min"] = min(overall["min"], float(force.min()))
+        overall["max"] = max(overall["max"], float(force.max()))
+
+        for target, rows in data.groupby("target_force"):
+            target_state = state["targets"].setdefault(repr(float(target)), _empty_target_state())
+            _update_target_state(target_state, rows, float(target))
+
+        # 保存本次追加的数据，供重新渲染图表时合并
+        append_file = f"append_{len(state['appends']) + 1:04d}.csv"
+        new_rows.to_csv(task_dir / append_file, index=False, encoding='utf-8')
+        state["appended_rows"] += len(new_rows)
+        state["appends"].append(append_file)
+
+        with open(results_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        results = _update_results(results, state)
+
+        manifest = _load_manifest(task_dir)
+        refreshed = affected_charts(manifest.get('charts', [])) if manifest is not None else []
+        results["incremental"]["charts_refreshed"] = manifest is not None
+        results["incremental"]["refreshed_charts"] = refreshed
+        results["incremental"]["stale_charts"] = [
+            name for name in (manifest or {}).get('charts', []) if name not in refreshed
+        ]
+
+        # 清单最后写入：R脚本按清单合并追加数据时，读取到的状态和统计结果已包含这些数据
+        _write_json_atomic(state_path, state)
+        _write_json_atomic(results_path, results)
+        if manifest is not None:
+            _refresh_manifest(task_dir, manifest, state, refreshed)
+
+    logger.info(f"任务 {task_id} 追加 {len(new_rows)} 行数据，累计 {state['overall']['n']} 行")
+    return results
+
+
+def save_analysis_params(task_dir: Path, job: Dict[str, Any]):
+    """保存分析参数，追加数据时用于匹配目标力值和容差"""
+    _write_json_atomic(task_dir / PARAMS_FILE, {
+        "target_forces": [float(v) for v in job["target_forces"]],
+        "tolerance_abs": [float(v) for v in job["tolerance_abs"]],
+        "tolerance_pct": [float(v) for v in job["tolerance_pct"]],
+    })
+
@@ -0,0 +1,196 @@
+"""
+R任务资源限制与取消 - 墙钟超时、内存/CPU上限以及终止R进程树
+
+- 墙钟超时（TASK_TIMEOUT）: 超时后终止R进程组（包括并行渲染图表时fork出的子进程）
+- 内存上限（R_JOB_MAX_MEMORY_MB）: 通过 RLIMIT_AS 限制R进程的地址空间，超出后R内存分配失败
+- CPU上限（R_JOB_MAX_CPU_SECONDS）: 单次Rscript进程通过 RLIMIT_CPU 限制；常驻工作进程在R端通过 setTimeLimit() 按任务限制
+- 取消: 正在执行的任务登记终止函数，cancel() 时立即终止对应的R进程组
+rlimit仅在类Unix系统上可用，其他平台只执行超时和取消。
+"""
+import logging
+import os
+import signal
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+LIMIT_TIMEOUT = "timeout"
+LIMIT_MEMORY = "memory"
+LIMIT_CPU = "cpu"
+
+_lock = threading.Lock()
+_killers: Dict[str, Callable[[], None]] = {}
+_cancelled = set()
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class JobLimitExceeded(Exception):
+    """任务超出资源限制，limit为触发的限制类型（timeout / memory / cpu）"""
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+def timeout_exceeded() -> JobLimitExceeded:
+    return JobLimitExceeded(LIMIT_TIMEOUT, f"R分析超过墙钟时间限制 {settings.TASK_TIMEOUT} 秒，已终止")
+
+
+def _set_rlimits(memory_mb: int, cpu_seconds: int):
+    # 在fork之后、exec之前于子进程中执行
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds > 0:
+        # 软限制触发SIGXCPU，留出余量后硬限制触发SIGKILL
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+
+
+def popen_kwargs(memory_mb: int = 0, cpu_seconds: int = 0) -> Dict[str, Any]:
+    """返回启动受限R进程所需的Popen参数：独立进程组以及rlimit"""
+    if os.name != "posix":
+        return {}
+    kwargs: Dict[str, Any] = {"start_new_session": True}
+    if resource is not None and (memory_mb > 0 or cpu_seconds > 0):
+        kwargs["preexec_fn"] = lambda: _set_rlimits(memory_mb, cpu_seconds)
+    return kwargs
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """终止进程及其进程组中的子进程"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def classify_failure(returncode: Optional[int], message: str) -> Optional[JobLimitExceeded]:
+    """根据R进程的退出码和错误信息判断是否因超出资源限制而失败"""
+    message = message or ""
+    if returncode == -getattr(signal, "SIGXCPU", 0) or "reached CPU time limit" in message:
+        return JobLimitExceeded(LIMIT_CPU, f"R分析超过CPU时间限制 {settings.R_JOB_MAX_CPU_SECONDS} 秒，已终止")
+    if "reached elapsed time limit" in message:
+        return timeout_exceeded()
+    if "cannot allocate" in message or "无法分配" in message:
+        return JobLimitExceeded(LIMIT_MEMORY, f"R分析超过内存限制 {settings.R_JOB_MAX_MEMORY_MB}MB，已终止")
+    return None
+
+
+@contextmanager
+def registered(task_id: Optional[str], killer: Callable[[], None]):
+    """在执行期间登记任务的终止函数；任务已被取消时直接抛出JobCancelled"""
+    if task_id is None:
+        yield
+        return
+    with _lock:
+        if task_id in _cancelled:
+            raise JobCancelled(f"任务 {task_id} 已取消")
+        _killers[task_id] = killer
+    try:
+        yield
+    finally:
+        with _lock:
+            _killers.pop(task_id, None)
+
+
+def is_cancelled(task_id: Optional[str]) -> bool:
+    with _lock:
+        return task_id in _cancelled
+
+
+def cancel(task_id: str) -> bool:
+    """标记任务已取消并终止其正在运行的R进程，返回是否终止了进程"""
+    with _lock:
+        _cancelled.add(task_id)
+        killer = _killers.get(task_id)
+    if killer is None:
+        return False
+    logger.info(f"终止任务 {task_id} 的R进程")
+    killer()
+    return True
+
+
+def forget(task_id: str):
+    """任务结束后清除取消标记"""
+    with _lock:
+        _cancelled.discard(task_id)
+        _killers.pop(task_id, None)
+
+
+def _pump(stream, lines: List[str], on_line: Optional[Callable[[str], None]]):
+    for line in stream:
+        lines.append(line)
+        if on_line is not None:
+            try:
+                on_line(line.rstrip("\n"))
+            except Exception as e:
+                logger.warning(f"处理R输出失败: {str(e)}")
+
+
+def run_limited(cmd: List[str], task_id: Optional[str] = None,
+                on_stdout_line: Optional[Callable[[str], None]] = None) -> subprocess.CompletedProcess:
+    """在独立进程组中运行命令并应用超时、内存和CPU限制；失败时抛出相应异常
+
+    on_stdout_line 在读取线程中对标准输出的每一行调用，用于实时处理R端的阶段事件。
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        bufsize=1,
+        **popen_kwargs(settings.R_JOB_MAX_MEMORY_MB, settings.R_JOB_MAX_CPU_SECONDS),
+    )
+    stdout_lines: List[str] = []
+    stderr_lines: List[str] = []
+    readers = [
+        threading.Thread(target=_pump, args=(process.stdout, stdout_lines, on_stdout_line), daemon=True),
+        threading.Thread(target=_pump, args=(process.stderr, stderr_lines, None), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        with registered(task_id, lambda: kill_process_tree(process)):
+            try:
+                process.wait(timeout=settings.TASK_TIMEOUT or None)
+            except subprocess.TimeoutExpired:
+                kill_process_tree(process)
+                process.wait()
+                raise timeout_exceeded()
+    except JobCancelled:
+        kill_process_tree(process)
+        process.wait()
+        raise
+    finally:
+        for reader in readers:
+            reader.join(timeout=5)
+    stdout, stderr = "".join(stdout_lines), "".join(stderr_lines)
+
+    if is_cancelled(task_id):
+        raise JobCancelled(f"任务 {task_id} 已取消")
+    if process.returncode != 0:
+        limit_error = classify_failure(process.returncode, stderr)
+        if limit_error is not None:
+            raise limit_error
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
@@ -6,7 +6,7 @@ import logging
 import subprocess
 import json
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 import pandas as pd
 from datetime import datetime
 import pytz
@@ -17,197 +17,33 @@ SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import shutil
+import threading
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from docx.shared import RGBColor
+from PIL import Image
 
 from ..core.config import settings
 from ..models.schemas import AnalysisParams
+from .r_worker_pool import get_worker_pool, RWorkerError, parse_protocol_line
+from .stage_progress import StageTracker
+from . import job_control
+from .r_embedded import run_embedded_analysis, render_embedded_charts
+from . import result_cache
+from .incremental_analysis import save_analysis_params, manifest_append_count, finish_chart_render
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class RAnalysisEngine:
-    """R分析引擎，负责调用R脚本并处理结果"""
-    
-    def __init__(self):
-        # 确保R的可执行文件路径在环境变量中
-        if settings.R_HOME not in os.environ['PATH']:
-            os.environ['PATH'] = f"{settings.R_HOME}{os.pathsep}{os.environ['PATH']}"
-        
-        # 修正R脚本的路径，使其指向 backend/r_analysis/
-        self.r_script_path = os.path.join(settings.BASE_DIR, "backend", "r_analysis", "pressure_analysis.R")
-        if not os.path.exists(self.r_script_path):
-            raise FileNotFoundError(f"R脚本未找到: {self.r_script_path}")
-            
-        try:
-            # 设置静态文件目录
-            self.static_dir = Path(settings.STATIC_DIR)
-            self.charts_dir = Path(settings.CHARTS_DIR)
-            
-            # 检查R是否可用
-            result = subprocess.run(['R', '--version'], capture_output=True, text=True, timeout=10)
-            if result.returncode != 0:
-                raise Exception("R未安装或不可用")
-            
-            logger.info("R分析引擎初始化成功")
-            
-        except subprocess.TimeoutExpired:
-            logger.error("R版本检查超时")
-            raise Exception("R响应超时")
-        except FileNotFoundError:
-            logger.error("R未找到，请确保R已安装并在PATH中")
-            raise Exception("R未安装")
-        except Exception as e:
-            logger.error(f"R分析引擎初始化失败: {str(e)}")
-            raise
-    
-    def analyze_data(self, csv_path: str, params: AnalysisParams, task_id: str) -> Dict[str, Any]:
-        """
-        核心分析函数：调用R脚本执行数据分析。
-        """
-        # 1. 为每个任务创建一个独立的、带时间戳的输出目录
-        output_dir = Path(settings.CHARTS_DIR) / task_id
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 2. 处理容差参数，确保它们是列表
-        num_targets = len(params.target_forces)
-        
-        tolerance_abs_list = params.tolerance_abs
-        if isinstance(tolerance_abs_list, float):
-            tolerance_abs_list = [tolerance_abs_list] * num_targets
-            
-        tolerance_pct_list = params.tolerance_pct
-        if isinstance(tolerance_pct_list, float):
-            tolerance_pct_list = [tolerance_pct_list] * num_targets
-
-        # 3. 构建R脚本的命令行参数
-        cmd = [
-            "Rscript",
-            self.r_script_path,
-            "--input", str(csv_path),
-            "--output-dir", str(output_dir),
-            "--file-id", task_id,
-            "--target-forces", ",".join(map(str, params.target_forces)),
-            "--tolerance-abs", ",".join(map(str, tolerance_abs_list)),
-            "--tolerance-pct", ",".join(map(str, tolerance_pct_list)),
-        ]
-        
-        logger.info(f"即将执行R命令: {' '.join(cmd)}")
-        
-        try:
-            # 4. 执行R脚本，并捕获输出
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                encoding='utf-8'
-            )
-            
-            # 记录R脚本的输出，便于调试
-            if result.stdout:
-                logger.info("R script stdout:\n" + result.stdout)
-            if result.stderr:
-                logger.warning("R script stderr:\n" + result.stderr)
-
-        except subprocess.CalledProcessError as e:
-            # 如果R脚本执行失败，构造详细的错误信息
-            error_message = f"R分析执行失败: {e.stderr}"
-            logger.error(error_message, exc_info=True)
-            raise Exception(error_message)
-        
-        # 5. 读取R脚本生成的JSON结果文件
-        result_json_path = output_dir / "analysis_results.json"
-        if not result_json_path.exists():
-            error_msg = "R脚本执行成功，但未找到预期的结果文件 analysis_results.json"
-            logger.error(error_msg)
-            raise FileNotFoundError(error_msg)
-
-        with open(result_json_path, 'r', encoding='utf-8') as f:
-            analysis_results = json.load(f)
-
-        # 6. 保存到历史记录
-        self.save_to_history(task_id, analysis_results, params.file_id)
-        
-        return analysis_results
-    
-    def _process_results(self, task_id: str, output_dir: Path) -> Dict[str, Any]:
-        """处理R脚本的输出结果"""
-        results_file = output_dir / "analysis_results.json"
-        if not results_file.exists():
-            raise FileNotFoundError("分析结果文件 analysis_results.json 未找到")
-
-        with open(results_file, 'r', encoding='utf-8') as f:
-            statistics = json.load(f)
-
-        def _to_dict(data: Any) -> Dict:
-            """将列表中的单个对象转换为对象"""
-            if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
-                return data[0]
-            if isinstance(data, dict):
-                return data
-            return {}
-
-        # 确保关键数据是对象而非列表
-        data_summary = _to_dict(statistics.get('data_summary'))
-        overall_stats = _to_dict(statistics.get('overall_stats'))
-        target_analysis = statistics.get('target_analysis', [])
-        process_capability = statistics.get('process_capability', [])
-
-        charts = self._collect_charts(task_id, output_dir)
-        files = self._collect_files(task_id, output_dir)
-        
-        # 生成详细分析解读
-        analysis_interpretation = self._generate_analysis_interpretation(statistics)
-        
-        logger.info(f"生成 {len(charts)} 个图表, {len(files)} 个文件")
-        
-        return {
-            'task_id': task_id,
-            'status': 'completed',
-            'charts': charts,
-            'files': files,
-            'summary_report': self._generate_summary_report(statistics),
-            'data_quality_report': self._generate_quality_report(statistics),
-            'recommendations': self._generate_recommendations(statistics),
-            'analysis_interpretation': analysis_interpretation,
-            'data_summary': data_summary,
-            'overall_stats': overall_stats,
-            'target_analysis': target_analysis,
-            'trend_stats': statistics.get('trend_stats', []),
-            'outlier_summary': statistics.get('outlier_summary', []),
-            'stability_analysis': statistics.get('stability_analysis', []),
-            'change_point_analysis': statistics.get('change_point_analysis', []),
-            'autocorr_analysis': statistics.get('autocorr_analysis', []),
-            'process_capability': process_capability,
-            
-            # 新增高级分析结果
-            'spatial_analysis': statistics.get('spatial_analysis', {}),
-            'error_distribution_analysis': statistics.get('error_distribution_analysis', {}),
-            'multi_source_variation_analysis': statistics.get('multi_source_variation_analysis', {}),
-            
-            'summary': statistics.get('summary', {}),
-            'report_url': f'/api/download-report/{task_id}',
-            'scatter_data_url': f'/static/charts/{task_id}/scatter_3d_data.csv'
-        }
-    
-    def _collect_charts(self, task_id: str, output_dir: Path) -> List[Dict[str, Any]]:
-        """收集生成的图表文件 - 完整的30个图表"""
-        charts = []
-        
-        if not output_dir.exists():
-            return charts
-        
-        # 完整的图表信息映射 - 包含所有30个图表
-        chart_mapping = {
-            # 基础分析图表 (1-5)
-            "force_time_series.png": {
-                "title": "力值时间序列图（按目标力值分组）",
-                "category": "基础分析",
-                "description": "展示力值随时间的变化趋势和波动模式，实心点为合格数据，空心点为异常数据",
-                "interpretation": """
+# 完整的图表信息映射（文件名 -> 标题、类别、说明），也用于按类别选择需要生成的图表
+CHART_MAPPING = {
+    # 基础分析图表 (1-5)
+    "force_time_series.png": {
+        "title": "力值时间序列图（按目标力值分组）",
+        "category": "基础分析",
+        "description": "展示力值随时间的变化趋势和波动模式，实心点为合格数据，空心点为异常数据",
+        "interpretation": """
 • 实心点：在容差内的合格数据点
 • 空心点：超出容差的异常数据点  
 • 红虚线：目标力值水平线
@@ -216,13 +52,13 @@ class RAnalysisEngine:
 - 数据点是否主要集中在容差区域内
 - 是否存在明显的上升或下降趋势
 - 异常点是否存在聚集现象或周期性模式
-                """
-            },
-            "force_histogram.png": {
-                "title": "力值分布直方图（按目标力值分组）",
-                "category": "基础分析", 
-                "description": "分析每个目标力值组的数据分布特征和正态性",
-                "interpretation": """
+        """
+    },
+    "force_histogram.png": {
+        "title": "力值分布直方图（按目标力值分组）",
+        "category": "基础分析", 
+        "description": "分析每个目标力值组的数据分布特征和正态性",
+        "interpretation": """
 • 直方图：力值的频次分布
 • 红虚线：目标力值位置
 • 蓝实线：实际测量的平均值
@@ -231,13 +67,13 @@ class RAnalysisEngine:
 - 实际均值与目标值的偏离程度
 - 分布的宽度（反映数据稳定性）
 - 是否存在双峰或多峰分布
-                """
-            },
-            "force_boxplot.png": {
-                "title": "力值箱线图（按目标力值分组）",
-                "category": "基础分析",
-                "description": "快速识别数据的分位数特征和异常值分布",
-                "interpretation": """
+        """
+    },
+    "force_boxplot.png": {
+        "title": "力值箱线图（按目标力值分组）",
+        "category": "基础分析",
+        "description": "快速识别数据的分位数特征和异常值分布",
+        "interpretation": """
 • 箱体：25%-75%分位数范围（IQR）
 • 中线：中位数
 • 白菱形：平均值
@@ -247,13 +83,13 @@ class RAnalysisEngine:
 - 箱体的高度（数据离散程度）
 - 中位数与目标值的对齐程度
 - 异常值的数量和分布
-                """
-            },
-            "deviation_analysis.png": {
-                "title": "绝对偏差箱线图（按目标力值分组）",
-                "category": "偏差分析",
-                "description": "分析实际测量值与目标值的绝对偏差分布",
-                "interpretation": """
+        """
+    },
+    "deviation_analysis.png": {
+        "title": "绝对偏差箱线图（按目标力值分组）",
+        "category": "偏差分析",
+        "description": "分析实际测量值与目标值的绝对偏差分布",
+        "interpretation": """
 • Y轴：实际力值 - 目标力值
 • 绿线：零偏差（理想状态）
 • 橙虚线：绝对容差限制
@@ -263,13 +99,13 @@ class RAnalysisEngine:
 - 偏差分布是否以零为中心
 - 是否存在系统性偏移
 - 超出容差限制的数据点比例
-                """
-            },
-            "percentage_deviation.png": {
-                "title": "百分比偏差箱线图（按目标力值分组）",
-                "category": "偏差分析",
-                "description": "分析相对于目标值的百分比偏差，消除目标值大小的影响",
-                "interpretation": """
+        """
+    },
+    "percentage_deviation.png": {
+        "title": "百分比偏差箱线图（按目标力值分组）",
+        "category": "偏差分析",
+        "description": "分析相对于目标值的百分比偏差，消除目标值大小的影响",
+        "interpretation": """
 • Y轴：(实际力值-目标力值)/目标力值 × 100%
 • 绿线：零偏差
 • 橙虚线：百分比容差限制
@@ -277,15 +113,15 @@ class RAnalysisEngine:
 - 不同目标力值组的相对精度是否一致
 - 小力值和大力值的相对稳定性对比
 - 百分比容差的实际达成情况
-                """
-            },
-            
-            # 统计过程控制图表 (6-12)
-            "shewhart_control.png": {
-                "title": "Shewhart控制图（按目标力值分组）",
-                "category": "统计过程控制",
-                "description": "统计过程控制的核心工具，监测过程稳定性",
-                "interpretation": """
+        """
+    },
+    
+    # 统计过程控制图表 (6-12)
+    "shewhart_control.png": {
+        "title": "Shewhart控制图（按目标力值分组）",
+        "category": "统计过程控制",
+        "description": "统计过程控制的核心工具，监测过程稳定性",
+        "interpretation": """
 • 绿线：过程中心线（均值）
 • 红虚线：3σ控制限（99.7%数据应在此范围内）
 • 橙点线：2σ警戒线（95%数据应在此范围内）
@@ -294,13 +130,13 @@ class RAnalysisEngine:
 - 超出3σ控制限的点（过程失控）
 - 连续7点在中心线同一侧（过程偏移）
 - 连续趋势或周期性模式
-                """
-            },
-            "moving_average.png": {
-                "title": "移动平均图（按目标力值分组）",
-                "category": "统计过程控制",
-                "description": "平滑短期波动，突出长期趋势变化",
-                "interpretation": """
+        """
+    },
+    "moving_average.png": {
+        "title": "移动平均图（按目标力值分组）",
+        "category": "统计过程控制",
+        "description": "平滑短期波动，突出长期趋势变化",
+        "interpretation": """
 • 细线：原始数据
 • 粗线：移动平均线
 • 彩色带：移动标准差范围
@@ -309,13 +145,13 @@ class RAnalysisEngine:
 - 移动平均线是否稳定在目标值附近
 - 标准差带的宽度变化（稳定性变化）
 - 长期趋势的方向和幅度
-                """
-            },
-            "cusum_chart.png": {
-                "title": "CUSUM累计和控制图",
-                "category": "统计过程控制",
-                "description": "检测过程均值的小幅持续性偏移，对微小变化敏感",
-                "interpretation": """
+        """
+    },
+    "cusum_chart.png": {
+        "title": "CUSUM累计和控制图",
+        "category": "统计过程控制",
+        "description": "检测过程均值的小幅持续性偏移，对微小变化敏感",
+        "interpretation": """
 • 红线：累计正偏差（高于目标的累积）
 • 蓝线：累计负偏差（低于目标的累积）
 • 水平虚线：±4的决策界限
@@ -323,13 +159,13 @@ class RAnalysisEngine:
 - 超出±4界限表示过程失控
 - 持续上升/下降趋势表示系统偏移
 - 比Shewhart图对小偏移更敏感
-                """
-            },
-            "ewma_chart.png": {
-                "title": "EWMA指数加权移动平均控制图",
-                "category": "统计过程控制",
-                "description": "对小幅偏移敏感的统计控制，具有记忆功能",
-                "interpretation": """
+        """
+    },
+    "ewma_chart.png": {
+        "title": "EWMA指数加权移动平均控制图",
+        "category": "统计过程控制",
+        "description": "对小幅偏移敏感的统计控制，具有记忆功能",
+        "interpretation": """
 • 粗线：EWMA曲线（平滑的指数加权移动平均）
 • 绿线：目标中心线
 • 红虚线：3σ控制限
@@ -338,13 +174,13 @@ class RAnalysisEngine:
 - 平滑参数λ=0.2，对历史数据有记忆
 - 比传统控制图更快检测小偏移
 - EWMA线的连续趋势比单点更重要
-                """
-            },
-            "imr_chart.png": {
-                "title": "I-MR个值移动极差控制图",
-                "category": "统计过程控制",
-                "description": "适用于个别测量值的统计过程控制",
-                "interpretation": """
+        """
+    },
+    "imr_chart.png": {
+        "title": "I-MR个值移动极差控制图",
+        "category": "统计过程控制",
+        "description": "适用于个别测量值的统计过程控制",
+        "interpretation": """
 • I图(上)：个别测量值的控制
 • MR图(下)：相邻测量值间变异的控制
 • 绿线：过程中心线
@@ -353,13 +189,13 @@ class RAnalysisEngine:
 - I图失控表示过程位置偏移
 - MR图失控表示过程变异增大
 - 适用于单个测量值的连续监控
-                """
-            },
-            "xbar_r_chart.png": {
-                "title": "X-bar & R控制图组合",
-                "category": "统计过程控制",
-                "description": "同时监控过程均值和变异性的组合控制图",
-                "interpretation": """
+        """
+    },
+    "xbar_r_chart.png": {
+        "title": "X-bar & R控制图组合",
+        "category": "统计过程控制",
+        "description": "同时监控过程均值和变异性的组合控制图",
+        "interpretation": """
 • X-bar图：监控过程平均水平
 • R图：监控过程变异性（极差）
 • 绿线：中心线
@@ -368,13 +204,13 @@ class RAnalysisEngine:
 - X-bar图失控表示均值偏移
 - R图失控表示变异增大
 - 两图需结合分析，识别不同类型的过程变化
-                """
-            },
-            "run_chart.png": {
-                "title": "运行图（Run Chart）",
-                "category": "统计过程控制",
-                "description": "检测数据中的非随机模式和趋势",
-                "interpretation": """
+        """
+    },
+    "run_chart.png": {
+        "title": "运行图（Run Chart）",
+        "category": "统计过程控制",
+        "description": "检测数据中的非随机模式和趋势",
+        "interpretation": """
 • 蓝虚线：中位数
 • 三角形：高于/低于中位数的点
 • 连续游程：连续的同向偏离
@@ -382,15 +218,15 @@ class RAnalysisEngine:
 - 连续8点在中位数同一侧（非随机模式）
 - 游程长度的分布
 - 明显的趋势或周期性
-                """
-            },
-            
-            # 空间分析图表 (13-18)
-            "coordinate_matrix.png": {
-                "title": "XYZ坐标对比矩阵（按目标力值分组）",
-                "category": "空间分析",
-                "description": "分析多变量间的两两关系和空间分布模式",
-                "interpretation": """
+        """
+    },
+    
+    # 空间分析图表 (13-18)
+    "coordinate_matrix.png": {
+        "title": "XYZ坐标对比矩阵（按目标力值分组）",
+        "category": "空间分析",
+        "description": "分析多变量间的两两关系和空间分布模式",
+        "interpretation": """
 • 对角线：各变量的密度分布
 • 下三角：散点图
 • 上三角：相关系数
@@ -399,13 +235,13 @@ class RAnalysisEngine:
 - 变量间的线性相关关系
 - 异常点在多维空间的表现
 - 相关系数的强度和方向
-                """
-            },
-            "xy_heatmap.png": {
-                "title": "XY平面密度热力图（按目标力值分组）",
-                "category": "空间分析",
-                "description": "显示数据点在平面上的密度分布和质量热点",
-                "interpretation": """
+        """
+    },
+    "xy_heatmap.png": {
+        "title": "XY平面密度热力图（按目标力值分组）",
+        "category": "空间分析",
+        "description": "显示数据点在平面上的密度分布和质量热点",
+        "interpretation": """
 • 等高线：数据密度等级
 • 点的颜色和形状：合格性状态
 • 密度高的区域：数据集中区
@@ -413,13 +249,13 @@ class RAnalysisEngine:
 - 数据采集的空间代表性
 - 高密度区域的质量表现
 - 异常点的空间分布特征
-                """
-            },
-            "parallel_coordinates.png": {
-                "title": "并行坐标图 - 多维异常模式",
-                "category": "空间分析",
-                "description": "在多维空间中可视化数据模式和异常检测",
-                "interpretation": """
+        """
+    },
+    "parallel_coordinates.png": {
+        "title": "并行坐标图 - 多维异常模式",
+        "category": "空间分析",
+        "description": "在多维空间中可视化数据模式和异常检测",
+        "interpretation": """
 • 各轴：不同的测量维度
 • 连线：每个数据点的多维特征
 • 颜色：目标力值分组
@@ -427,13 +263,13 @@ class RAnalysisEngine:
 - 多维空间中的异常模式
 - 不同维度间的协同变化
 - 异常数据的多维特征
-                """
-            },
-            "projection_combined.png": {
-                "title": "2D投影图组合",
-                "category": "空间分析",
-                "description": "三维数据在不同平面上的投影分析",
-                "interpretation": """
+        """
+    },
+    "projection_combined.png": {
+        "title": "2D投影图组合",
+        "category": "空间分析",
+        "description": "三维数据在不同平面上的投影分析",
+        "interpretation": """
 • XY投影：水平平面视图
 • XZ投影：纵向视图
 • YZ投影：侧向视图
@@ -442,13 +278,13 @@ class RAnalysisEngine:
 - 不同投影面上的异常分布
 - 空间异常的方向性特征
 - 三维数据的二维表现
-                """
-            },
-            "spatial_clustering.png": {
-                "title": "空间聚类异常检测图",
-                "category": "空间分析",
-                "description": "基于空间位置的聚类分析和异常检测",
-                "interpretation": """
+        """
+    },
+    "spatial_clustering.png": {
+        "title": "空间聚类异常检测图",
+        "category": "空间分析",
+        "description": "基于空间位置的聚类分析和异常检测",
+        "interpretation": """
 • 颜色：空间聚类分组
 • 形状：实心圆（合格）vs 空心圆（异常）
 • 大小：绝对偏差的大小
@@ -456,13 +292,13 @@ class RAnalysisEngine:
 - 异常点在空间中的聚集模式
 - 不同区域的质量表现差异
 - 空间相关的质量问题
-                """
-            },
-            "position_heatmap.png": {
-                "title": "位置异常率热力图",
-                "category": "空间分析",
-                "description": "识别空间位置与质量表现的关系",
-                "interpretation": """
+        """
+    },
+    "position_heatmap.png": {
+        "title": "位置异常率热力图",
+        "category": "空间分析",
+        "description": "识别空间位置与质量表现的关系",
+        "interpretation": """
 • 颜色深浅：异常率高低
 • 绿色：质量良好区域
 • 黄色：质量一般区域
@@ -471,15 +307,15 @@ class RAnalysisEngine:
 - 是否存在质量热点区域
 - 空间异常模式的规律性
 - 不同目标力值在相同位置的表现
-                """
-            },
-            
-            # 高级分析图表 (19-24)
-            "correlation_matrix.png": {
-                "title": "变量相关性矩阵",
-                "category": "高级分析",
-                "description": "显示各变量间的线性相关关系强度",
-                "interpretation": """
+        """
+    },
+    
+    # 高级分析图表 (19-24)
+    "correlation_matrix.png": {
+        "title": "变量相关性矩阵",
+        "category": "高级分析",
+        "description": "显示各变量间的线性相关关系强度",
+        "interpretation": """
 • 颜色深浅：相关系数的强度
 • 红色：正相关
 • 蓝色：负相关
@@ -488,13 +324,13 @@ class RAnalysisEngine:
 - 哪些变量间存在强相关
 - 相关关系的方向（正/负）
 - 异常的相关模式
-                """
-            },
-            "pareto_analysis.png": {
-                "title": "帕雷托图 - 异常原因分析",
-                "category": "高级分析",
-                "description": "识别主要的异常原因，应用80/20原则",
-                "interpretation": """
+        """
+    },
+    "pareto_analysis.png": {
+        "title": "帕雷托图 - 异常原因分析",
+        "category": "高级分析",
+        "description": "识别主要的异常原因，应用80/20原则",
+        "interpretation": """
 • 柱状图：各类异常的数量
 • 折线图：累积百分比
 • 异常类型：双重超差 > 绝对超差 > 百分比超差
@@ -502,13 +338,13 @@ class RAnalysisEngine:
 - 哪种异常类型最常见
 - 前80%的问题由哪几种原因造成
 - 不同目标力值的异常模式差异
-                """
-            },
-            "residual_analysis.png": {
-                "title": "残差分析图",
-                "category": "高级分析",
-                "description": "检验模型假设和识别系统性误差",
-                "interpretation": """
+        """
+    },
+    "residual_analysis.png": {
+        "title": "残差分析图",
+        "category": "高级分析",
+        "description": "检验模型假设和识别系统性误差",
+        "interpretation": """
 • X轴：模型拟合值（均值）
 • Y轴：残差（实际值-拟合值）
 • 红虚线：零残差线
@@ -517,13 +353,13 @@ class RAnalysisEngine:
 - 残差是否随机分布在零线两侧
 - 是否存在残差的系统性模式
 - 方差是否均匀（等方差性）
-                """
-            },
-            "qq_plot.png": {
-                "title": "QQ图 - 正态性检验",
-                "category": "高级分析",
-                "description": "检验数据是否符合正态分布假设",
-                "interpretation": """
+        """
+    },
+    "qq_plot.png": {
+        "title": "QQ图 - 正态性检验",
+        "category": "高级分析",
+        "description": "检验数据是否符合正态分布假设",
+        "interpretation": """
 • X轴：理论正态分位数
 • Y轴：样本分位数
 • 直线：完美正态分布的参考线
@@ -531,13 +367,13 @@ class RAnalysisEngine:
 - 数据点是否紧贴参考直线
 - 尾部的偏离情况（重尾或轻尾）
 - 整体分布的偏斜程度
-                """
-            },
-            "radar_chart.png": {
-                "title": "质量指标雷达图",
-                "category": "高级分析",
-                "description": "多指标综合评估的直观展示",
-                "interpretation": """
+        """
+    },
+    "radar_chart.png": {
+        "title": "质量指标雷达图",
+        "category": "高级分析",
+        "description": "多指标综合评估的直观展示",
+        "interpretation": """
 • 各轴：不同的质量指标（成功率、Cp、Cpk）
 • 距离中心的远近：指标得分高低
 • 封闭图形的面积：综合质量水平
@@ -545,13 +381,13 @@ class RAnalysisEngine:
 - 各指标的均衡发展情况
 - 短板指标的识别
 - 不同目标力值组的综合对比
-                """
-            },
-            "waterfall_chart.png": {
-                "title": "质量损失瀑布图",
-                "category": "高级分析",
-                "description": "累积质量损失的层次分析",
-                "interpretation": """
+        """
+    },
+    "waterfall_chart.png": {
+        "title": "质量损失瀑布图",
+        "category": "高级分析",
+        "description": "累积质量损失的层次分析",
+        "interpretation": """
 • 柱状图：各目标力值的损失率
 • 阶梯线：累积损失趋势
 • 数值标签：具体的损失百分比
@@ -559,15 +395,15 @@ class RAnalysisEngine:
 - 各目标力值的质量贡献
 - 累积损失的构成
 - 主要损失来源的识别
-                """
-            },
-            
-            # 过程能力与成功率分析 (25-27)
-            "success_rate.png": {
-                "title": "成功率趋势分析",
-                "category": "过程能力",
-                "description": "监控质量表现的时间趋势变化",
-                "interpretation": """
+        """
+    },
+    
+    # 过程能力与成功率分析 (25-27)
+    "success_rate.png": {
+        "title": "成功率趋势分析",
+        "category": "过程能力",
+        "description": "监控质量表现的时间趋势变化",
+        "interpretation": """
 • X轴：时间批次
 • Y轴：成功率百分比
 • 绿虚线：90%质量基准
@@ -577,13 +413,13 @@ class RAnalysisEngine:
 - 是否达到质量基准
 - 批次间的稳定性
 - 异常批次的识别
-                """
-            },
-            "process_capability.png": {
-                "title": "过程能力指数图",
-                "category": "过程能力",
-                "description": "评估过程满足规格要求的能力",
-                "interpretation": """
+        """
+    },
+    "process_capability.png": {
+        "title": "过程能力指数图",
+        "category": "过程能力",
+        "description": "评估过程满足规格要求的能力",
+        "interpretation": """
 • Cp：过程潜在能力（仅考虑变异）
 • Cpk：过程实际能力（考虑偏移）
 • 橙线：1.0（合格线）
@@ -592,13 +428,13 @@ class RAnalysisEngine:
 - Cp ≥ 1.33: 过程能力优秀
 - 1.0 ≤ Cp < 1.33: 过程能力合格
 - Cpk显著小于Cp: 存在系统偏移
-                """
-            },
-            "capability_histogram.png": {
-                "title": "过程能力分析直方图",
-                "category": "过程能力",
-                "description": "直观显示过程分布与规格限制的关系",
-                "interpretation": """
+        """
+    },
+    "capability_histogram.png": {
+        "title": "过程能力分析直方图",
+        "category": "过程能力",
+        "description": "直观显示过程分布与规格限制的关系",
+        "interpretation": """
 • 直方图：实际数据分布
 • 曲线：正态密度拟合
 • 红虚线：上下规格限制(USL/LSL)
@@ -608,15 +444,15 @@ class RAnalysisEngine:
 - 分布是否完全在规格限制内
 - 过程均值与目标值的偏离
 - Cp≥1.33且Cpk≥1.33为优秀过程
-                """
-            },
-            
-            # 综合质量仪表盘 (28-30)
-            "quality_dashboard.png": {
-                "title": "质量控制仪表盘",
-                "category": "质量仪表盘",
-                "description": "关键质量指标的快速监控面板",
-                "interpretation": """
+        """
+    },
+    
+    # 综合质量仪表盘 (28-30)
+    "quality_dashboard.png": {
+        "title": "质量控制仪表盘",
+        "category": "质量仪表盘",
+        "description": "关键质量指标的快速监控面板",
+        "interpretation": """
 • 成功率表盘：直观显示合格率
 • 变异系数表盘：显示过程稳定性
 • 数值标签：精确的指标值
@@ -624,13 +460,13 @@ class RAnalysisEngine:
 - 成功率是否达到预期目标
 - 变异系数是否在可接受范围
 - 不同目标力值的表现对比
-                """
-            },
-            "success_rate_trend.png": {
-                "title": "成功率趋势详细分析",
-                "category": "质量仪表盘",
-                "description": "深入分析成功率的变化模式和预测",
-                "interpretation": """
+        """
+    },
+    "success_rate_trend.png": {
+        "title": "成功率趋势详细分析",
+        "category": "质量仪表盘",
+        "description": "深入分析成功率的变化模式和预测",
+        "interpretation": """
 • 时间轴：详细的时间趋势
 • 多条线：不同目标力值的成功率
 • 置信区间：预测的不确定性
@@ -638,15 +474,15 @@ class RAnalysisEngine:
 - 长期趋势的稳定性
 - 短期波动的原因
 - 未来趋势的预测
-                """
-            },
-            
-            # 新增高级分析图表 (31-36)
-            "spatial_correlation_matrix.png": {
-                "title": "误差与坐标相关性矩阵",
-                "category": "空间分析",
-                "description": "显示误差与各坐标轴的线性相关关系强度",
-                "interpretation": """
+        """
+    },
+    
+    # 新增高级分析图表 (31-36)
+    "spatial_correlation_matrix.png": {
+        "title": "误差与坐标相关性矩阵",
+        "category": "空间分析",
+        "description": "显示误差与各坐标轴的线性相关关系强度",
+        "interpretation": """
 • 红色：正相关（误差随坐标增大而增大）
 • 蓝色：负相关（误差随坐标增大而减小）
 • 数值：相关系数，越接近±1相关性越强
@@ -654,13 +490,13 @@ class RAnalysisEngine:
 - 哪个坐标轴与误差关系最强
 - 是否存在系统性的空间偏移
 - 不同目标力值的空间规律是否一致
-                """
-            },
-            "error_spatial_distribution.png": {
-                "title": "误差空间分布图（XY平面）",
-                "category": "空间分析",
-                "description": "在XY平面上显示误差的空间分布模式",
-                "interpretation": """
+        """
+    },
+    "error_spatial_distribution.png": {
+        "title": "误差空间分布图（XY平面）",
+        "category": "空间分析",
+        "description": "在XY平面上显示误差的空间分布模式",
+        "interpretation": """
 • 颜色：绿色=误差小，红色=误差大
 • 大小：点的大小表示误差值大小
 • 分面：不同目标力值的独立分析
@@ -668,13 +504,13 @@ class RAnalysisEngine:
 - 是否存在误差聚集的热点区域
 - 空间分布是否均匀随机
 - 不同目标力值的空间表现差异
-                """
-            },
-            "error_distribution_analysis.png": {
-                "title": "误差分布特性分析",
-                "category": "误差分布分析",
-                "description": "分析误差分布是否符合正态分布假设",
-                "interpretation": """
+        """
+    },
+    "error_distribution_analysis.png": {
+        "title": "误差分布特性分析",
+        "category": "误差分布分析",
+        "description": "分析误差分布是否符合正态分布假设",
+        "interpretation": """
 • 直方图：误差的实际频次分布
 • 蓝线：实际密度曲线
 • 红虚线：理论正态分布拟合
@@ -682,13 +518,13 @@ class RAnalysisEngine:
 - 实际分布与正态分布的拟合程度
 - 是否存在偏斜或多峰分布
 - 分布形状是否暗示特殊原因变异
-                """
-            },
-            "error_qq_plot.png": {
-                "title": "误差分布QQ图",
-                "category": "误差分布分析",
-                "description": "检验误差是否符合正态分布",
-                "interpretation": """
+        """
+    },
+    "error_qq_plot.png": {
+        "title": "误差分布QQ图",
+        "category": "误差分布分析",
+        "description": "检验误差是否符合正态分布",
+        "interpretation": """
 • X轴：理论正态分位数
 • Y轴：样本分位数
 • 红线：完美正态分布的参考线
@@ -696,13 +532,13 @@ class RAnalysisEngine:
 - 数据点是否紧贴参考直线
 - 尾部偏离表示重尾或轻尾分布
 - 整体偏离表示分布偏斜
-                """
-            },
-            "machine_performance_comparison.png": {
-                "title": "各机台性能对比（成功率）",
-                "category": "多源变异分析",
-                "description": "对比不同机台的质量表现，识别设备相关问题",
-                "interpretation": """
+        """
+    },
+    "machine_performance_comparison.png": {
+        "title": "各机台性能对比（成功率）",
+        "category": "多源变异分析",
+        "description": "对比不同机台的质量表现，识别设备相关问题",
+        "interpretation": """
 • 柱状图：各机台的成功率
 • 橙线：90%质量基准
 • 绿线：95%优秀基准
@@ -711,13 +547,13 @@ class RAnalysisEngine:
 - 哪台机台表现最好/最差
 - 机台间差异是否显著
 - 是否需要针对性设备维护
-                """
-            },
-            "shift_performance_comparison.png": {
-                "title": "各班次误差对比（平均误差）",
-                "category": "多源变异分析", 
-                "description": "对比不同班次的精度表现，识别人员或时间相关问题",
-                "interpretation": """
+        """
+    },
+    "shift_performance_comparison.png": {
+        "title": "各班次误差对比（平均误差）",
+        "category": "多源变异分析", 
+        "description": "对比不同班次的精度表现，识别人员或时间相关问题",
+        "interpretation": """
 • 柱状图：各班次的平均误差
 • 数值越小表示精度越高
 • 分面：不同目标力值的独立分析
@@ -725,17 +561,467 @@ class RAnalysisEngine:
 - 班次间误差是否存在系统性差异
 - 是否存在特定班次的问题
 - 人员培训或设备调试需求
-                """
-            }
+        """
+    }
+}
+
+
+def resolve_chart_selection(params: AnalysisParams) -> Optional[List[str]]:
+    """
+    根据分析参数确定需要生成的图表。
+    返回None表示生成全部图表，返回空列表表示只计算统计结果。
+    """
+    if params.stats_only:
+        return []
+    if params.chart_categories is None and params.charts is None:
+        return None
+
+    known_categories = {info["category"] for info in CHART_MAPPING.values()}
+    known_charts = {name[:-len(".png")] for name in CHART_MAPPING}
+
+    unknown_categories = [c for c in (params.chart_categories or []) if c not in known_categories]
+    if unknown_categories:
+        raise ValueError(f"未知的图表类别: {', '.join(unknown_categories)}")
+
+    requested_charts = [name[:-len(".png")] if name.endswith(".png") else name for name in (params.charts or [])]
+    unknown_charts = [name for name in requested_charts if name not in known_charts]
+    if unknown_charts:
+        raise ValueError(f"未知的图表: {', '.join(unknown_charts)}")
+
+    selected = set(requested_charts)
+    for name, info in CHART_MAPPING.items():
+        if info["category"] in (params.chart_categories or []):
+            selected.add(name[:-len(".png")])
+
+    return sorted(selected)
+
+
+def get_chart_profile(profile_name: Optional[str] = None) -> Dict[str, Any]:
+    """返回图表输出配置（含配置名），未指定时使用默认配置"""
+    name = profile_name or settings.CHART_DEFAULT_PROFILE
+    if name not in settings.CHART_PROFILES:
+        raise ValueError(f"未知的图表输出配置: {name}")
+    return {"name": name, **settings.CHART_PROFILES[name]}
+
+
+def get_chart_dir(task_id: str, profile_name: Optional[str] = None) -> Path:
+    """返回指定输出配置的图表目录：默认配置为任务目录，其他配置为任务目录下的同名子目录"""
+    profile = get_chart_profile(profile_name)
+    task_dir = Path(settings.CHARTS_DIR) / task_id
+    if profile["name"] == settings.CHART_DEFAULT_PROFILE:
+        return task_dir
+    return task_dir / profile["name"]
+
+
+def get_chart_path(task_id: str, chart_name: str, profile_name: Optional[str] = None) -> Path:
+    """返回指定输出配置下图表文件的路径（默认配置始终为png）"""
+    profile = get_chart_profile(profile_name)
+    extension = "png" if profile["name"] == settings.CHART_DEFAULT_PROFILE else profile["format"]
+    return get_chart_dir(task_id, profile["name"]) / f"{chart_name}.{extension}"
+
+
+def _r_output_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """转换为R脚本使用的输出配置：WebP先由R渲染为PNG再转换"""
+    return {
+        "dpi": profile["dpi"],
+        "scale": profile["scale"],
+        "format": "svg" if profile["format"] == "svg" else "png",
+    }
+
+
+def _convert_to_webp(png_path: Path):
+    """将R渲染的PNG转换为WebP并删除PNG"""
+    webp_path = png_path.with_suffix(".webp")
+    temp_path = png_path.with_name(f".{png_path.stem}.{os.getpid()}.tmp.webp")
+    with Image.open(png_path) as image:
+        image.save(temp_path, "WEBP", quality=85, method=4)
+    os.replace(temp_path, webp_path)
+    png_path.unlink()
+
+
+class RAnalysisEngine:
+    """R分析引擎，负责调用R脚本并处理结果"""
+    
+    # R可用性检查只在进程内成功执行一次，之后创建引擎实例不再启动R进程
+    _r_checked = False
+    _r_check_lock = threading.Lock()
+    
+    def __init__(self):
+        # 确保R的可执行文件路径在环境变量中
+        if settings.R_HOME not in os.environ['PATH']:
+            os.environ['PATH'] = f"{settings.R_HOME}{os.pathsep}{os.environ['PATH']}"
+        
+        # 修正R脚本的路径，使其指向 backend/r_analysis/
+        self.r_script_path = os.path.join(settings.BASE_DIR, "backend", "r_analysis", "pressure_analysis.R")
+        if not os.path.exists(self.r_script_path):
+            raise FileNotFoundError(f"R脚本未找到: {self.r_script_path}")
+            
+        try:
+            # 设置静态文件目录
+            self.static_dir = Path(settings.STATIC_DIR)
+            self.charts_dir = Path(settings.CHARTS_DIR)
+            
+            # 检查R是否可用
+            with RAnalysisEngine._r_check_lock:
+                if not RAnalysisEngine._r_checked:
+                    result = subprocess.run(['R', '--version'], capture_output=True, text=True, timeout=10)
+                    if result.returncode != 0:
+                        raise Exception("R未安装或不可用")
+                    RAnalysisEngine._r_checked = True
+                    logger.info("R分析引擎初始化成功")
+            
+        except subprocess.TimeoutExpired:
+            logger.error("R版本检查超时")
+            raise Exception("R响应超时")
+        except FileNotFoundError:
+            logger.error("R未找到，请确保R已安装并在PATH中")
+            raise Exception("R未安装")
+        except Exception as e:
+            logger.error(f"R分析引擎初始化失败: {str(e)}")
+            raise
+    
+    def analyze_data(self, csv_path: str, params: AnalysisParams, task_id: str,
+                     progress_callback: Optional[Callable[[int, str], None]] = None) -> Dict[str, Any]:
+        """
+        核心分析函数：调用R脚本执行数据分析。
+        progress_callback(progress, message) 在R端每个阶段开始/结束时调用。
+        """
+        # 1. 为每个任务创建一个独立的、带时间戳的输出目录
+        output_dir = Path(settings.CHARTS_DIR) / task_id
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 2. 处理容差参数，确保它们是列表
+        num_targets = len(params.target_forces)
+        
+        tolerance_abs_list = params.tolerance_abs
+        if isinstance(tolerance_abs_list, float):
+            tolerance_abs_list = [tolerance_abs_list] * num_targets
+            
+        tolerance_pct_list = params.tolerance_pct
+        if isinstance(tolerance_pct_list, float):
+            tolerance_pct_list = [tolerance_pct_list] * num_targets
+
+        # 3. 构建分析任务
+        job = {
+            "input": str(csv_path),
+            "output_dir": str(output_dir),
+            "file_id": task_id,
+            "target_forces": list(params.target_forces),
+            "tolerance_abs": list(tolerance_abs_list),
+            "tolerance_pct": list(tolerance_pct_list),
+            # None表示生成全部图表，空列表表示只计算统计结果
+            "charts": resolve_chart_selection(params),
+            "chart_workers": settings.R_CHART_WORKERS,
+            "lazy_charts": settings.CHART_LAZY_RENDERING,
+            "prerender": list(settings.CHART_PRERENDER_LIST),
+            # 分析时生成的图表使用默认输出配置，其他配置的图表按需渲染
+            "profile": {**_r_output_profile(get_chart_profile()), "format": "png"},
         }
         
+        # 保存分析参数，之后追加数据时使用
+        save_analysis_params(output_dir, job)
+        
+        # 4. 相同数据、参数和R脚本的分析结果已缓存时直接复用
+        cache_key = None
+        if settings.RESULT_CACHE_ENABLED:
+            cache_key = result_cache.compute_cache_key(str(csv_path), job, self.r_script_path)
+            if result_cache.restore(cache_key, output_dir):
+                StageTracker().save(output_dir, cache_hit=True)
+                with open(output_dir / "analysis_results.json", 'r', encoding='utf-8') as f:
+                    analysis_results = json.load(f)
+                self.save_to_history(task_id, analysis_results, params.file_id)
+                return analysis_results
+        
+        # 5. 执行R分析：默认交给常驻R工作进程池，也可在嵌入式R会话中运行或每次启动Rscript
+        # R端实时发送阶段事件，用于更新任务进度；各阶段耗时（包括失败或超时的任务）保存到输出目录
+        tracker = StageTracker(progress_callback)
+        try:
+            if settings.R_EXECUTION_MODE == "rpy2":
+                # 嵌入式R直接返回结果对象，无需再读取JSON文件（该模式不输出阶段事件）
+                analysis_results = self._run_embedded(job)
+            else:
+                if settings.R_EXECUTION_MODE == "pool":
+                    self._run_in_worker_pool(job, tracker)
+                else:
+                    self._run_rscript(job, tracker)
+                
+                # 读取R脚本生成的JSON结果文件
+                result_json_path = output_dir / "analysis_results.json"
+                if not result_json_path.exists():
+                    error_msg = "R脚本执行成功，但未找到预期的结果文件 analysis_results.json"
+                    logger.error(error_msg)
+                    raise FileNotFoundError(error_msg)
+
+                with open(result_json_path, 'r', encoding='utf-8') as f:
+                    analysis_results = json.load(f)
+        finally:
+            tracker.save(output_dir, cache_hit=False)
+
+        if cache_key is not None:
+            result_cache.store(cache_key, output_dir, task_id)
+        
+        # 6. 保存到历史记录
+        self.save_to_history(task_id, analysis_results, params.file_id)
+        
+        return analysis_results
+    
+    def _run_in_worker_pool(self, job: Dict[str, Any], tracker: StageTracker):
+        """在常驻R工作进程中执行分析任务"""
+        logger.info(f"提交R分析任务到工作进程池: {job['file_id']}")
+        
+        try:
+            outcome = get_worker_pool().run(job, job["file_id"], tracker.handle)
+        except RWorkerError as e:
+            error_message = f"R分析执行失败: {str(e)}"
+            logger.error(error_message)
+            raise Exception(error_message)
+        
+        if not outcome.get("ok"):
+            error_message = f"R分析执行失败: {outcome.get('error')}"
+            logger.error(error_message)
+            raise Exception(error_message)
+        
+        logger.info(f"R分析任务完成: {job['file_id']}, 耗时 {outcome.get('elapsed', 0):.2f} 秒")
+    
+    def _run_embedded(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """在嵌入式R会话（rpy2）中执行分析任务"""
+        logger.info(f"在嵌入式R会话中执行分析任务: {job['file_id']}")
+        
+        try:
+            return run_embedded_analysis(job)
+        except Exception as e:
+            limit_error = job_control.classify_failure(None, str(e))
+            if limit_error is not None:
+                raise limit_error
+            error_message = f"R分析执行失败: {str(e)}"
+            logger.error(error_message, exc_info=True)
+            raise Exception(error_message)
+    
+    def _run_rscript(self, job: Dict[str, Any], tracker: StageTracker):
+        """启动独立的Rscript进程执行分析任务"""
+        cmd = [
+            "Rscript",
+            self.r_script_path,
+            "--input", job["input"],
+            "--output-dir", job["output_dir"],
+            "--file-id", job["file_id"],
+            "--target-forces", ",".join(map(str, job["target_forces"])),
+            "--tolerance-abs", ",".join(map(str, job["tolerance_abs"])),
+            "--tolerance-pct", ",".join(map(str, job["tolerance_pct"])),
+        ]
+        cmd += ["--chart-workers", str(job["chart_workers"])]
+        if job.get("lazy_charts"):
+            cmd += ["--lazy-charts", "--prerender", ",".join(job["prerender"]) or "none"]
+        if job.get("charts") is not None:
+            cmd += ["--charts", ",".join(job["charts"]) or "none"]
+        cmd += self._profile_args(job["profile"])
+        
+        logger.info(f"即将执行R命令: {' '.join(cmd)}")
+        
+        try:
+            # 执行R脚本（应用超时、内存和CPU限制，任务取消时终止进程），逐行处理输出中的阶段事件
+            result = job_control.run_limited(cmd, job["file_id"], self._stdout_handler(job["file_id"], tracker))
+            
+            # 记录R脚本的错误输出，便于调试
+            if result.stderr:
+                logger.warning("R script stderr:\n" + result.stderr)
+
+        except subprocess.CalledProcessError as e:
+            # 如果R脚本执行失败，构造详细的错误信息
+            error_message = f"R分析执行失败: {e.stderr}"
+            logger.error(error_message, exc_info=True)
+            raise Exception(error_message)
+    
+    @staticmethod
+    def _stdout_handler(task_id: str, tracker: StageTracker) -> Callable[[str], None]:
+        """逐行处理Rscript的标准输出：阶段事件交给tracker，其余行作为R日志输出"""
+        def handle(line: str):
+            event = parse_protocol_line(line)
+            if event is None:
+                if line:
+                    logger.info(f"[R {task_id[:8]}] {line}")
+            elif event.get("event") == "stage":
+                tracker.handle(event)
+        return handle
+    
+    @staticmethod
+    def _profile_args(profile: Dict[str, Any]) -> List[str]:
+        return ["--dpi", str(profile["dpi"]), "--scale", str(profile["scale"]), "--format", profile["format"]]
+    
+    def render_charts(self, task_id: str, chart_names: List[str], profile_name: Optional[str] = None):
+        """根据分析时保存的绘图上下文，按指定输出配置渲染图表"""
+        profile = get_chart_profile(profile_name)
+        output_dir = Path(settings.CHARTS_DIR) / task_id
+        render_dir = get_chart_dir(task_id, profile["name"])
+        render_dir.mkdir(parents=True, exist_ok=True)
+        r_profile = _r_output_profile(profile)
+        if render_dir == output_dir:
+            r_profile["format"] = "png"
+        logger.info(f"按需渲染图表({profile['name']}): {task_id} -> {', '.join(chart_names)}")
+        append_count = manifest_append_count(output_dir)
+        
+        if settings.R_EXECUTION_MODE == "rpy2":
+            render_embedded_charts(str(output_dir), chart_names, str(render_dir), r_profile)
+        elif settings.R_EXECUTION_MODE == "pool":
+            try:
+                outcome = get_worker_pool().run({
+                    "action": "render",
+                    "output_dir": str(output_dir),
+                    "render_dir": str(render_dir),
+                    "charts": chart_names,
+                    "profile": r_profile,
+                })
+            except RWorkerError as e:
+                raise Exception(f"图表渲染失败: {str(e)}")
+            if not outcome.get("ok"):
+                raise Exception(f"图表渲染失败: {outcome.get('error')}")
+        else:
+            cmd = [
+                "Rscript",
+                self.r_script_path,
+                "--output-dir", str(output_dir),
+                "--render-charts", ",".join(chart_names),
+                "--render-dir", str(render_dir),
+            ] + self._profile_args(r_profile)
+            try:
+                job_control.run_limited(cmd)
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"图表渲染失败: {e.stderr}")
+        
+        if profile["format"] == "webp" and render_dir != output_dir:
+            for name in chart_names:
+                png_path = render_dir / f"{name}.png"
+                if png_path.exists():
+                    _convert_to_webp(png_path)
+        
+        finish_chart_render(
+            output_dir,
+            {name: get_chart_path(task_id, name, profile["name"]) for name in chart_names},
+            append_count
+        )
+    
+    @staticmethod
+    def get_renderable_charts(task_id: str) -> List[str]:
+        """返回可以从已保存的绘图上下文渲染的图表名称"""
+        output_dir = Path(settings.CHARTS_DIR) / task_id
+        manifest_path = output_dir / "chart_manifest.json"
+        if not manifest_path.exists() or not (output_dir / "plot_context.rds").exists():
+            return []
+        
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        unavailable = set(manifest.get('unavailable', []))
+        return [name for name in manifest.get('charts', []) if name not in unavailable]
+    
+    @classmethod
+    def get_pending_charts(cls, task_id: str, profile_name: Optional[str] = None) -> List[str]:
+        """返回指定输出配置下尚未渲染的图表名称"""
+        return [
+            name for name in cls.get_renderable_charts(task_id)
+            if not get_chart_path(task_id, name, profile_name).exists()
+        ]
+    
+    def render_pending_charts(self, task_id: str, profile_name: Optional[str] = None):
+        """渲染所有尚未渲染的图表（生成报告前调用，确保报告包含全部图表）"""
+        pending = self.get_pending_charts(task_id, profile_name)
+        if pending:
+            self.render_charts(task_id, pending, profile_name)
+    
+    def _collect_report_charts(self, task_id: str) -> List[Dict[str, Any]]:
+        """收集Word报告使用的图表，图表文件替换为报告输出配置（较低分辨率）的版本"""
+        output_dir = Path(settings.CHARTS_DIR) / task_id
+        report_profile = settings.CHART_REPORT_PROFILE
+        try:
+            self.render_pending_charts(task_id, report_profile)
+        except Exception as e:
+            # 报告配置的图表渲染失败时退回默认配置的图表
+            logger.warning(f"报告图表渲染失败，使用默认图表: {str(e)}")
+            report_profile = None
+            self.render_pending_charts(task_id)
+        
+        charts = self._collect_charts(task_id, output_dir)
+        if report_profile is not None:
+            for chart in charts:
+                report_path = get_chart_path(task_id, chart['chart_id'], report_profile)
+                if report_path.exists():
+                    chart['file_path'] = str(report_path)
+        return charts
+    
+    def _process_results(self, task_id: str, output_dir: Path) -> Dict[str, Any]:
+        """处理R脚本的输出结果"""
+        results_file = output_dir / "analysis_results.json"
+        if not results_file.exists():
+            raise FileNotFoundError("分析结果文件 analysis_results.json 未找到")
+
+        with open(results_file, 'r', encoding='utf-8') as f:
+            statistics = json.load(f)
+
+        def _to_dict(data: Any) -> Dict:
+            """将列表中的单个对象转换为对象"""
+            if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
+                return data[0]
+            if isinstance(data, dict):
+                return data
+            return {}
+
+        # 确保关键数据是对象而非列表
+        data_summary = _to_dict(statistics.get('data_summary'))
+        overall_stats = _to_dict(statistics.get('overall_stats'))
+        target_analysis = statistics.get('target_analysis', [])
+        process_capability = statistics.get('process_capability', [])
+
+        charts = self._collect_charts(task_id, output_dir)
+        files = self._collect_files(task_id, output_dir)
+        
+        # 生成详细分析解读
+        analysis_interpretation = self._generate_analysis_interpretation(statistics)
+        
+        logger.info(f"生成 {len(charts)} 个图表, {len(files)} 个文件")
+        
+        return {
+            'task_id': task_id,
+            'status': 'completed',
+            'charts': charts,
+            'files': files,
+            'summary_report': self._generate_summary_report(statistics),
+            'data_quality_report': self._generate_quality_report(statistics),
+            'recommendations': self._generate_recommendations(statistics),
+            'analysis_interpretation': analysis_interpretation,
+            'data_summary': data_summary,
+            'overall_stats': overall_stats,
+            'target_analysis': target_analysis,
+            'trend_stats': statistics.get('trend_stats', []),
+            'outlier_summary': statistics.get('outlier_summary', []),
+            'stability_analysis': statistics.get('stability_analysis', []),
+            'change_point_analysis': statistics.get('change_point_analysis', []),
+            'autocorr_analysis': statistics.get('autocorr_analysis', []),
+            'process_capability': process_capability,
+            
+            # 新增高级分析结果
+            'spatial_analysis': statistics.get('spatial_analysis', {}),
+            'error_distribution_analysis': statistics.get('error_distribution_analysis', {}),
+            'multi_source_variation_analysis': statistics.get('multi_source_variation_analysis', {}),
+            
+            'summary': statistics.get('summary', {}),
+            'report_url': f'/api/download-report/{task_id}',
+            'scatter_data_url': f'/static/charts/{task_id}/scatter_3d_data.csv'
+        }
+    
+    def _collect_charts(self, task_id: str, output_dir: Path) -> List[Dict[str, Any]]:
+        """收集生成的图表文件 - 完整的30个图表"""
+        charts = []
+        
+        if not output_dir.exists():
+            return charts
+        
         # 收集所有存在的图表文件
         chart_files = [f for f in output_dir.glob('*.png') if f.is_file()]
         
         for chart_path in chart_files:
             chart_name = chart_path.name
-            if chart_name in chart_mapping:
-                chart_info = chart_mapping[chart_name]
+            if chart_name in CHART_MAPPING:
+                chart_info = CHART_MAPPING[chart_name]
                 chart_data = {
                     'chart_id': chart_name.split('.')[0],
                     'title': chart_info['title'],
@@ -745,10 +1031,29 @@ class RAnalysisEngine:
                     'file_path': str(chart_path),
                     'file_url': f"/static/charts/{task_id}/{chart_name}",
                     'chart_type': 'analysis',
-                    'filename': chart_name
+                    'filename': chart_name,
+                    'rendered': True
                 }
                 charts.append(chart_data)
         
+        # 按需渲染模式下尚未渲染的图表，首次访问其URL时生成
+        for name in self.get_pending_charts(task_id):
+            chart_name = f"{name}.png"
+            if chart_name in CHART_MAPPING:
+                chart_info = CHART_MAPPING[chart_name]
+                charts.append({
+                    'chart_id': name,
+                    'title': chart_info['title'],
+                    'category': chart_info['category'],
+                    'description': chart_info['description'],
+                    'interpretation': chart_info['interpretation'],
+                    'file_path': str(output_dir / chart_name),
+                    'file_url': f"/static/charts/{task_id}/{chart_name}",
+                    'chart_type': 'analysis',
+                    'filename': chart_name,
+                    'rendered': False
+                })
+        
         # 按类别排序
         category_order = ["基础分析", "偏差分析", "统计过程控制", "空间分析", "高级分析", "过程能力", "质量仪表盘", "误差分布分析", "多源变异分析"]
         charts.sort(key=lambda x: (category_order.index(x['category']) if x['category'] in category_order else 999, x['title']))
@@ -1350,7 +1655,7 @@ class RAnalysisEngine:
 
         # 5. 图表展示
         doc.add_heading('5. 详细图表分析', level=1)
-        charts = self._collect_charts(task_id, Path(settings.CHARTS_DIR) / task_id)
+        charts = self._collect_report_charts(task_id)
         
         if charts:
             # 按类别组织图表
@@ -1735,7 +2040,7 @@ class RAnalysisEngine:
                 charts = []
             else:
                 logger.info(f"图表目录存在，开始收集图表")
-                charts = self._collect_charts(task_id, charts_dir)
+                charts = self._collect_report_charts(task_id)
                 logger.info(f"收集到 {len(charts)} 个图表")
             
             if charts:
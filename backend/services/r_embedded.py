@@ -0,0 +1,180 @@
+"""
+嵌入式R执行模式 - 通过rpy2在当前进程内运行分析脚本
+
+数据由pandas读取（优先读取上传时转换的Parquet文件）和清理后，以NumPy数值向量的形式直接传给R；
+分析结果以R数据框/列表的形式返回并转换为Python对象，无需再解析JSON。
+嵌入式R是单线程的，所有R调用都在同一个专用线程中串行执行。
+"""
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ..core.config import settings
+from . import columnar_store
+
+logger = logging.getLogger(__name__)
+
+# 所有嵌入式R调用都提交到这个单线程执行器，保证串行且始终在同一线程
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedded-r")
+_r_session = None
+
+
+def _get_r_session():
+    """初始化嵌入式R会话并加载分析脚本（只执行一次）"""
+    global _r_session
+    if _r_session is not None:
+        return _r_session
+
+    if settings.R_HOME not in os.environ['PATH']:
+        os.environ['PATH'] = f"{settings.R_HOME}{os.pathsep}{os.environ['PATH']}"
+
+    try:
+        import rpy2.robjects as ro
+        from rpy2.robjects import numpy2ri
+    except ImportError as e:
+        raise RuntimeError(f"嵌入式R模式需要安装rpy2: {str(e)}")
+
+    script_path = os.path.join(settings.BASE_DIR, "backend", "r_analysis", "pressure_analysis.R")
+    # 通过source()加载时脚本只定义函数，不会执行命令行入口
+    ro.r['source'](script_path, encoding="UTF-8")
+    logger.info("嵌入式R会话初始化成功")
+
+    _r_session = {
+        "ro": ro,
+        "numpy2ri": numpy2ri,
+        "build_pressure_data": ro.globalenv['build_pressure_data'],
+        "run_pressure_analysis": ro.globalenv['run_pressure_analysis'],
+        "render_saved_charts": ro.globalenv['render_saved_charts'],
+    }
+    return _r_session
+
+
+def _load_pressure_columns(csv_path: str) -> Dict[str, np.ndarray]:
+    """读取数据（优先读取上传时转换的Parquet文件）并按R脚本的规则清理，返回各列的数值数组"""
+    data = columnar_store.read_pressure_frame(csv_path)
+
+    # 移除无效数据
+    data = data[data["force"].notna() & (data["force"] > 0)]
+
+    return {column: data[column].to_numpy(dtype=np.float64) for column in data.columns}
+
+
+def _is_na(value: Any) -> bool:
+    from rpy2.rinterface import NA_Character, NA_Integer, NA_Logical
+
+    if value is NA_Character or value is NA_Integer or value is NA_Logical:
+        return True
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _to_python(obj: Any) -> Any:
+    """将R对象转换为与 write_json(auto_unbox = TRUE) 输出一致的Python结构"""
+    from rpy2 import robjects as ro
+    from rpy2.rinterface import NULL
+
+    if obj is NULL or obj is None:
+        return None
+
+    # 数据框 -> 按行的字典列表
+    if isinstance(obj, ro.vectors.DataFrame):
+        columns = {name: _column_values(obj.rx2(name)) for name in obj.names}
+        return [
+            {name: values[i] for name, values in columns.items()}
+            for i in range(obj.nrow)
+        ]
+
+    # 列表 -> 有名称时为字典，否则为列表
+    if isinstance(obj, ro.vectors.ListVector):
+        names = obj.names
+        if names is NULL or names is None:
+            return [_to_python(item) for item in obj]
+        return {name: _to_python(item) for name, item in zip(names, obj)}
+
+    # 原子向量 -> 长度为1时拆箱为标量
+    if isinstance(obj, ro.vectors.Vector):
+        values = _column_values(obj)
+        return values[0] if len(values) == 1 else values
+
+    return obj
+
+
+def _column_values(vector: Any) -> list:
+    from rpy2 import robjects as ro
+
+    if isinstance(vector, ro.vectors.FactorVector):
+        levels = list(vector.levels)
+        return [None if _is_na(code) else levels[code - 1] for code in vector]
+    if isinstance(vector, ro.vectors.ListVector):
+        return [_to_python(item) for item in vector]
+    return [None if _is_na(value) else value for value in vector]
+
+
+def _to_r_profile(ro, profile: Dict[str, Any]):
+    return ro.ListVector({
+        "dpi": ro.FloatVector([profile["dpi"]]),
+        "scale": ro.FloatVector([profile["scale"]]),
+        "format": ro.StrVector([profile["format"]]),
+    })
+
+
+def _run_embedded(job: Dict[str, Any]) -> Dict[str, Any]:
+    session = _get_r_session()
+    ro = session["ro"]
+    to_r = session["numpy2ri"].converter.py2rpy
+
+    columns = _load_pressure_columns(job["input"])
+    r_data = session["build_pressure_data"](**{name: to_r(values) for name, values in columns.items()})
+
+    # 嵌入式R运行在当前进程中，无法单独终止或限制内存，只通过setTimeLimit()限制CPU和墙钟时间
+    ro.r['setTimeLimit'](
+        cpu=settings.R_JOB_MAX_CPU_SECONDS or float('inf'),
+        elapsed=settings.TASK_TIMEOUT or float('inf'),
+    )
+    try:
+        r_results = session["run_pressure_analysis"](
+            data_file=job["input"],
+            output_dir=job["output_dir"],
+            target_forces=ro.FloatVector(job["target_forces"]),
+            tolerance_abs=ro.FloatVector(job["tolerance_abs"]),
+            tolerance_pct=ro.FloatVector(job["tolerance_pct"]),
+            file_id=job["file_id"],
+            data=r_data,
+            charts=ro.NULL if job.get("charts") is None else ro.StrVector(job["charts"]),
+            # 在嵌入R的多线程Python进程中fork不安全，图表始终串行渲染
+            chart_workers=1,
+            lazy_charts=bool(job.get("lazy_charts")),
+            prerender=ro.StrVector(job.get("prerender") or []),
+            profile=_to_r_profile(ro, job["profile"]),
+        )
+    finally:
+        ro.r['setTimeLimit'](cpu=float('inf'), elapsed=float('inf'))
+    results = _to_python(r_results)
+
+    # 清理本次分析在R会话中产生的对象，避免内存持续增长
+    ro.r('invisible(gc())')
+    return results
+
+
+def run_embedded_analysis(job: Dict[str, Any]) -> Dict[str, Any]:
+    """在嵌入式R会话中执行分析任务（阻塞直到完成），返回分析结果字典"""
+    return _executor.submit(_run_embedded, job).result()
+
+
+def _render_embedded(output_dir: str, chart_names: List[str], render_dir: str, profile: Dict[str, Any]):
+    session = _get_r_session()
+    ro = session["ro"]
+    session["render_saved_charts"](
+        output_dir,
+        ro.StrVector(chart_names),
+        render_dir=render_dir,
+        profile=_to_r_profile(ro, profile),
+    )
+
+
+def render_embedded_charts(output_dir: str, chart_names: List[str], render_dir: str, profile: Dict[str, Any]):
+    """在嵌入式R会话中根据已保存的绘图上下文，按输出配置将图表渲染到render_dir"""
+    _executor.submit(_render_embedded, output_dir, chart_names, render_dir, profile).result()
@@ -0,0 +1,333 @@
+"""
+R工作进程池 - 维护一组常驻的Rscript进程，避免每次分析都重新加载R包
+
+每个工作进程以 `Rscript pressure_analysis.R --worker` 启动，R包和主题只加载一次，
+之后通过标准输入接收JSON格式的任务，通过带 "@@PA@@" 前缀的标准输出行回报结果。
+工作进程在处理一定数量的任务或内存占用过高后会被回收并替换。
+工作进程以独立进程组启动并受 R_JOB_MAX_MEMORY_MB 内存限制；任务超时或被取消时整个进程组被终止。
+"""
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+from . import job_control
+
+logger = logging.getLogger(__name__)
+
+# 与R脚本中 worker_protocol_prefix 保持一致
+PROTOCOL_PREFIX = "@@PA@@"
+
+
+def parse_protocol_line(line: str) -> Optional[Dict[str, Any]]:
+    """解析R端输出的协议行，普通输出行返回None"""
+    if not line.startswith(PROTOCOL_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PROTOCOL_PREFIX):])
+    except json.JSONDecodeError:
+        logger.warning(f"无法解析R工作进程消息: {line}")
+        return None
+
+
+class RWorkerError(Exception):
+    """R工作进程异常（启动失败、进程意外退出等）"""
+
+
+class RWorker:
+    """单个常驻R工作进程"""
+
+    def __init__(self, script_path: str):
+        self.script_path = script_path
+        self.process: Optional[subprocess.Popen] = None
+        self.jobs_done = 0
+        self.memory_mb = 0.0
+        self._events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, timeout: float):
+        """启动Rscript进程并等待其加载完R包"""
+        # 确保R的可执行文件路径在环境变量中
+        env = os.environ.copy()
+        if settings.R_HOME not in env.get("PATH", ""):
+            env["PATH"] = f"{settings.R_HOME}{os.pathsep}{env.get('PATH', '')}"
+
+        self.process = subprocess.Popen(
+            ["Rscript", self.script_path, "--worker"],
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            # CPU时间按任务在R端通过setTimeLimit()限制，常驻进程只限制内存
+            **job_control.popen_kwargs(memory_mb=settings.R_JOB_MAX_MEMORY_MB),
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+        event = self._next_event(timeout)
+        if event is None or event.get("event") != "ready":
+            self.stop()
+            raise RWorkerError(f"R工作进程启动失败: {event}")
+
+        logger.info(f"R工作进程已就绪 (pid={self.pid})")
+
+    def _read_stdout(self):
+        """读取标准输出：协议行放入事件队列，其余作为R日志输出"""
+        for line in self.process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(PROTOCOL_PREFIX):
+                event = parse_protocol_line(line)
+                if event is not None:
+                    self._events.put(event)
+            elif line:
+                logger.info(f"[R worker {self.pid}] {line}")
+        # 标准输出关闭说明进程已退出
+        self._events.put(None)
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            line = line.rstrip("\n")
+            if line:
+                logger.warning(f"[R worker {self.pid}] {line}")
+
+    def _next_event(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def kill(self):
+        """立即终止工作进程及其子进程（任务超时或被取消时调用）"""
+        if self.process:
+            job_control.kill_process_tree(self.process)
+
+    def run_job(self, job: Dict[str, Any], task_id: Optional[str] = None,
+                on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """发送一个分析任务并阻塞等待其完成；超时或被取消时终止工作进程
+
+        on_event 接收任务执行过程中R端发送的阶段事件。
+        """
+        if not self.is_alive():
+            raise RWorkerError("R工作进程未运行")
+
+        job = {
+            **job,
+            "job_id": job.get("job_id") or uuid.uuid4().hex,
+            "limits": {"cpu": settings.R_JOB_MAX_CPU_SECONDS, "elapsed": settings.TASK_TIMEOUT},
+        }
+        # R端的elapsed限制只在可中断点生效，这里留出余量作为兜底
+        deadline = time.monotonic() + settings.TASK_TIMEOUT + 10 if settings.TASK_TIMEOUT else None
+
+        with job_control.registered(task_id, self.kill):
+            try:
+                self.process.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise RWorkerError(f"无法向R工作进程发送任务: {e}")
+
+            while True:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self.kill()
+                    raise job_control.timeout_exceeded()
+                try:
+                    event = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                if event is None:
+                    self.process.wait()
+                    if job_control.is_cancelled(task_id):
+                        raise job_control.JobCancelled(f"任务 {task_id} 已取消")
+                    limit_error = job_control.classify_failure(self.process.returncode, "")
+                    if limit_error is not None:
+                        raise limit_error
+                    raise RWorkerError(f"R工作进程在执行任务时意外退出 (exit code={self.process.returncode})")
+                if event.get("event") == "done" and event.get("job_id") == job["job_id"]:
+                    self.jobs_done += 1
+                    self.memory_mb = float(event.get("memory_mb") or 0)
+                    if not event.get("ok"):
+                        limit_error = job_control.classify_failure(None, event.get("error"))
+                        if limit_error is not None:
+                            raise limit_error
+                    return event
+                if event.get("event") == "stage" and on_event is not None:
+                    on_event(event)
+                if event.get("event") == "error":
+                    logger.warning(f"R工作进程报告错误: {event.get('message')}")
+
+    def stop(self, timeout: float = 5):
+        """请求进程正常退出，超时后强制结束"""
+        if not self.process:
+            return
+        if self.is_alive():
+            try:
+                self.process.stdin.write(json.dumps({"action": "shutdown"}) + "\n")
+                self.process.stdin.flush()
+                self.process.stdin.close()
+                self.process.wait(timeout=timeout)
+            except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        logger.info(f"R工作进程已停止 (pid={self.pid}, 已处理任务={self.jobs_done})")
+
+
+class RWorkerPool:
+    """固定大小的R工作进程池"""
+
+    def __init__(self, script_path: str, size: int, max_jobs: int, max_memory_mb: float, start_timeout: float):
+        self.script_path = script_path
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.start_timeout = start_timeout
+
+        self._idle: "queue.Queue[RWorker]" = queue.Queue()
+        self._workers: List[RWorker] = []
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._recycled = 0
+
+    def start(self):
+        """补齐进程池中的工作进程（在后台线程中启动）"""
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self._workers) - self._starting
+            self._starting += max(0, missing)
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._spawn_worker, daemon=True).start()
+
+    def _spawn_worker(self):
+        worker = RWorker(self.script_path)
+        try:
+            worker.start(self.start_timeout)
+        except Exception as e:
+            logger.error(f"启动R工作进程失败: {str(e)}")
+            with self._lock:
+                self._starting -= 1
+            return
+
+        with self._lock:
+            self._starting -= 1
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._workers.append(worker)
+        if closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def _acquire(self) -> RWorker:
+        self.start()
+        while True:
+            try:
+                worker = self._idle.get(timeout=1)
+            except queue.Empty:
+                with self._lock:
+                    if self._closed:
+                        raise RWorkerError("R工作进程池已关闭")
+                    if not self._workers and self._starting == 0:
+                        raise RWorkerError("没有可用的R工作进程，请检查R是否已正确安装")
+                continue
+            if worker.is_alive():
+                return worker
+            self._retire(worker)
+
+    def _release(self, worker: RWorker):
+        if not worker.is_alive():
+            self._retire(worker)
+        elif worker.jobs_done >= self.max_jobs:
+            logger.info(f"R工作进程 {worker.pid} 已处理 {worker.jobs_done} 个任务，进行回收")
+            self._retire(worker)
+        elif worker.memory_mb >= self.max_memory_mb:
+            logger.info(f"R工作进程 {worker.pid} 内存占用 {worker.memory_mb:.1f}MB 超过上限，进行回收")
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+
+    def _retire(self, worker: RWorker):
+        """停止工作进程并在后台补充新进程"""
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+                self._recycled += 1
+        threading.Thread(target=worker.stop, daemon=True).start()
+        self.start()
+
+    def run(self, job: Dict[str, Any], task_id: Optional[str] = None,
+            on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """在空闲工作进程上执行任务，返回R端的done事件"""
+        worker = self._acquire()
+        try:
+            return worker.run_job(job, task_id, on_event)
+        finally:
+            self._release(worker)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "alive": len(self._workers),
+                "idle": self._idle.qsize(),
+                "starting": self._starting,
+                "recycled": self._recycled,
+                "workers": [
+                    {"pid": w.pid, "jobs_done": w.jobs_done, "memory_mb": round(w.memory_mb, 1)}
+                    for w in self._workers
+                ],
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool: Optional[RWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> RWorkerPool:
+    """获取全局R工作进程池（首次调用时创建）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RWorkerPool(
+                script_path=os.path.join(settings.BASE_DIR, "backend", "r_analysis", "pressure_analysis.R"),
+                size=settings.R_WORKER_POOL_SIZE,
+                max_jobs=settings.R_WORKER_MAX_JOBS,
+                max_memory_mb=settings.R_WORKER_MAX_MEMORY_MB,
+                start_timeout=settings.R_WORKER_START_TIMEOUT,
+            )
+        return _pool
+
+
+def shutdown_worker_pool():
+    """关闭全局R工作进程池"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,229 @@
+"""
+分析结果缓存 - 相同的数据文件、分析参数和R脚本版本直接复用已有的分析产物
+
+缓存键为数据文件内容、规范化后的分析参数和R脚本内容的SHA-256哈希。
+每个缓存条目是 RESULT_CACHE_DIR/<缓存键>/ 目录，其中的文件以硬链接方式与任务输出目录共享
+（跨文件系统时退回复制），命中时再硬链接到新任务的输出目录，不会重复占用磁盘空间。
+缓存总大小超过 RESULT_CACHE_MAX_MB 时按最近使用时间淘汰条目。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from . import upload_store
+
+logger = logging.getLogger(__name__)
+
+ENTRY_FILE = "cache_entry.json"
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+# R脚本哈希: (路径, 修改时间) -> 哈希，脚本未修改时不重复计算
+_script_hashes: Dict[Tuple[str, float], str] = {}
+# 数据文件哈希: (路径, 大小, 修改时间) -> 哈希，同一上传文件在去重和缓存查找时只计算一次
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+_FILE_HASH_LIMIT = 256
+
+
+def _hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """返回数据文件内容的SHA-256哈希（按路径、大小和修改时间缓存）
+
+    上传时已计算过哈希的文件直接读取其元数据，不再重新读取文件内容。
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        meta = upload_store.load_meta(path)
+        digest = meta["sha256"] if meta else _hash_file(path)
+        with _lock:
+            if len(_file_hashes) >= _FILE_HASH_LIMIT:
+                _file_hashes.pop(next(iter(_file_hashes)))
+            _file_hashes[key] = digest
+    return digest
+
+
+def _script_hash(script_path: str) -> str:
+    key = (script_path, os.path.getmtime(script_path))
+    if key not in _script_hashes:
+        _script_hashes[key] = _hash_file(script_path)
+    return _script_hashes[key]
+
+
+def compute_cache_key(csv_path: str, job: Dict[str, Any], script_path: str) -> str:
+    """根据数据文件内容、影响分析产物的参数和R脚本版本计算缓存键"""
+    params = {
+        "target_forces": [float(v) for v in job["target_forces"]],
+        "tolerance_abs": [float(v) for v in job["tolerance_abs"]],
+        "tolerance_pct": [float(v) for v in job["tolerance_pct"]],
+        "charts": None if job.get("charts") is None else sorted(job["charts"]),
+        "profile": job.get("profile"),
+    }
+    payload = json.dumps({
+        "data": file_digest(csv_path),
+        "params": params,
+        "script": _script_hash(script_path),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _link_tree(source: Path, target: Path) -> int:
+    """将source目录下的文件硬链接到target（跨文件系统时复制），返回文件总大小"""
+    total_size = 0
+    for path in source.rglob('*'):
+        # 跳过缓存元数据和渲染中的临时文件
+        if not path.is_file() or path.name == ENTRY_FILE or path.name.startswith('.'):
+            continue
+        destination = target / path.relative_to(source)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            destination.unlink()
+        try:
+            os.link(path, destination)
+        except OSError:
+            shutil.copy2(path, destination)
+        total_size += path.stat().st_size
+    return total_size
+
+
+def _read_entry(entry_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(entry_dir / ENTRY_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_entry(entry_dir: Path, entry: Dict[str, Any]):
+    temp_file = entry_dir / f".{ENTRY_FILE}.{uuid.uuid4().hex}"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, entry_dir / ENTRY_FILE)
+
+
+def restore(cache_key: str, output_dir: Path) -> bool:
+    """缓存命中时将缓存的分析产物链接到output_dir并返回True，否则返回False"""
+    entry_dir = Path(settings.RESULT_CACHE_DIR) / cache_key
+    entry = _read_entry(entry_dir)
+    if entry is None or not (entry_dir / "analysis_results.json").exists():
+        with _lock:
+            _stats["misses"] += 1
+        return False
+
+    try:
+        _link_tree(entry_dir, output_dir)
+    except OSError as e:
+        logger.warning(f"恢复缓存的分析结果失败 ({cache_key[:12]}): {str(e)}")
+        with _lock:
+            _stats["misses"] += 1
+        return False
+
+    entry["last_used"] = time.time()
+    entry["hits"] = entry.get("hits", 0) + 1
+    _write_entry(entry_dir, entry)
+    with _lock:
+        _stats["hits"] += 1
+    logger.info(f"分析结果缓存命中: {cache_key[:12]} (来源任务 {entry.get('task_id')})")
+    return True
+
+
+def store(cache_key: str, output_dir: Path, task_id: str):
+    """将任务的分析产物保存为缓存条目，然后按磁盘占用淘汰旧条目"""
+    cache_dir = Path(settings.RESULT_CACHE_DIR)
+    entry_dir = cache_dir / cache_key
+    if entry_dir.exists():
+        return
+
+    # 先写入临时目录再重命名，避免其他任务读到不完整的条目
+    temp_dir = cache_dir / f".{cache_key}.{uuid.uuid4().hex}"
+    try:
+        size = _link_tree(output_dir, temp_dir)
+        now = time.time()
+        _write_entry(temp_dir, {
+            "key": cache_key,
+            "task_id": task_id,
+            "size": size,
+            "created_at": now,
+            "last_used": now,
+            "hits": 0,
+        })
+        os.rename(temp_dir, entry_dir)
+    except OSError as e:
+        logger.warning(f"保存分析结果缓存失败 ({cache_key[:12]}): {str(e)}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return
+
+    with _lock:
+        _stats["stores"] += 1
+    logger.info(f"分析结果已缓存: {cache_key[:12]} ({size / 1024 / 1024:.1f}MB)")
+    evict()
+
+
+def _list_entries() -> List[Tuple[Path, Dict[str, Any]]]:
+    cache_dir = Path(settings.RESULT_CACHE_DIR)
+    if not cache_dir.exists():
+        return []
+    entries = []
+    for entry_dir in cache_dir.iterdir():
+        if entry_dir.is_dir() and not entry_dir.name.startswith('.'):
+            entry = _read_entry(entry_dir)
+            if entry is not None:
+                entries.append((entry_dir, entry))
+    return entries
+
+
+def evict(max_bytes: Optional[int] = None):
+    """缓存总大小超过上限时，按最近使用时间从旧到新删除条目"""
+    if max_bytes is None:
+        max_bytes = settings.RESULT_CACHE_MAX_MB * 1024 * 1024
+
+    with _lock:
+        entries = sorted(_list_entries(), key=lambda item: item[1].get("last_used", 0))
+        total_size = sum(entry.get("size", 0) for _, entry in entries)
+        for entry_dir, entry in entries:
+            if total_size <= max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= entry.get("size", 0)
+            _stats["evictions"] += 1
+            logger.info(f"淘汰分析结果缓存: {entry_dir.name[:12]}")
+
+
+def clear() -> int:
+    """删除全部缓存条目，返回删除的条目数"""
+    with _lock:
+        entries = _list_entries()
+        for entry_dir, _ in entries:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+    return len(entries)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """返回缓存命中统计和磁盘占用"""
+    entries = _list_entries()
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0,
+        "entries": len(entries),
+        "size_mb": round(sum(entry.get("size", 0) for _, entry in entries) / 1024 / 1024, 1),
+        "max_size_mb": settings.RESULT_CACHE_MAX_MB,
+    }
@@ -0,0 +1,125 @@
+"""
+分析阶段进度 - 消费R脚本输出的阶段事件，换算为任务进度并记录各阶段耗时
+
+R端在分析开始时发送plan事件（统计阶段列表和要渲染的图表），之后对每个阶段和每个图表
+发送start/end事件。进度按已完成阶段数在 [start_progress, end_progress] 区间内线性换算，
+各阶段耗时保存为任务输出目录中的 stage_timings.json。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TIMINGS_FILE = "stage_timings.json"
+
+STAGE_LABELS = {
+    "load_data": "数据加载",
+    "quality_check": "数据质量检查",
+    "basic_statistics": "基础统计分析",
+    "trend_analysis": "趋势分析",
+    "time_series_analysis": "高级时间序列分析",
+    "spatial_clustering": "空间聚类",
+    "spatial_analysis": "空间分析",
+    "error_distribution": "误差分布分析",
+    "multidimensional_analysis": "多维分析",
+    "save_context": "保存绘图上下文",
+    "save_results": "保存分析结果",
+}
+
+
+def stage_label(stage: str) -> str:
+    if stage.startswith("chart:"):
+        return f"图表 {stage[len('chart:'):]}"
+    return STAGE_LABELS.get(stage, stage)
+
+
+class StageTracker:
+    """记录一次分析的阶段事件（可在读取R输出的线程中调用）"""
+
+    def __init__(self, on_progress: Optional[Callable[[int, str], None]] = None,
+                 start_progress: int = 10, end_progress: int = 95):
+        self.on_progress = on_progress
+        self.start_progress = start_progress
+        self.end_progress = end_progress
+        self.started_at = time.time()
+        self._planned: List[str] = []
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._completed = 0
+        self._progress = start_progress
+        self._lock = threading.Lock()
+
+    def handle(self, event: Dict[str, Any]):
+        """处理一条阶段事件"""
+        phase = event.get("phase")
+        with self._lock:
+            if phase == "plan":
+                self._planned = list(event.get("stages") or []) + [f"chart:{name}" for name in event.get("charts") or []]
+                return
+            stage = event.get("stage")
+            if not stage:
+                return
+            timestamp = float(event.get("time") or time.time())
+            if phase == "start":
+                self._stages[stage] = {"stage": stage, "label": stage_label(stage), "started_at": timestamp,
+                                       "ended_at": None, "seconds": None, "pid": event.get("pid")}
+                message = f"正在执行: {stage_label(stage)}"
+            elif phase == "end" and stage in self._stages and self._stages[stage]["ended_at"] is None:
+                record = self._stages[stage]
+                record["ended_at"] = timestamp
+                record["seconds"] = round(timestamp - record["started_at"], 3)
+                self._completed += 1
+                message = f"已完成: {stage_label(stage)}"
+            else:
+                return
+            if self._planned:
+                fraction = min(1.0, self._completed / len(self._planned))
+                self._progress = int(self.start_progress + (self.end_progress - self.start_progress) * fraction)
+            progress = self._progress
+
+        if self.on_progress is not None:
+            try:
+                self.on_progress(progress, message)
+            except Exception as e:
+                logger.warning(f"更新任务进度失败: {str(e)}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = sorted(self._stages.values(), key=lambda item: item["started_at"])
+            stages = [dict(item) for item in stages]
+        charts = [item for item in stages if item["stage"].startswith("chart:") and item["seconds"] is not None]
+        return {
+            "started_at": self.started_at,
+            "total_seconds": round(time.time() - self.started_at, 3),
+            "stages": stages,
+            "chart_seconds": round(sum(item["seconds"] for item in charts), 3),
+            "slowest": [item["stage"] for item in sorted(
+                (item for item in stages if item["seconds"] is not None),
+                key=lambda item: item["seconds"], reverse=True
+            )[:5]],
+        }
+
+    def save(self, output_dir: Path, **extra: Any):
+        """将阶段耗时写入 output_dir/stage_timings.json（先写临时文件再重命名）"""
+        data = {**self.to_dict(), **extra}
+        temp_file = Path(output_dir) / f".{TIMINGS_FILE}.{uuid.uuid4().hex}"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, Path(output_dir) / TIMINGS_FILE)
+        except OSError as e:
+            logger.warning(f"保存阶段耗时失败: {str(e)}")
+
+
+def load_timings(output_dir: Path) -> Optional[Dict[str, Any]]:
+    """读取任务的阶段耗时，不存在时返回None"""
+    try:
+        with open(Path(output_dir) / TIMINGS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
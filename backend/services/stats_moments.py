@@ -0,0 +1,33 @@
+"""
+可合并的样本矩 - 样本数、均值和二阶中心矩（Chan等人的并行算法）
+
+分块或分批计算的结果合并后与对完整数据计算一致，供上传数据概况的分块统计和增量追加分析共用。
+"""
+from typing import Any, Dict
+
+import numpy as np
+
+
+def moments(values: np.ndarray) -> Dict[str, float]:
+    """计算一组数值的样本数、均值和二阶中心矩"""
+    n = len(values)
+    if n == 0:
+        return {"n": 0, "mean": 0.0, "m2": 0.0}
+    mean = float(values.mean())
+    return {"n": n, "mean": mean, "m2": float(((values - mean) ** 2).sum())}
+
+
+def merge_moments(a: Dict[str, Any], b: Dict[str, Any]):
+    """将b的样本数、均值和二阶中心矩合并进a"""
+    n = a["n"] + b["n"]
+    if n == 0:
+        return
+    delta = b["mean"] - a["mean"]
+    a["m2"] += b["m2"] + delta ** 2 * a["n"] * b["n"] / n
+    a["mean"] += delta * b["n"] / n
+    a["n"] = n
+
+
+def sd(moments: Dict[str, Any]) -> float:
+    """样本标准差，样本数不足2时返回nan"""
+    return float(np.sqrt(moments["m2"] / (moments["n"] - 1))) if moments["n"] > 1 else float("nan")
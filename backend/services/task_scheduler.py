@@ -0,0 +1,191 @@
+"""
+分析任务调度器 - 有界并发、优先级通道和排队准入控制
+
+任务按预计开销分为两个通道：
+- fast: 只计算统计结果、只生成少量图表或数据文件较小的任务
+- normal: 其余（图表较多、数据量较大）的任务
+每个通道内按提交顺序（FIFO）执行。normal通道最多占用 (并发上限 - 1) 个执行槽，
+始终为fast通道保留一个槽，小任务不会被大任务长时间阻塞。
+fast任务优先出队，但normal通道有任务等待时，每连续执行 SCHEDULER_FAST_BURST 个fast任务
+或最早的normal任务排队超过 SCHEDULER_NORMAL_MAX_WAIT 秒，就先执行一个normal任务，避免持续的小任务饿死大任务。
+排队任务总数达到上限时拒绝新任务，并根据近期任务耗时估算建议的重试等待时间。
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from ..core.config import settings
+from ..models.schemas import AnalysisParams
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+NORMAL_LANE = "normal"
+
+
+class QueueFullError(Exception):
+    """排队任务已满，retry_after为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"分析任务队列已满，请在 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+@dataclass
+class ScheduledJob:
+    task_id: str
+    lane: str
+    run: Callable[[], Awaitable[Any]]
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+def classify_lane(csv_path: str, params: AnalysisParams, chart_selection: Optional[list]) -> str:
+    """根据图表数量和数据文件大小判断任务所属的通道"""
+    if params.stats_only or (chart_selection is not None and len(chart_selection) <= settings.SCHEDULER_FAST_MAX_CHARTS):
+        return FAST_LANE
+    try:
+        if os.path.getsize(csv_path) <= settings.SCHEDULER_FAST_MAX_FILE_MB * 1024 * 1024:
+            return FAST_LANE
+    except OSError:
+        pass
+    return NORMAL_LANE
+
+
+class TaskScheduler:
+    """进程内的分析任务调度器（在事件循环中运行）"""
+
+    def __init__(self, max_running: int, max_queued: int):
+        self.max_running = max(1, max_running)
+        self.max_queued = max_queued
+        self._queues: Dict[str, Deque[ScheduledJob]] = {FAST_LANE: deque(), NORMAL_LANE: deque()}
+        self._running: Dict[str, str] = {}  # task_id -> lane
+        # normal任务等待期间连续出队的fast任务数
+        self._fast_streak = 0
+        # 近期任务耗时的指数移动平均，用于估算排队等待时间
+        self._avg_duration = float(settings.SCHEDULER_DEFAULT_JOB_SECONDS)
+        self._completed = 0
+        self._rejected = 0
+        self._deduplicated = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _normal_slots(self) -> int:
+        # 并发上限大于1时为fast通道保留一个执行槽
+        return self.max_running - 1 if self.max_running > 1 else 1
+
+    def estimate_wait(self, position: int) -> int:
+        """估算排在position位置的任务开始执行前需要等待的秒数"""
+        return max(1, int(self._avg_duration * (position // self.max_running + 1)))
+
+    def submit(self, task_id: str, lane: str, run: Callable[[], Awaitable[Any]]) -> int:
+        """提交任务，返回排队位置（0表示立即执行）；队列已满时抛出QueueFullError"""
+        if self.queued >= self.max_queued:
+            self._rejected += 1
+            raise QueueFullError(self.estimate_wait(self.queued))
+
+        self._queues[lane].append(ScheduledJob(task_id, lane, run))
+        logger.info(f"任务 {task_id} 进入 {lane} 队列，当前排队 {self.queued} 个")
+        self._dispatch()
+        return self.position(task_id) or 0
+
+    def position(self, task_id: str) -> Optional[int]:
+        """返回任务的排队位置（从1开始），任务不在队列中时返回None"""
+        fast_ids = [job.task_id for job in self._queues[FAST_LANE]]
+        if task_id in fast_ids:
+            return fast_ids.index(task_id) + 1
+        normal_ids = [job.task_id for job in self._queues[NORMAL_LANE]]
+        if task_id in normal_ids:
+            return len(fast_ids) + normal_ids.index(task_id) + 1
+        return None
+
+    def record_deduplicated(self):
+        """记录一次因与执行中任务相同而未重复提交的请求"""
+        self._deduplicated += 1
+
+    def is_running(self, task_id: str) -> bool:
+        return task_id in self._running
+
+    def cancel(self, task_id: str) -> bool:
+        """从队列中移除尚未开始执行的任务，返回是否移除成功"""
+        for queue in self._queues.values():
+            for job in queue:
+                if job.task_id == task_id:
+                    queue.remove(job)
+                    return True
+        return False
+
+    def _normal_overdue(self) -> bool:
+        """normal通道是否已轮到执行（连续执行的fast任务过多或最早的normal任务等待过久）"""
+        if self._fast_streak >= settings.SCHEDULER_FAST_BURST:
+            return True
+        waited = time.monotonic() - self._queues[NORMAL_LANE][0].submitted_at
+        return waited >= settings.SCHEDULER_NORMAL_MAX_WAIT
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        fast_queue, normal_queue = self._queues[FAST_LANE], self._queues[NORMAL_LANE]
+        normal_running = sum(1 for lane in self._running.values() if lane == NORMAL_LANE)
+        normal_ready = bool(normal_queue) and normal_running < self._normal_slots()
+        if normal_ready and (not fast_queue or self._normal_overdue()):
+            self._fast_streak = 0
+            return normal_queue.popleft()
+        if fast_queue:
+            if normal_queue:
+                self._fast_streak += 1
+            return fast_queue.popleft()
+        return None
+
+    def _dispatch(self):
+        while len(self._running) < self.max_running:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running[job.task_id] = job.lane
+            asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: ScheduledJob):
+        started_at = time.monotonic()
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error(f"调度任务 {job.task_id} 执行异常: {str(e)}", exc_info=True)
+        finally:
+            duration = time.monotonic() - started_at
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._completed += 1
+            self._running.pop(job.task_id, None)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        free_slots = self.max_running - len(self._running)
+        return {
+            "max_running": self.max_running,
+            "running": len(self._running),
+            "free_slots": free_slots,
+            "queued": {lane: len(queue) for lane, queue in self._queues.items()},
+            "max_queued": self.max_queued,
+            "queue_capacity": self.max_queued - self.queued,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "deduplicated": self._deduplicated,
+            "avg_job_seconds": round(self._avg_duration, 1),
+        }
+
+
+_scheduler: Optional[TaskScheduler] = None
+
+
+def get_scheduler() -> TaskScheduler:
+    """获取全局任务调度器（首次调用时创建）"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TaskScheduler(
+            max_running=settings.ANALYSIS_MAX_CONCURRENCY,
+            max_queued=settings.SCHEDULER_MAX_QUEUED,
+        )
+    return _scheduler
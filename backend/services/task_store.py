@@ -0,0 +1,465 @@
+"""
+任务存储 - 保存任务状态、进度和结果位置，支持多个uvicorn工作进程共享和服务重启后恢复
+
+默认使用SQLite（WAL模式）数据库，同一主机上的多个进程可以并发读写；
+也提供进程内的内存实现（TASK_STORE_BACKEND = "memory"），行为与原来的模块级字典一致。
+
+状态变更通过 transition() 以比较并交换的方式原子完成，只有当前状态符合预期时才会更新。
+每个进程以 owner_id 标识并定期写入心跳；心跳超时的进程遗留的 PENDING / RUNNING 任务
+会被其他存活进程（或重启后的进程）通过 claim_orphaned() 原子地接管并重新排队。
+
+多节点部署时（ANALYSIS_DISPATCH = "queue"），任务以无归属（owner为空）的状态写入共享队列，
+由各节点的工作进程（run_worker.py）通过 lease_next() 原子地领取。工作进程的心跳即其持有任务的租约，
+心跳超时后任务退回共享队列重试，执行中断次数达到 TASK_MAX_ATTEMPTS 后标记为失败。
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..core.config import settings
+from ..models.schemas import TaskInfo, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# 当前进程的标识（主机名:进程号:随机后缀），用于标记任务归属和心跳
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# TaskInfo中保存到存储的字段
+TASK_FIELDS = [
+    "status", "created_at", "started_at", "completed_at", "progress",
+    "message", "error", "queue_position", "lane", "limit_exceeded",
+]
+# 任务执行所需的附加字段
+JOB_FIELDS = ["csv_path", "params", "result_path", "owner", "attempts", "dedup_key"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    queue_position INTEGER,
+    lane TEXT,
+    limit_exceeded TEXT,
+    csv_path TEXT,
+    params TEXT,
+    result_path TEXT,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dedup_key TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE TABLE IF NOT EXISTS owners (
+    owner_id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+# 后续版本新增的列，打开旧数据库时自动补齐
+_ADDED_COLUMNS = {
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "limit_exceeded": "TEXT",
+    "dedup_key": "TEXT",
+}
+
+
+def _serialize(field: str, value: Any) -> Any:
+    if isinstance(value, TaskStatus):
+        return value.value
+    if isinstance(value, datetime):
+        # 固定精确到微秒，时间文本的长度一致，可以直接按文本排序
+        return value.isoformat(timespec="microseconds")
+    if field == "params" and value is not None:
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class TaskQueueFull(Exception):
+    """排队中的任务数已达到创建任务时指定的上限"""
+
+
+def _check_fields(fields: Iterable[str]):
+    unknown = set(fields) - set(TASK_FIELDS) - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的任务字段: {', '.join(sorted(unknown))}")
+
+
+class TaskStore(ABC):
+    """任务存储接口"""
+
+    @abstractmethod
+    def create(self, task: TaskInfo, csv_path: str, params: Dict[str, Any], owner: Optional[str],
+               dedup_key: Optional[str] = None, max_pending: Optional[int] = None) -> str:
+        """保存新任务并返回其ID
+
+        指定dedup_key且已有相同dedup_key的未结束任务时不创建新任务，原子地返回已有任务的ID。
+        指定max_pending且PENDING任务数已达到该值时抛出TaskQueueFull；检查和写入在同一事务中完成，
+        并发提交不会超出上限。
+        """
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[TaskInfo]:
+        """获取任务信息，不存在时返回None"""
+
+    @abstractmethod
+    def get_many(self, task_ids: List[str]) -> Dict[str, TaskInfo]:
+        """批量获取任务信息，返回 task_id -> TaskInfo（不存在的任务不包含在结果中）"""
+
+    @abstractmethod
+    def get_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务执行所需的信息（csv_path、params、result_path、owner）"""
+
+    @abstractmethod
+    def update(self, task_id: str, **fields: Any) -> bool:
+        """更新任务字段，任务不存在时返回False"""
+
+    @abstractmethod
+    def transition(self, task_id: str, from_statuses: List[TaskStatus], to_status: TaskStatus, **fields: Any) -> bool:
+        """当前状态属于from_statuses时原子地切换到to_status并更新字段，否则不做修改并返回False"""
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        """删除任务"""
+
+    @abstractmethod
+    def list_tasks(self, statuses: Optional[List[TaskStatus]] = None) -> List[TaskInfo]:
+        """列出任务（可按状态过滤）"""
+
+    @abstractmethod
+    def count(self, statuses: List[TaskStatus]) -> int:
+        """统计处于指定状态的任务数"""
+
+    @abstractmethod
+    def heartbeat(self, owner: str):
+        """记录进程心跳"""
+
+    @abstractmethod
+    def lease_next(self, owner: str) -> Optional[Dict[str, Any]]:
+        """从共享队列中领取最早提交的无归属任务，没有可领取的任务时返回None"""
+
+    @abstractmethod
+    def claim_orphaned(self, owner: Optional[str], stale_after: float, max_attempts: int) -> List[Dict[str, Any]]:
+        """接管心跳超时的进程遗留的未完成任务，将其重置为PENDING并返回任务信息
+
+        owner为None时任务退回共享队列；执行中断的任务计入重试次数，达到max_attempts时标记为失败。
+        返回的任务信息中previous_owner为原归属进程。
+        """
+
+
+class SQLiteTaskStore(TaskStore):
+    """基于SQLite（WAL模式）的任务存储，每个线程使用独立的连接"""
+
+    def __init__(self, path: str, wal: bool = True):
+        self.path = path
+        self.wal = wal
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        # 兼容旧版本数据库
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # WAL依赖共享内存，数据库位于网络文件系统上时使用默认的回滚日志
+            conn.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE 立即获取写锁，保证读取-判断-更新过程的原子性
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _to_task(row: sqlite3.Row) -> TaskInfo:
+        return TaskInfo(task_id=row["task_id"], **{field: row[field] for field in TASK_FIELDS if row[field] is not None})
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "task_id": row["task_id"],
+            "csv_path": row["csv_path"],
+            "params": json.loads(row["params"]) if row["params"] else None,
+            "result_path": row["result_path"],
+            "owner": row["owner"],
+            "attempts": row["attempts"],
+            "dedup_key": row["dedup_key"],
+        }
+
+    def create(self, task: TaskInfo, csv_path: str, params: Dict[str, Any], owner: Optional[str],
+               dedup_key: Optional[str] = None, max_pending: Optional[int] = None) -> str:
+        values = {field: _serialize(field, getattr(task, field)) for field in TASK_FIELDS}
+        values.update(csv_path=csv_path, params=_serialize("params", params), owner=owner, dedup_key=dedup_key)
+        columns = ["task_id"] + list(values) + ["updated_at"]
+        with self._transaction() as conn:
+            if dedup_key is not None:
+                row = conn.execute(
+                    "SELECT task_id FROM tasks WHERE dedup_key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                    (dedup_key, TaskStatus.PENDING.value, TaskStatus.RUNNING.value)
+                ).fetchone()
+                if row is not None:
+                    return row["task_id"]
+            if max_pending is not None and self._count(conn, [TaskStatus.PENDING]) >= max_pending:
+                raise TaskQueueFull(f"排队中的任务已达到上限 {max_pending}")
+            conn.execute(
+                f"INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [task.task_id] + list(values.values()) + [time.time()]
+            )
+        return task.task_id
+
+    def get(self, task_id: str) -> Optional[TaskInfo]:
+        row = self._connection().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_task(row) if row else None
+
+    def get_many(self, task_ids: List[str]) -> Dict[str, TaskInfo]:
+        if not task_ids:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT * FROM tasks WHERE task_id IN ({', '.join('?' * len(task_ids))})", list(task_ids)
+        ).fetchall()
+        return {row["task_id"]: self._to_task(row) for row in rows}
+
+    def get_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def _update(self, conn: sqlite3.Connection, task_id: str, fields: Dict[str, Any], where: str = "", args: tuple = ()) -> bool:
+        _check_fields(fields)
+        assignments = [f"{field} = ?" for field in fields] + ["updated_at = ?"]
+        values = [_serialize(field, value) for field, value in fields.items()] + [time.time()]
+        cursor = conn.execute(
+            f"UPDATE tasks SET {', '.join(assignments)} WHERE task_id = ?{where}",
+            values + [task_id] + list(args)
+        )
+        return cursor.rowcount > 0
+
+    def update(self, task_id: str, **fields: Any) -> bool:
+        with self._transaction() as conn:
+            return self._update(conn, task_id, fields)
+
+    def transition(self, task_id: str, from_statuses: List[TaskStatus], to_status: TaskStatus, **fields: Any) -> bool:
+        placeholders = ", ".join("?" * len(from_statuses))
+        with self._transaction() as conn:
+            return self._update(
+                conn, task_id, {"status": to_status, **fields},
+                where=f" AND status IN ({placeholders})",
+                args=tuple(status.value for status in from_statuses)
+            )
+
+    def delete(self, task_id: str) -> bool:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,)).rowcount > 0
+
+    def list_tasks(self, statuses: Optional[List[TaskStatus]] = None) -> List[TaskInfo]:
+        if statuses:
+            rows = self._connection().execute(
+                f"SELECT * FROM tasks WHERE status IN ({', '.join('?' * len(statuses))}) ORDER BY created_at",
+                [status.value for status in statuses]
+            ).fetchall()
+        else:
+            rows = self._connection().execute("SELECT * FROM tasks ORDER BY created_at").fetchall()
+        return [self._to_task(row) for row in rows]
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, statuses: List[TaskStatus]) -> int:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM tasks WHERE status IN ({', '.join('?' * len(statuses))})",
+            [status.value for status in statuses]
+        ).fetchone()[0]
+
+    def count(self, statuses: List[TaskStatus]) -> int:
+        return self._count(self._connection(), statuses)
+
+    def heartbeat(self, owner: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO owners (owner_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(owner_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (owner, time.time())
+            )
+
+    def lease_next(self, owner: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = ? AND owner IS NULL ORDER BY created_at LIMIT 1",
+                (TaskStatus.PENDING.value,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._update(conn, row["task_id"], {"owner": owner})
+        job = self._to_job(row)
+        job["owner"] = owner
+        return job
+
+    def claim_orphaned(self, owner: Optional[str], stale_after: float, max_attempts: int) -> List[Dict[str, Any]]:
+        unfinished = (TaskStatus.PENDING.value, TaskStatus.RUNNING.value)
+        claimed = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE status IN (?, ?) AND owner IS NOT NULL AND owner NOT IN "
+                "(SELECT owner_id FROM owners WHERE heartbeat_at >= ?)",
+                unfinished + (time.time() - stale_after,)
+            ).fetchall()
+            for row in rows:
+                # 执行中断（RUNNING状态）的任务计入重试次数
+                attempts = row["attempts"] + (1 if row["status"] == TaskStatus.RUNNING.value else 0)
+                if attempts >= max_attempts:
+                    self._update(conn, row["task_id"], {
+                        "status": TaskStatus.FAILED, "owner": None, "attempts": attempts,
+                        "error": f"执行任务的进程异常退出 {attempts} 次",
+                        "message": "任务多次执行中断，已停止重试",
+                    })
+                    continue
+                self._update(conn, row["task_id"], {
+                    "status": TaskStatus.PENDING, "owner": owner, "attempts": attempts,
+                    "progress": 0, "started_at": None, "queue_position": None,
+                    "message": "执行进程已退出，任务已重新排队",
+                })
+                job = self._to_job(row)
+                job.update(owner=owner, attempts=attempts, previous_owner=row["owner"])
+                claimed.append(job)
+            # 清理长时间没有心跳的进程记录
+            conn.execute("DELETE FROM owners WHERE heartbeat_at < ?", (time.time() - stale_after * 10,))
+        return claimed
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内的任务存储（不支持多进程共享和重启恢复）"""
+
+    def __init__(self):
+        self._tasks: Dict[str, TaskInfo] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, task: TaskInfo, csv_path: str, params: Dict[str, Any], owner: Optional[str],
+               dedup_key: Optional[str] = None, max_pending: Optional[int] = None) -> str:
+        with self._lock:
+            if dedup_key is not None:
+                for task_id, job in self._jobs.items():
+                    if job["dedup_key"] == dedup_key and self._tasks[task_id].status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                        return task_id
+            if max_pending is not None and self._count([TaskStatus.PENDING]) >= max_pending:
+                raise TaskQueueFull(f"排队中的任务已达到上限 {max_pending}")
+            self._tasks[task.task_id] = task.model_copy()
+            self._jobs[task.task_id] = {
+                "task_id": task.task_id, "csv_path": csv_path, "params": params,
+                "result_path": None, "owner": owner, "attempts": 0, "dedup_key": dedup_key,
+            }
+            return task.task_id
+
+    def get(self, task_id: str) -> Optional[TaskInfo]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return task.model_copy() if task else None
+
+    def get_many(self, task_ids: List[str]) -> Dict[str, TaskInfo]:
+        with self._lock:
+            return {task_id: self._tasks[task_id].model_copy() for task_id in task_ids if task_id in self._tasks}
+
+    def get_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(task_id)
+            return dict(job) if job else None
+
+    def _apply(self, task_id: str, fields: Dict[str, Any]):
+        _check_fields(fields)
+        for field, value in fields.items():
+            if field in JOB_FIELDS:
+                self._jobs[task_id][field] = value
+            else:
+                setattr(self._tasks[task_id], field, value)
+
+    def update(self, task_id: str, **fields: Any) -> bool:
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._apply(task_id, fields)
+            return True
+
+    def transition(self, task_id: str, from_statuses: List[TaskStatus], to_status: TaskStatus, **fields: Any) -> bool:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task.status not in from_statuses:
+                return False
+            self._apply(task_id, {"status": to_status, **fields})
+            return True
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            self._jobs.pop(task_id, None)
+            return self._tasks.pop(task_id, None) is not None
+
+    def list_tasks(self, statuses: Optional[List[TaskStatus]] = None) -> List[TaskInfo]:
+        with self._lock:
+            return [task.model_copy() for task in self._tasks.values() if not statuses or task.status in statuses]
+
+    def _count(self, statuses: List[TaskStatus]) -> int:
+        return sum(1 for task in self._tasks.values() if task.status in statuses)
+
+    def count(self, statuses: List[TaskStatus]) -> int:
+        with self._lock:
+            return self._count(statuses)
+
+    def heartbeat(self, owner: str):
+        pass
+
+    def lease_next(self, owner: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pending = [task for task in self._tasks.values()
+                       if task.status == TaskStatus.PENDING and self._jobs[task.task_id]["owner"] is None]
+            if not pending:
+                return None
+            task = min(pending, key=lambda item: item.created_at)
+            self._jobs[task.task_id]["owner"] = owner
+            return dict(self._jobs[task.task_id])
+
+    def claim_orphaned(self, owner: Optional[str], stale_after: float, max_attempts: int) -> List[Dict[str, Any]]:
+        # 内存存储随进程退出而丢失，不存在遗留任务
+        return []
+
+
+_store: Optional[TaskStore] = None
+_store_lock = threading.Lock()
+
+
+def get_task_store() -> TaskStore:
+    """获取全局任务存储（根据 TASK_STORE_BACKEND 创建）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.TASK_STORE_BACKEND == "memory":
+                _store = MemoryTaskStore()
+            else:
+                _store = SQLiteTaskStore(settings.TASK_STORE_PATH, wal=settings.TASK_STORE_WAL)
+                logger.info(f"任务存储: SQLite {settings.TASK_STORE_PATH}")
+        return _store
@@ -0,0 +1,331 @@
+"""
+上传文件存储 - 分块流式写入磁盘，并在同一遍写入中计算内容哈希和数据行数
+
+上传内容按 UPLOAD_CHUNK_SIZE 分块读取并写入临时文件，超过 MAX_FILE_SIZE 时立即中止，
+不会把整个文件读入内存。写入完成后重命名为正式文件，并在旁边保存 <file_id>.meta.json：
+- sha256: 文件内容的SHA-256哈希（结果缓存和任务去重直接使用，不再重新读取文件）
+- size / rows: 文件字节数和数据行数（不含表头）
+- mtime_ns: 写入完成时文件的修改时间，文件之后被修改时元数据自动失效
+
+断点续传上传: 客户端先创建上传会话，再按编号并发上传各分块（每个分块单独保存为文件，
+可重复上传覆盖），随时查询已收到的分块范围，全部收到后由服务端按顺序合并为
+UPLOAD_DIR 中的正常上传文件并校验大小、哈希和CSV表头。会话保存在 UPLOAD_DIR/.resumable 下，
+多节点共享 UPLOAD_DIR 时任意节点都可以接收分块。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+META_SUFFIX = ".meta.json"
+
+
+class UploadTooLarge(Exception):
+    """上传内容超过大小限制"""
+
+
+class UploadHasher:
+    """在写入过程中累计文件的大小、SHA-256哈希和行数"""
+
+    def __init__(self, max_size: int = 0):
+        self.max_size = max_size
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._newlines = 0
+        self._last_byte = b""
+
+    def update(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_size and self.size > self.max_size:
+            raise UploadTooLarge(f"文件大小超过限制 {self.max_size // (1024 * 1024)}MB")
+        self._sha256.update(chunk)
+        self._newlines += chunk.count(b"\n")
+        if chunk:
+            self._last_byte = chunk[-1:]
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def rows(self) -> int:
+        # 最后一行没有换行符时也计为一行，减去表头
+        lines = self._newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        return max(0, lines - 1)
+
+
+def meta_path(file_path: Path) -> Path:
+    return Path(file_path).with_suffix(META_SUFFIX)
+
+
+def write_meta(file_path: Path, hasher: UploadHasher, **extra: Any) -> Dict[str, Any]:
+    """保存上传文件的元数据（先写临时文件再重命名）"""
+    stat = os.stat(file_path)
+    meta = {
+        "sha256": hasher.sha256,
+        "size": stat.st_size,
+        "rows": hasher.rows,
+        "mtime_ns": stat.st_mtime_ns,
+        **extra,
+    }
+    target = meta_path(file_path)
+    temp_file = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(temp_file, target)
+    return meta
+
+
+def load_meta(file_path: Path) -> Optional[Dict[str, Any]]:
+    """读取上传文件的元数据；不存在或文件在保存元数据后被修改过时返回None"""
+    try:
+        with open(meta_path(file_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if meta.get("size") != stat.st_size or meta.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return meta
+
+
+def remove_meta(file_path: Path):
+    try:
+        meta_path(file_path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_file(file: UploadFile, file_path: Path) -> UploadHasher:
+    """将上传内容分块写入file_path，返回记录了大小、哈希和行数的UploadHasher；超过大小限制时抛出UploadTooLarge"""
+    file_path = Path(file_path)
+    hasher = UploadHasher(settings.MAX_FILE_SIZE)
+    temp_file = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.part")
+    try:
+        async with aiofiles.open(temp_file, 'wb') as f:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                await f.write(chunk)
+        os.replace(temp_file, file_path)
+    except BaseException:
+        try:
+            temp_file.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    return hasher
+
+
+async def save_upload(file: UploadFile, file_path: Path) -> Dict[str, Any]:
+    """将上传内容分块写入file_path并保存元数据；超过大小限制时抛出UploadTooLarge"""
+    file_path = Path(file_path)
+    hasher = await stream_to_file(file, file_path)
+    meta = write_meta(file_path, hasher, original_filename=file.filename)
+    logger.info(f"文件已保存: {file_path.name} ({meta['size']} 字节, {meta['rows']} 行)")
+    return meta
+
+
+# ---------------------------------------------------------------------------
+# 断点续传上传
+# ---------------------------------------------------------------------------
+
+SESSION_FILE = "session.json"
+
+
+def _sessions_dir() -> Path:
+    return Path(settings.UPLOAD_DIR) / ".resumable"
+
+
+def _session_dir(upload_id: str) -> Path:
+    # 上传ID只接受UUID，避免路径穿越
+    try:
+        upload_id = str(uuid.UUID(upload_id))
+    except ValueError:
+        raise FileNotFoundError(f"上传会话 {upload_id} 不存在")
+    return _sessions_dir() / upload_id
+
+
+def create_session(filename: str, total_size: int, chunk_size: Optional[int] = None,
+                   sha256: Optional[str] = None) -> Dict[str, Any]:
+    """创建断点续传上传会话；参数无效时抛出ValueError"""
+    if not filename.endswith('.csv'):
+        raise ValueError("只支持CSV文件格式")
+    if total_size <= 0:
+        raise ValueError("文件大小必须大于0")
+    if total_size > settings.MAX_FILE_SIZE:
+        raise ValueError(f"文件大小超过限制 {settings.MAX_FILE_SIZE // (1024 * 1024)}MB")
+    chunk_size = chunk_size or settings.RESUMABLE_CHUNK_SIZE
+    if not 0 < chunk_size <= settings.RESUMABLE_MAX_CHUNK_SIZE:
+        raise ValueError(f"分块大小必须在 1 到 {settings.RESUMABLE_MAX_CHUNK_SIZE} 字节之间")
+
+    cleanup_stale_sessions()
+    session = {
+        "upload_id": str(uuid.uuid4()),
+        "filename": filename,
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "total_chunks": (total_size + chunk_size - 1) // chunk_size,
+        "sha256": sha256.lower() if sha256 else None,
+        "created_at": time.time(),
+    }
+    session_dir = _sessions_dir() / session["upload_id"]
+    session_dir.mkdir(parents=True)
+    with open(session_dir / SESSION_FILE, 'w', encoding='utf-8') as f:
+        json.dump(session, f, ensure_ascii=False)
+    return session
+
+
+def load_session(upload_id: str) -> Dict[str, Any]:
+    """读取上传会话；不存在时抛出FileNotFoundError"""
+    try:
+        with open(_session_dir(upload_id) / SESSION_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        raise FileNotFoundError(f"上传会话 {upload_id} 不存在")
+
+
+def _chunk_path(session: Dict[str, Any], index: int) -> Path:
+    return _sessions_dir() / session["upload_id"] / f"{index:06d}.chunk"
+
+
+def expected_chunk_size(session: Dict[str, Any], index: int) -> int:
+    if not 0 <= index < session["total_chunks"]:
+        raise ValueError(f"分块编号超出范围 0-{session['total_chunks'] - 1}")
+    if index == session["total_chunks"] - 1:
+        return session["total_size"] - session["chunk_size"] * index
+    return session["chunk_size"]
+
+
+async def write_chunk(session: Dict[str, Any], index: int, body: AsyncIterator[bytes]) -> int:
+    """保存一个分块（先写临时文件再重命名，同一分块重复上传时覆盖）；大小不符时抛出ValueError"""
+    expected = expected_chunk_size(session, index)
+    target = _chunk_path(session, index)
+    temp_file = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    size = 0
+    try:
+        async with aiofiles.open(temp_file, 'wb') as f:
+            async for data in body:
+                size += len(data)
+                if size > expected:
+                    raise ValueError(f"分块 {index} 大小超过预期的 {expected} 字节")
+                await f.write(data)
+        if size != expected:
+            raise ValueError(f"分块 {index} 大小为 {size} 字节，预期 {expected} 字节")
+        os.replace(temp_file, target)
+    except BaseException:
+        try:
+            temp_file.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    return size
+
+
+def received_chunks(session: Dict[str, Any]) -> List[int]:
+    session_dir = _sessions_dir() / session["upload_id"]
+    return sorted(int(path.stem) for path in session_dir.glob("*.chunk"))
+
+
+def received_ranges(chunks: List[int]) -> List[List[int]]:
+    """将已收到的分块编号合并为闭区间列表，如 [0, 1, 2, 5] -> [[0, 2], [5, 5]]"""
+    ranges: List[List[int]] = []
+    for index in chunks:
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ranges
+
+
+def session_status(session: Dict[str, Any]) -> Dict[str, Any]:
+    chunks = received_chunks(session)
+    received_bytes = sum(expected_chunk_size(session, index) for index in chunks)
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "total_size": session["total_size"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received": received_ranges(chunks),
+        "received_bytes": received_bytes,
+        "missing_chunks": session["total_chunks"] - len(chunks),
+        "complete": len(chunks) == session["total_chunks"],
+    }
+
+
+def assemble(session: Dict[str, Any], file_path: Path) -> Dict[str, Any]:
+    """按顺序合并全部分块为file_path，校验大小、哈希和CSV表头，保存元数据并删除会话
+
+    校验失败时抛出ValueError并保留会话，客户端可重新上传分块后再次合并。
+    """
+    missing = session["total_chunks"] - len(received_chunks(session))
+    if missing:
+        raise ValueError(f"还有 {missing} 个分块未上传")
+
+    file_path = Path(file_path)
+    hasher = UploadHasher(settings.MAX_FILE_SIZE)
+    temp_file = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.part")
+    header = b""
+    try:
+        with open(temp_file, 'wb') as out:
+            for index in range(session["total_chunks"]):
+                with open(_chunk_path(session, index), 'rb') as chunk_file:
+                    for data in iter(lambda: chunk_file.read(settings.UPLOAD_CHUNK_SIZE), b''):
+                        hasher.update(data)
+                        if len(header) < 4096:
+                            header += data[:4096]
+                        out.write(data)
+        if hasher.size != session["total_size"]:
+            raise ValueError(f"合并后的文件大小为 {hasher.size} 字节，预期 {session['total_size']} 字节")
+        if session["sha256"] and hasher.sha256 != session["sha256"]:
+            raise ValueError("合并后的文件哈希与上传时声明的不一致，请重新上传")
+        first_line = header.split(b"\n", 1)[0].decode('utf-8-sig', errors='replace')
+        if "," not in first_line:
+            raise ValueError("文件不是有效的CSV格式：缺少表头")
+        os.replace(temp_file, file_path)
+    except BaseException:
+        try:
+            temp_file.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+
+    meta = write_meta(file_path, hasher, original_filename=session["filename"])
+    discard_session(session["upload_id"])
+    logger.info(f"断点续传上传完成: {file_path.name} ({meta['size']} 字节, {session['total_chunks']} 个分块)")
+    return meta
+
+
+def discard_session(upload_id: str):
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
+
+
+def cleanup_stale_sessions():
+    """删除超过 RESUMABLE_UPLOAD_TTL 秒未更新的上传会话"""
+    sessions_dir = _sessions_dir()
+    if not sessions_dir.exists():
+        return
+    cutoff = time.time() - settings.RESUMABLE_UPLOAD_TTL
+    for session_dir in sessions_dir.iterdir():
+        try:
+            last_update = max((path.stat().st_mtime for path in session_dir.iterdir()), default=0)
+        except OSError:
+            continue
+        if last_update < cutoff:
+            logger.info(f"清理过期的上传会话: {session_dir.name}")
+            shutil.rmtree(session_dir, ignore_errors=True)
@@ -0,0 +1,87 @@
+"""
+测试数据帧缓存：同一文件只解析一次、文件修改后失效、超出内存上限时淘汰最久未使用的条目
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from backend.core.config import settings
+from backend.services import columnar_store, frame_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    frame_cache.clear()
+    yield
+    frame_cache.clear()
+
+
+def _write_csv(path, rows):
+    pd.DataFrame({
+        "序号": range(rows), "X": 0, "Y": 0, "Z": 0, "力值": [f"{i % 50}N" for i in range(rows)],
+    }).to_csv(path, index=False)
+
+
+def _counting_loader():
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return pd.read_csv(path)
+    return loader, calls
+
+
+def test_repeated_reads_parse_once_until_file_changes(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    _write_csv(csv_path, 10)
+    loader, calls = _counting_loader()
+
+    frame_cache.get_frame(csv_path, loader)
+    frame_cache.get_frame(csv_path, loader)
+    assert len(calls) == 1
+
+    _write_csv(csv_path, 20)
+    os.utime(csv_path, ns=(0, os.stat(csv_path).st_mtime_ns + 1))
+    assert len(frame_cache.get_frame(csv_path, loader)) == 20
+    assert len(calls) == 2
+
+    frame_cache.invalidate(csv_path)
+    frame_cache.get_frame(csv_path, loader)
+    assert len(calls) == 3
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path, monkeypatch):
+    paths = [tmp_path / f"data_{i}.csv" for i in range(3)]
+    for path in paths:
+        _write_csv(path, 20000)
+    loader, calls = _counting_loader()
+    frame_size = pd.read_csv(paths[0]).memory_usage(deep=True).sum()
+    monkeypatch.setattr(settings, "FRAME_CACHE_MAX_MB", 2.5 * frame_size / 1024 / 1024)
+
+    frame_cache.get_frame(paths[0], loader)
+    frame_cache.get_frame(paths[1], loader)
+    frame_cache.get_frame(paths[0], loader)
+    frame_cache.get_frame(paths[2], loader)
+
+    stats = frame_cache.get_cache_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    # data_1 最久未使用，已被淘汰
+    frame_cache.get_frame(paths[0], loader)
+    assert len(calls) == 3
+    frame_cache.get_frame(paths[1], loader)
+    assert len(calls) == 4
+
+
+def test_read_pressure_frame_returns_independent_copies(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    _write_csv(csv_path, 5)
+
+    first = columnar_store.read_pressure_frame(csv_path, ["force"])
+    first["force"] = -1.0
+    second = columnar_store.read_pressure_frame(csv_path)
+
+    assert list(second.columns) == columnar_store.PRESSURE_COLUMNS
+    assert second["force"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert frame_cache.get_cache_stats()["hits"] >= 1
@@ -0,0 +1,78 @@
+"""
+测试增量追加分析的可合并统计：分批合并的结果应与对完整数据重新计算一致
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from backend.core.config import settings
+from backend.services import incremental_analysis as ia
+from backend.services import stats_moments
+
+
+def test_merge_moments_matches_full_recompute():
+    rng = np.random.default_rng(1)
+    values = rng.normal(50, 3, 1000)
+    merged = stats_moments.moments(np.array([]))
+    for part in np.split(values, [0, 1, 7, 300, 301, 999]):
+        stats_moments.merge_moments(merged, stats_moments.moments(part))
+
+    assert merged["n"] == len(values)
+    assert np.isclose(merged["mean"], values.mean())
+    assert np.isclose(stats_moments.sd(merged), values.std(ddof=1))
+
+
+def test_target_state_batches_match_single_batch():
+    rng = np.random.default_rng(2)
+    params = {"target_forces": [5.0], "tolerance_abs": [0.5], "tolerance_pct": [5.0]}
+    data = pd.DataFrame({
+        "sequence": np.arange(200, dtype=float),
+        "x": 0.0, "y": 0.0, "z": 0.0,
+        "force": rng.normal(5, 0.6, 200),
+    })
+    rows = ia._assign_targets(data, params)
+
+    single = ia._empty_target_state()
+    ia._update_target_state(single, rows, 5.0)
+    batched = ia._empty_target_state()
+    for start in range(0, 200, 37):
+        ia._update_target_state(batched, rows.iloc[start:start + 37], 5.0)
+
+    for key in ["n", "ok", "ok_abs", "ok_pct"]:
+        assert batched[key] == single[key]
+    for key in ["mean", "m2", "sum_deviation_pct", "max_abs_deviation", "cusum_plus", "cusum_minus", "ewma"]:
+        assert np.isclose(batched[key], single[key])
+
+
+def test_append_rows_updates_overall_statistics(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHARTS_DIR", str(tmp_path))
+    task_dir = tmp_path / "task"
+    task_dir.mkdir()
+    rng = np.random.default_rng(3)
+    force = np.round(rng.normal(10, 0.5, 100), 4)
+    pd.DataFrame({
+        "sequence": np.arange(100), "x": 0, "y": 0, "z": 0, "force": force,
+        "target_force": 10.0, "tolerance_abs_map": 1.0, "tolerance_pct_map": 5.0, "is_z_outlier": False,
+    }).to_csv(task_dir / "cleaned_data.csv", index=False)
+    with open(task_dir / "analysis_results.json", 'w', encoding='utf-8') as f:
+        json.dump({"data_summary": [{}], "overall_stats": [{}]}, f)
+
+    appended = []
+    for batch in range(3):
+        new_force = np.round(rng.normal(10.2, 0.5, 20), 4)
+        appended.append(new_force)
+        csv_path = tmp_path / f"append_{batch}.csv"
+        pd.DataFrame({
+            "序号": np.arange(100 + batch * 20, 120 + batch * 20), "X": 0, "Y": 0, "Z": 0,
+            "力值": [f"{value}N" for value in new_force],
+        }).to_csv(csv_path, index=False)
+        results = ia.append_rows("task", csv_path)
+
+    all_force = np.concatenate([force] + appended)
+    overall = results["overall_stats"][0]
+    assert overall["样本数"] == len(all_force)
+    assert overall["均值"] == round(all_force.mean(), 3)
+    assert overall["标准差"] == round(all_force.std(ddof=1), 3)
+    assert results["incremental"]["appends"] == 3
+    assert results["incremental"]["charts_refreshed"] is False
@@ -0,0 +1,55 @@
+"""
+测试任务调度器的通道顺序：fast任务优先，但normal任务不会被持续的fast任务饿死
+"""
+import asyncio
+import time
+
+from backend.core.config import settings
+from backend.services.task_scheduler import TaskScheduler, FAST_LANE, NORMAL_LANE
+
+
+def _run_jobs(submissions, before_release=None):
+    """提交任务并返回执行顺序；第一个任务执行期间提交其余任务"""
+    started = []
+
+    async def main():
+        scheduler = TaskScheduler(max_running=1, max_queued=100)
+        release = asyncio.Event()
+
+        def job(task_id):
+            async def run():
+                started.append(task_id)
+                if task_id == "blocker":
+                    await release.wait()
+            return run
+
+        scheduler.submit("blocker", FAST_LANE, job("blocker"))
+        for task_id, lane in submissions:
+            scheduler.submit(task_id, lane, job(task_id))
+        if before_release:
+            before_release(scheduler)
+        release.set()
+        while scheduler.stats()["running"] or scheduler.queued:
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    return started[1:]
+
+
+def test_normal_job_runs_after_fast_burst(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_FAST_BURST", 2)
+    submissions = [("n1", NORMAL_LANE)] + [(f"f{i}", FAST_LANE) for i in range(1, 6)]
+
+    assert _run_jobs(submissions) == ["f1", "f2", "n1", "f3", "f4", "f5"]
+
+
+def test_overdue_normal_job_runs_first(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_FAST_BURST", 100)
+    monkeypatch.setattr(settings, "SCHEDULER_NORMAL_MAX_WAIT", 60)
+    submissions = [("n1", NORMAL_LANE), ("f1", FAST_LANE), ("f2", FAST_LANE)]
+
+    def age_normal_queue(scheduler):
+        scheduler._queues[NORMAL_LANE][0].submitted_at = time.monotonic() - 61
+
+    assert _run_jobs(submissions) == ["f1", "f2", "n1"]
+    assert _run_jobs(submissions, age_normal_queue) == ["n1", "f1", "f2"]
@@ -0,0 +1,108 @@
+"""
+测试SQLite任务存储的状态切换、去重和遗留任务接管
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.models.schemas import TaskInfo, TaskStatus
+from backend.services.task_store import SQLiteTaskStore, MemoryTaskStore, TaskQueueFull
+
+PARAMS = {"target_forces": [5.0]}
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    return MemoryTaskStore()
+
+
+def _create(store, task_id, status=TaskStatus.PENDING, owner="owner-a", dedup_key=None, created_at=None,
+            max_pending=None):
+    task = TaskInfo(task_id=task_id, status=status, created_at=created_at or datetime.now())
+    return store.create(task, "/data.csv", PARAMS, owner, dedup_key, max_pending)
+
+
+def test_transition_only_from_expected_status(store):
+    _create(store, "t1")
+
+    assert store.transition("t1", [TaskStatus.PENDING], TaskStatus.RUNNING, progress=10)
+    assert not store.transition("t1", [TaskStatus.PENDING], TaskStatus.CANCELLED, message="取消")
+    task = store.get("t1")
+    assert task.status == TaskStatus.RUNNING
+    assert task.progress == 10
+    assert task.message == ""
+    assert not store.transition("missing", [TaskStatus.PENDING], TaskStatus.RUNNING)
+
+
+def test_create_deduplicates_unfinished_tasks(store):
+    assert _create(store, "t1", dedup_key="k") == "t1"
+    assert _create(store, "t2", dedup_key="k") == "t1"
+    assert store.get("t2") is None
+
+    store.transition("t1", [TaskStatus.PENDING], TaskStatus.RUNNING)
+    assert _create(store, "t3", dedup_key="k") == "t1"
+
+    store.transition("t1", [TaskStatus.RUNNING], TaskStatus.COMPLETED)
+    assert _create(store, "t4", dedup_key="k") == "t4"
+
+
+def test_create_respects_pending_limit(store):
+    _create(store, "done", status=TaskStatus.COMPLETED)
+    _create(store, "t1", dedup_key="k", max_pending=2)
+    _create(store, "t2", max_pending=2)
+    assert store.count([TaskStatus.PENDING]) == 2
+    assert store.count([TaskStatus.PENDING, TaskStatus.COMPLETED]) == 3
+
+    with pytest.raises(TaskQueueFull):
+        _create(store, "t3", max_pending=2)
+    assert store.get("t3") is None
+    # 相同的未结束任务仍可复用，不受排队上限影响
+    assert _create(store, "t4", dedup_key="k", max_pending=2) == "t1"
+
+
+def test_lease_next_takes_oldest_unowned_task(store):
+    now = datetime.now()
+    _create(store, "newer", owner=None, created_at=now)
+    _create(store, "older", owner=None, created_at=now - timedelta(seconds=5))
+    _create(store, "owned", owner="owner-a", created_at=now - timedelta(seconds=10))
+
+    assert store.lease_next("worker")["task_id"] == "older"
+    assert store.lease_next("worker")["task_id"] == "newer"
+    assert store.lease_next("worker") is None
+
+
+def test_created_at_is_ordered_across_timezones(store):
+    # 无时区的旧记录按本地时间处理；不同时区的时间先统一为上海时区再保存和比较
+    now = datetime.now(timezone.utc)
+    _create(store, "utc", owner=None, created_at=now)
+    _create(store, "local", owner=None, created_at=(now - timedelta(seconds=5)).astimezone().replace(tzinfo=None))
+
+    assert store.get("utc").created_at.utcoffset() == timedelta(hours=8)
+    assert store.lease_next("worker")["task_id"] == "local"
+    assert store.lease_next("worker")["task_id"] == "utc"
+
+
+def test_claim_orphaned_counts_interrupted_runs(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    store.heartbeat("alive")
+    _create(store, "running", status=TaskStatus.RUNNING, owner="dead")
+    _create(store, "queued", owner="dead")
+    _create(store, "live", status=TaskStatus.RUNNING, owner="alive")
+
+    claimed = {job["task_id"]: job for job in store.claim_orphaned("alive", stale_after=60, max_attempts=2)}
+    assert set(claimed) == {"running", "queued"}
+    assert claimed["running"]["attempts"] == 1
+    assert claimed["queued"]["attempts"] == 0
+    assert claimed["running"]["previous_owner"] == "dead"
+    assert store.get("running").status == TaskStatus.PENDING
+    assert store.get_job("running")["owner"] == "alive"
+    assert store.get("live").status == TaskStatus.RUNNING
+
+    # 被接管后再次执行中断，达到重试上限后标记为失败
+    store.transition("running", [TaskStatus.PENDING], TaskStatus.RUNNING, owner="dead")
+    assert store.claim_orphaned("alive", stale_after=60, max_attempts=2) == []
+    task = store.get("running")
+    assert task.status == TaskStatus.FAILED
+    assert store.get_job("running")["attempts"] == 2
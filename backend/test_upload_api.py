@@ -0,0 +1,57 @@
+"""
+测试上传接口：普通上传与一键上传分析共用同一套保存和后台概况生成流程
+"""
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import files as files_api
+from backend.core.config import settings
+from backend.services import data_profile
+
+CSV = "序号,X,Y,Z,力值\n1,0,0,0,5.1N\n2,0,0,0,4.9N\n3,1,1,1,25.2N\n"
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(files_api.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_upload_and_analyze_saves_file_and_creates_task(tmp_path, monkeypatch):
+    created = []
+
+    async def fake_create_analysis_task(csv_path, params):
+        created.append((csv_path, params))
+        return "task-1", False
+
+    monkeypatch.setattr(files_api, "create_analysis_task", fake_create_analysis_task)
+    client = _client(tmp_path, monkeypatch)
+
+    response = client.post(
+        "/api/upload-and-analyze",
+        files={"file": ("data.csv", CSV.encode("utf-8"), "text/csv")},
+        data={"target_forces": "5,25", "tolerance_abs": "1,2", "tolerance_pct": "5"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["task_id"] == "task-1"
+    csv_path, params = created[0]
+    assert Path(csv_path) == tmp_path / f"{body['file_id']}.csv"
+    assert Path(csv_path).read_text(encoding="utf-8") == CSV
+    assert params.target_forces == [5.0, 25.0]
+    assert params.tolerance_abs == [1.0, 2.0]
+    # 后台任务在响应返回后已生成数据概况
+    assert data_profile.profile_path(Path(csv_path)).exists()
+
+
+def test_upload_rejects_non_csv(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+
+    response = client.post("/api/upload", files={"file": ("data.txt", b"1,2\n", "text/plain")})
+
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,86 @@
+"""
+压力采集数据分析系统 - 分析工作进程
+
+从共享任务队列（TASK_STORE_PATH）中领取分析任务，在本节点执行R分析，
+分析产物写入共享的 CHARTS_DIR。多个节点可以同时运行工作进程，空闲节点会自动领取排队任务。
+
+工作进程的心跳即其持有任务的租约：进程退出或失联超过 TASK_OWNER_TIMEOUT 后，
+其他工作进程（或服务进程）会将未完成的任务退回共享队列重试。
+"""
+import asyncio
+import logging
+import signal
+
+from backend.core.config import settings, ensure_directories
+from backend.models.schemas import AnalysisParams, TaskStatus
+from backend.api.analysis import schedule_analysis_task, task_owner_heartbeat, task_store
+from backend.services.r_worker_pool import get_worker_pool, shutdown_worker_pool
+from backend.services.analysis_executor import shutdown_executor
+from backend.services.task_scheduler import get_scheduler, QueueFullError
+from backend.services.task_store import OWNER_ID
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _start_leased_job(job):
+    """将领取到的任务提交到本进程的调度器执行"""
+    try:
+        await schedule_analysis_task(job["task_id"], job["csv_path"], AnalysisParams(**job["params"]))
+    except QueueFullError:
+        # 本节点队列已满，任务退回共享队列由其他节点领取
+        logger.warning(f"本节点任务队列已满，任务 {job['task_id']} 已退回共享队列")
+        await asyncio.to_thread(task_store.transition, job["task_id"], [TaskStatus.PENDING], TaskStatus.PENDING, owner=None)
+    except Exception as e:
+        logger.error(f"启动任务 {job['task_id']} 失败: {str(e)}")
+        await asyncio.to_thread(
+            task_store.transition, job["task_id"], [TaskStatus.PENDING], TaskStatus.FAILED,
+            error=str(e), message=f"任务启动失败: {str(e)}"
+        )
+
+
+async def run_worker():
+    """工作进程主循环：有空闲执行槽时领取共享队列中的任务，收到退出信号后等待执行中的任务完成"""
+    ensure_directories()
+    if settings.ANALYSIS_DISPATCH != "queue":
+        logger.warning("ANALYSIS_DISPATCH 不是 queue，服务进程会在本地执行任务，工作进程只领取共享队列中的任务")
+
+    # 预热R工作进程池
+    if settings.R_EXECUTION_MODE == "pool":
+        get_worker_pool().start()
+
+    # 先写入心跳再领取任务，避免刚领取的任务被其他进程视为遗留任务
+    await asyncio.to_thread(task_store.heartbeat, OWNER_ID)
+    heartbeat = asyncio.create_task(task_owner_heartbeat(shared=True))
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    scheduler = get_scheduler()
+    logger.info(f"分析工作进程 {OWNER_ID} 已启动，最大并发 {scheduler.max_running}")
+
+    while not stopping.is_set():
+        job = None
+        if scheduler.stats()["free_slots"] > 0:
+            job = await asyncio.to_thread(task_store.lease_next, OWNER_ID)
+        if job is not None:
+            logger.info(f"领取任务: {job['task_id']}")
+            await _start_leased_job(job)
+            continue
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=settings.WORKER_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    # 停止领取新任务，等待执行中的任务完成（期间继续发送心跳以保持租约）
+    logger.info("正在停止工作进程，等待执行中的任务完成...")
+    while scheduler.stats()["running"] > 0:
+        await asyncio.sleep(1)
+
+    heartbeat.cancel()
+    shutdown_executor()
+    shutdown_worker_pool()
+    logger.info("分析工作进程已停止")
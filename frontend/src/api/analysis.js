@@ -35,6 +35,11 @@ export const analysisAPI = {
     return apiClient.get(`/api/task/${taskId}`)
   },
 
+  // 批量查询任务状态
+  getTasksStatus(taskIds) {
+    return apiClient.get('/api/tasks/status', { params: { task_ids: taskIds.join(',') } })
+  },
+
   // 获取分析结果
   getResults(taskId) {
     return apiClient.get(`/api/results/${taskId}`)
@@ -45,6 +50,11 @@ export const analysisAPI = {
     return apiClient.get('/api/tasks')
   },
 
+  // 取消任务（终止正在执行的R进程）
+  cancelTask(taskId) {
+    return apiClient.post(`/api/task/${taskId}/cancel`)
+  },
+
   // 删除任务
   deleteTask(taskId) {
     return apiClient.delete(`/api/task/${taskId}`)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+压力采集数据分析系统 - 分析工作进程启动脚本
+在项目根目录运行此脚本以启动工作进程，从共享任务队列中领取并执行分析任务
+（服务端需设置 ANALYSIS_DISPATCH=queue，所有节点共享 TASK_STORE_PATH、UPLOAD_DIR 和 CHARTS_DIR）
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from backend.core.config import settings
+from backend.worker import run_worker
+
+if __name__ == "__main__":
+    print(f"启动 {settings.PROJECT_NAME} 分析工作进程")
+    print(f"任务队列: {settings.TASK_STORE_PATH}")
+    print(f"图表目录: {settings.CHARTS_DIR}")
+    print("按 Ctrl+C 停止（等待执行中的任务完成后退出）")
+
+    # 确保在项目根目录运行
+    os.chdir(project_root)
+
+    asyncio.run(run_worker())